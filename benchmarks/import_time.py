@@ -0,0 +1,59 @@
+"""
+Measures the cold-start cost of `import dtMsalO365Wrapper`.
+
+Each run imports the package in a fresh interpreter, records the wall-clock import time
+and checks that none of the heavy optional backends, nor sqlite3 (which only persistent
+caches and checkpoints need), were pulled in. Exits non-zero when the median exceeds the
+budget or a heavy module was imported eagerly.
+
+    python benchmarks/import_time.py --runs 10 --budget-ms 150
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ['msal', 'azure.identity', 'office365', 'sqlite3']
+
+PROBE = (
+    "import sys, time, json\n"
+    "t = time.perf_counter()\n"
+    "import dtMsalO365Wrapper\n"
+    "elapsed = time.perf_counter() - t\n"
+    "print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))\n"
+) % (HEAVY_MODULES,)
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=150.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    env['PYTHONPATH'] = os.pathsep.join(p for p in [src, env.get('PYTHONPATH')] if p)
+
+    results = [run_once(env) for _ in range(args.runs)]
+    timings = [r['elapsed'] * 1000 for r in results]
+    loaded = sorted({m for r in results for m in r['loaded']})
+    median = statistics.median(timings)
+
+    print(f'import dtMsalO365Wrapper: median {median:.1f} ms, min {min(timings):.1f} ms, '
+          f'max {max(timings):.1f} ms over {args.runs} runs')
+    if loaded:
+        print(f'Heavy modules imported eagerly: {", ".join(loaded)}')
+    if median > args.budget_ms:
+        print(f'Median import time exceeds the {args.budget_ms:.0f} ms budget')
+    return 1 if loaded or median > args.budget_ms else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
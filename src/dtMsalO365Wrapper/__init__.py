@@ -1,18 +1,88 @@
-import time
-import logging
-import datetime
-import msal
-import requests
-from azure.identity import CertificateCredential
-from office365.graph_client import GraphClient
-from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
-
-from dtMsalO365Wrapper.users import Users
-from dtMsalO365Wrapper.communications import Communications
-from dtMsalO365Wrapper.subscriptions import Subscriptions
-from dtMsalO365Wrapper.messages import Messages
-from dtMsalO365Wrapper.teams import Teams
-from dtMsalO365Wrapper.power_automate import PowerAutomate
+from __future__ import annotations
+
+import importlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import TYPE_CHECKING
+
+from dtMsalO365Wrapper._lazy import LazyGraphClient
+from dtMsalO365Wrapper._token_auth_session import TokenAuthSession, create_http_adapter
+from dtMsalO365Wrapper._deadline import DeadlineExceeded, Deadline
+from dtMsalO365Wrapper._deadline import deadline as _deadline_scope
+from dtMsalO365Wrapper._hedging import HedgePolicy
+from dtMsalO365Wrapper._tracing import Tracer, bind_context
+from dtMsalO365Wrapper._identities import AppIdentity, IdentityRouter
+from dtMsalO365Wrapper._circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from dtMsalO365Wrapper.query import ODataQuery, F
+from dtMsalO365Wrapper.cache import ResponseCache, CachePolicy, MemoryCacheBackend, SQLiteCacheBackend
+
+if TYPE_CHECKING:
+    from dtMsalO365Wrapper.users import Users
+    from dtMsalO365Wrapper.communications import Communications
+    from dtMsalO365Wrapper.subscriptions import Subscriptions
+    from dtMsalO365Wrapper.messages import Messages
+    from dtMsalO365Wrapper.teams import Teams
+    from dtMsalO365Wrapper.groups import Groups
+    from dtMsalO365Wrapper.power_automate import PowerAutomate
+
+# Subsystems are imported on first use so that `import dtMsalO365Wrapper` stays cheap.
+_LAZY_SUBSYSTEMS = {
+    'Users': 'dtMsalO365Wrapper.users',
+    'Communications': 'dtMsalO365Wrapper.communications',
+    'Subscriptions': 'dtMsalO365Wrapper.subscriptions',
+    'Messages': 'dtMsalO365Wrapper.messages',
+    'Teams': 'dtMsalO365Wrapper.teams',
+    'Groups': 'dtMsalO365Wrapper.groups',
+    'PowerAutomate': 'dtMsalO365Wrapper.power_automate',
+    'TenantClientPool': 'dtMsalO365Wrapper.pool',
+    'MailboxCrawler': 'dtMsalO365Wrapper.crawler',
+    'export_rows': 'dtMsalO365Wrapper.export',
+    'NDJSONSink': 'dtMsalO365Wrapper.export',
+    'ParquetSink': 'dtMsalO365Wrapper.export',
+    'ArrowSink': 'dtMsalO365Wrapper.export',
+    'PresenceHistory': 'dtMsalO365Wrapper.communications',
+}
+
+__all__ = [
+    'MsalO365Client',
+    'TokenAuthSession',
+    'Deadline',
+    'DeadlineExceeded',
+    'HedgePolicy',
+    'Tracer',
+    'AppIdentity',
+    'IdentityRouter',
+    'CircuitBreakerRegistry',
+    'CircuitOpenError',
+    'ODataQuery',
+    'F',
+    'ResponseCache',
+    'CachePolicy',
+    'MemoryCacheBackend',
+    'SQLiteCacheBackend',
+    # Imported lazily through __getattr__, see _LAZY_SUBSYSTEMS.
+    'Users',
+    'Communications',
+    'Subscriptions',
+    'Messages',
+    'Teams',
+    'Groups',
+    'PowerAutomate',
+    'TenantClientPool',
+    'MailboxCrawler',
+    'export_rows',
+    'NDJSONSink',
+    'ParquetSink',
+    'ArrowSink',
+    'PresenceHistory',
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBSYSTEMS:
+        return getattr(importlib.import_module(_LAZY_SUBSYSTEMS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class MsalO365Client:
@@ -35,26 +105,54 @@ class MsalO365Client:
     :type _certificate_path: str | None
     :ivar _certificate_password: Password for the certificate file. None if not required or using client secrets.
     :type _certificate_password: str | None
-    :ivar _access_token: Access token used for authentication with Microsoft Graph API. None initially.
-    :type _access_token: dict | None
-    :ivar _token_expiry: Expiry time of the current access token. None initially.
-    :type _token_expiry: datetime.datetime | None
-    :ivar graph_client: Instance of GraphClient for interacting with Microsoft Graph API.
-    :type graph_client: GraphClient
+    :ivar _identity: The app registration of `client_id`, holding its tokens per scope.
+    :type _identity: AppIdentity
+    :ivar identities: All app registrations of the client: `_identity` plus any added by
+        `use_app_registrations`.
+    :type identities: list[AppIdentity]
+    :ivar graph_client: GraphClient for interacting with Microsoft Graph API, constructed on first use.
+    :type graph_client: LazyGraphClient
     :ivar token_auth_session: Instance of TokenAuthSession for token-based API session management.
     :type token_auth_session: TokenAuthSession
+    :ivar response_cache: Optional conditional-request cache shared by the Graph token session.
+    :type response_cache: ResponseCache | None
+    :ivar http_adapter: The HTTP adapter shared by both token sessions. Either supplied, e.g. by a
+        `TenantClientPool` sharing it between clients, or created with a connection pool of
+        `max_workers` connections per host.
+    :type http_adapter: HTTPAdapter
+    :ivar max_workers: The number of threads used by `submit` and, by default, by `map`.
+    :type max_workers: int
+    :ivar tracer: The tracer recording spans once `enable_tracing` was called, None otherwise.
+    :type tracer: Tracer | None
+
+    A client may be shared between threads: tokens are acquired once per scope under a lock,
+    and the token sessions send each thread's requests through its own `requests.Session`
+    over the shared connection pool. `submit` and `map` run work on the client's threads.
     """
-    def __init__(self, tenant_id, client_id, client_secret=None, certificate_path=None, certificate_password=None):
+    def __init__(self, tenant_id, client_id, client_secret=None, certificate_path=None, certificate_password=None,
+                 response_cache: ResponseCache = None, http_adapter=None, max_workers: int = 8):
         self._tenant_id = tenant_id
         self._client_id = client_id
         self._client_secret = client_secret
         self._certificate_path = certificate_path
         self._certificate_password = certificate_password
-        self._access_tokens = {}
-        self._token_expiry = {}
-        self.graph_client = GraphClient(self._acquire_token)
-        self.token_auth_session = TokenAuthSession(self._acquire_token, scope="https://graph.microsoft.com/.default")
-        self.power_automate_token_auth_session = TokenAuthSession(self._acquire_token, scope='https://service.flow.microsoft.com//.default')
+        self._identity = AppIdentity(tenant_id, client_id, client_secret, certificate_path, certificate_password)
+        self.identities = [self._identity]
+        self._lock = threading.Lock()
+        self._executor = None
+        self.max_workers = max_workers
+        self.tracer = None
+        self._owns_adapter = http_adapter is None
+        if http_adapter is None:
+            http_adapter = create_http_adapter(pool_maxsize=max(10, max_workers))
+        self.http_adapter = http_adapter
+        self.response_cache = response_cache
+        self.graph_client = LazyGraphClient(self._acquire_token)
+        self.token_auth_session = TokenAuthSession(self._acquire_token, scope="https://graph.microsoft.com/.default",
+                                                   tenant_id=tenant_id, response_cache=response_cache,
+                                                   http_adapter=http_adapter)
+        self.power_automate_token_auth_session = TokenAuthSession(self._acquire_token, scope='https://service.flow.microsoft.com//.default',
+                                                                  http_adapter=http_adapter)
         # root_site = self.graph_client.sites.root.get().execute_query()
         # logging.info(f'Successfully Authenticated: {root_site.web_url}')
 
@@ -97,6 +195,62 @@ class MsalO365Client:
         return cls(tenant_id=tenant_id, client_id=client_id, certificate_path=certificate_path,
                    certificate_password=certificate_password)
 
+    @classmethod
+    def with_app_registrations(cls, tenant_id, credentials: list, strategy: str = IdentityRouter.THROTTLE_AWARE,
+                               **kwargs):
+        """
+        Creates a client that spreads its Graph requests across several app registrations of
+        the same tenant, multiplying the per-app throttling budget. See `use_app_registrations`.
+
+        :param tenant_id: The tenant all app registrations belong to.
+        :type tenant_id: str
+        :param credentials: One mapping per app registration with `client_id` and either
+            `client_secret` or `certificate_path` (and optional `certificate_password`).
+            The first one also serves the Power Automate session.
+        :type credentials: list[dict]
+        :param strategy: `'throttle_aware'` or `'least_loaded'` routing.
+        :type strategy: str
+        :param kwargs: Further keyword arguments of `MsalO365Client`.
+        :return: A new client routing across all given app registrations.
+        :rtype: cls
+        """
+        if not credentials:
+            raise ValueError('At least one app registration is required')
+        client = cls(tenant_id=tenant_id, **credentials[0], **kwargs)
+        client.use_app_registrations(credentials[1:], strategy)
+        return client
+
+    def use_app_registrations(self, credentials: list, strategy: str = IdentityRouter.THROTTLE_AWARE) -> IdentityRouter:
+        """
+        Adds app registrations of the same tenant and routes every attempt of a Graph request
+        to one of them, the client's own registration included. Each registration acquires
+        and refreshes its own tokens, and a 429 only pauses the registration that received
+        it, so the request is retried straight away through another one when possible.
+
+        :param credentials: One mapping per additional app registration with `client_id` and
+            either `client_secret` or `certificate_path` (and optional `certificate_password`).
+        :type credentials: list[dict]
+        :param strategy: `'throttle_aware'` prefers registrations throttled least recently, then
+            the least loaded; `'least_loaded'` picks the fewest requests in flight.
+        :type strategy: str
+        :return: The router now attached to the Graph token session.
+        :rtype: IdentityRouter
+        """
+        self.identities = [self._identity] + [AppIdentity(self._tenant_id, **c) for c in credentials]
+        router = IdentityRouter(self.identities, strategy)
+        self.token_auth_session.identity_router = router
+        self.token_auth_session.identity_token_func = self._token_for
+        return router
+
+    def identity_stats(self) -> dict:
+        """
+        Reports the requests, requests in flight, 429 responses and `Retry-After` seconds of
+        every app registration of the client.
+
+        :rtype: dict[str, dict]
+        """
+        return {i.client_id: i.stats() for i in self.identities}
+
     def _acquire_token(self, scope="https://graph.microsoft.com/.default"):
         """
         Acquires and returns an access token for authentication with Microsoft Graph API. If an access
@@ -114,46 +268,234 @@ class MsalO365Client:
             'expires_in', 'token_type', 'ext_expires_in', and 'token_source'.
         :rtype: dict
         """
-        _access_token = self._access_tokens.get(scope)
-        _token_expiry = self._token_expiry.get(scope)
-        if _access_token is None or datetime.datetime.now() > _token_expiry:
-            authority_url = "https://login.microsoftonline.com/{0}".format(self._tenant_id)
-            if self._client_secret is not None:
-                app = msal.ConfidentialClientApplication(
-                    authority=authority_url,
-                    client_id=self._client_id,
-                    client_credential=self._client_secret,
-                )
-                self._access_tokens[scope] = app.acquire_token_for_client(scopes=[scope])
-            else:
-                creds = CertificateCredential(tenant_id=self._tenant_id,
-                                      client_id=self._client_id,
-                                      certificate_path=self._certificate_path,
-                                      password=self._certificate_password)
-                token = creds.get_token(scope)
-                self._access_tokens[scope] = {
-                    "access_token": token.token,
-                    "expires_in": int(token.expires_on - time.time()),
-                    "token_type": "Bearer",
-                    "ext_expires_in": int(token.expires_on - time.time()),
-                    "token_source": 'identity_provider'
-                }
-
-            self._token_expiry[scope] = datetime.datetime.now() + datetime.timedelta(seconds=self._access_tokens[scope]["expires_in"])
-
-        return self._access_tokens[scope]
-
-    def users(self) -> Users:
+        return self._token_for(self._identity, scope)
+
+    def _token_for(self, identity: AppIdentity, scope):
+        _access_token = identity.valid_token(scope)
+        if _access_token is not None:
+            return _access_token
+        if self.tracer is not None:
+            with self.tracer.span('token.acquire', 'auth', scope=scope, client_id=identity.client_id):
+                return identity.acquire_token(scope)
+        return identity.acquire_token(scope)
+
+    def clear_tokens(self):
+        """
+        Discards every cached access token, of all app registrations, so the next request
+        acquires a fresh one.
+        """
+        for identity in self.identities:
+            identity.clear_tokens()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        """
+        Runs `fn(*args, **kwargs)` on one of the client's `max_workers` threads. The caller's
+        deadline scope carries over into the call, and its requests share the token sessions'
+        mailbox limits, rate-limit pauses and circuit breakers with every other thread.
+
+        :param fn: The callable to run.
+        :type fn: Callable
+        :return: A future resolved with the result of `fn`.
+        :rtype: Future
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='MsalO365Client')
+        return self._executor.submit(bind_context(fn), *args, **kwargs)
+
+    def map(self, fn, items, max_workers: int = None, ordered: bool = False):
+        """
+        Runs `fn(item)` for every item on up to `max_workers` threads and yields the results
+        as they complete, or in the order of `items` when `ordered` is set. Items are consumed
+        lazily, with at most twice `max_workers` calls queued at once, so `items` may be a
+        stream such as `Users.iter_all()`. Like `submit`, calls inherit the caller's deadline
+        and share the client's throttling.
+
+        An exception raised by `fn` is re-raised when its result is reached; calls that have
+        not started by then are cancelled.
+
+        :param fn: The callable to run per item.
+        :type fn: Callable
+        :param items: The items to process.
+        :type items: Iterable
+        :param max_workers: The number of concurrent calls. Defaults to the client's `max_workers`.
+        :type max_workers: int | None
+        :param ordered: Yield results in the order of `items` instead of as they complete.
+        :type ordered: bool
+        :return: A generator yielding the results of `fn`.
+        :rtype: Iterator
+        """
+        max_workers = max_workers or self.max_workers
+        bound = bind_context(fn)
+        pending = deque()
+
+        def _next_results():
+            if ordered:
+                return [pending.popleft().result()]
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+            return [future.result() for future in done]
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='MsalO365Client-map') as executor:
+            try:
+                for item in items:
+                    if len(pending) >= max_workers * 2:
+                        yield from _next_results()
+                    pending.append(executor.submit(bound, item))
+                while pending:
+                    yield from _next_results()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def close(self):
+        """
+        Waits for work submitted through `submit`, then closes the token sessions and, unless
+        it was supplied by the caller, the HTTP adapter.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.token_auth_session.close()
+        self.power_automate_token_auth_session.close()
+        if self._owns_adapter:
+            self.http_adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def deadline(self, seconds: float):
+        """
+        Returns a context manager bounding every request made inside it, including retries,
+        backoff sleeps and rate-limit waits, by a shared time budget.
+
+            with client.deadline(2.0):
+                user = client.users().get_by_id(user_id)
+
+        Deadlines apply to requests made through the token sessions; calls executed by the
+        office365 GraphClient are not bounded.
+
+        :param seconds: The time budget in seconds.
+        :type seconds: float
+        :return: A context manager yielding the effective `Deadline`.
+        """
+        return _deadline_scope(seconds)
+
+    def enable_tracing(self, tracer: Tracer = None) -> Tracer:
+        """
+        Starts recording a span for every library operation, HTTP request and attempt, token
+        acquisition, retry sleep and rate-limit or mailbox wait of this client. Spans keep
+        their parent, also across the threads of `map`, `submit` and the library's batched
+        calls, and the trace can be written with `Tracer.export_chrome_trace` for viewing in
+        chrome://tracing or Perfetto.
+
+        :param tracer: The tracer to record into, e.g. one shared by several clients.
+        :type tracer: Tracer | None
+        :return: The tracer now recording.
+        :rtype: Tracer
+        """
+        self.tracer = tracer if tracer is not None else Tracer()
+        self.token_auth_session.tracer = self.tracer
+        self.power_automate_token_auth_session.tracer = self.tracer
+        self.graph_client.tracer = self.tracer
+        return self.tracer
+
+    def disable_tracing(self):
+        self.tracer = None
+        self.token_auth_session.tracer = None
+        self.power_automate_token_auth_session.tracer = None
+        self.graph_client.tracer = None
+
+    def enable_hedging(self, hedge_policy: HedgePolicy = None) -> HedgePolicy:
+        """
+        Enables hedged requests for idempotent `GET` calls made through the Graph token session:
+        a request still unanswered after the p95 latency of its endpoint is sent a second time
+        and whichever response arrives first is used.
+
+        :param hedge_policy: The policy to apply. Defaults to a p95 policy.
+        :type hedge_policy: HedgePolicy | None
+        :return: The policy now attached to the session.
+        :rtype: HedgePolicy
+        """
+        self.token_auth_session.hedge_policy = hedge_policy if hedge_policy is not None else HedgePolicy()
+        return self.token_auth_session.hedge_policy
+
+    def enable_circuit_breakers(self, **breaker_settings) -> CircuitBreakerRegistry:
+        """
+        Guards every endpoint of the Graph token session with a circuit breaker. When an
+        endpoint's error rate crosses the threshold its circuit opens: calls fail fast with
+        `CircuitOpenError`, or are answered from the response cache when a stale entry
+        exists, until probe requests find the endpoint healthy again.
+
+        :param breaker_settings: Settings passed to every `CircuitBreaker`, e.g.
+            `failure_threshold`, `min_requests`, `window`, `open_duration` or `half_open_probes`.
+        :return: The registry now attached to the session.
+        :rtype: CircuitBreakerRegistry
+        """
+        self.token_auth_session.circuit_breakers = CircuitBreakerRegistry(**breaker_settings)
+        return self.token_auth_session.circuit_breakers
+
+    def circuit_states(self) -> dict:
+        """
+        Reports the state, recent request count and error rate of every endpoint's circuit.
+
+        :return: Snapshots keyed by endpoint template; empty when circuit breakers are disabled.
+        :rtype: dict[str, dict]
+        """
+        if self.token_auth_session.circuit_breakers is None:
+            return {}
+        return self.token_auth_session.circuit_breakers.states()
+
+    def enable_response_cache(self, response_cache: ResponseCache = None) -> ResponseCache:
+        """
+        Enables the conditional-request cache on the Graph token session. Slowly changing
+        resources such as teams, channels, mail folders and user profiles are then served
+        from the cache within their TTL and revalidated with `If-None-Match` afterwards.
+
+        :param response_cache: The cache to use. Defaults to an in-memory LRU cache with
+            `ResponseCache.DEFAULT_POLICIES`.
+        :type response_cache: ResponseCache | None
+        :return: The cache now attached to the client.
+        :rtype: ResponseCache
+        """
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        self.token_auth_session.response_cache = self.response_cache
+        return self.response_cache
+
+    def invalidate_cache(self, url: str = None) -> int:
+        """
+        Removes cached Graph responses of this client's tenant, either all of them or only
+        those below the given URL (e.g. `/teams/{id}` to drop a team and its channels).
+
+        :param url: Relative or absolute URL prefix to invalidate. Invalidates everything when omitted.
+        :type url: str | None
+        :return: The number of removed entries.
+        :rtype: int
+        """
+        return self.token_auth_session.invalidate_cache(url)
+
+    def users(self, backend: str = 'orm') -> Users:
         """
         Provides access to the Users functionality within the application by returning
         an instance of the `Users` class. This enables interaction with specific user-related
         operations or services through the graph client and authenticated session token.
 
+        :param backend: `'orm'` (default) returns office365-backed `User` objects; `'raw'` reads
+            `/users` as raw JSON through the token session into lightweight `UserRecord` objects.
+        :type backend: str
         :return: Returns an instance of the `Users` class to interact with user-related
             functionality.
         :rtype: Users
         """
-        return Users(self.graph_client, self.token_auth_session)
+        from dtMsalO365Wrapper.users import Users
+        return Users(self.graph_client, self.token_auth_session, backend)
 
 
     def communications(self) -> Communications:
@@ -167,16 +509,25 @@ class MsalO365Client:
         :return: An instance of the Communications class
         :rtype: Communications
         """
+        from dtMsalO365Wrapper.communications import Communications
         return Communications(self.graph_client, self.token_auth_session)
 
     def subscriptions(self) -> Subscriptions:
+        from dtMsalO365Wrapper.subscriptions import Subscriptions
         return Subscriptions(self.graph_client, self.token_auth_session)
 
     def messages(self) -> Messages:
+        from dtMsalO365Wrapper.messages import Messages
         return Messages(self.graph_client, self.token_auth_session)
 
     def teams(self) -> Teams:
+        from dtMsalO365Wrapper.teams import Teams
         return Teams(self.graph_client, self.token_auth_session, self.power_automate())
 
+    def groups(self) -> Groups:
+        from dtMsalO365Wrapper.groups import Groups
+        return Groups(self.graph_client, self.token_auth_session)
+
     def power_automate(self) -> PowerAutomate:
+        from dtMsalO365Wrapper.power_automate import PowerAutomate
         return PowerAutomate(self.power_automate_token_auth_session)
\ No newline at end of file
@@ -0,0 +1,147 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dtMsalO365Wrapper._tracing import bind_context
+from dtMsalO365Wrapper._deadline import current_deadline, DeadlineExceeded
+
+# Graph accepts at most 20 sub-requests in one JSON batch.
+BATCH_LIMIT = 20
+RETRYABLE_STATUSES = {429, 503, 504}
+# Sub-requests skipped because a request they depend on failed.
+FAILED_DEPENDENCY = 424
+# Reported for sub-requests Graph left out of the batch response.
+MISSING_RESPONSE = 502
+
+
+def relative_url(session, url: str) -> str:
+    """
+    Converts an absolute Graph URL, such as an `@odata.nextLink`, into the version-relative
+    form required inside a JSON batch.
+    """
+    if url.startswith(session.root_url):
+        return url[len(session.root_url):]
+    return url
+
+
+def _chain(requests: list, chains: int) -> list:
+    """
+    Links sub-requests into `chains` sequences with `dependsOn`, so Graph runs at most
+    `chains` of them at the same time.
+    """
+    linked = []
+    for i, r in enumerate(requests):
+        r = {k: v for k, v in r.items() if k != 'dependsOn'}
+        if i >= chains:
+            r['dependsOn'] = [requests[i - chains]['id']]
+        linked.append(r)
+    return linked
+
+
+def _execute_chunk(session, chunk: list, max_retries: int, chains: int = None) -> dict:
+    results = {}
+    pending = chunk
+    attempt = 0
+    while pending:
+        payload = _chain(pending, chains) if chains else pending
+        resp = session.request('POST', '/$batch', json={'requests': payload})
+        if resp.status_code != 200:
+            raise RuntimeError(f'Failed to execute batch: {resp.status_code} -> {resp.text}')
+        subs = {sub['id']: sub for sub in resp.json().get('responses', [])}
+        depends_on = {r['id']: r['dependsOn'][0] for r in payload if r.get('dependsOn')}
+
+        def _cause(sub_id):
+            # Follows a chain of skipped items back to the item whose failure skipped them.
+            seen = set()
+            while subs.get(sub_id, {}).get('status') == FAILED_DEPENDENCY and sub_id not in seen:
+                seen.add(sub_id)
+                sub_id = depends_on.get(sub_id)
+            return subs.get(sub_id, {}).get('status')
+
+        retry, resend, retry_after = set(), set(), 0
+        for r in pending:
+            if r['id'] not in subs:
+                logging.error(f"Batch response is missing sub-request {r['id']}")
+                results[r['id']] = {'id': r['id'], 'status': MISSING_RESPONSE, 'headers': {},
+                                    'body': {'error': {'code': 'missingResponse',
+                                                       'message': 'The batch response did not include this request'}}}
+        for sub in subs.values():
+            status = sub.get('status')
+            if status in RETRYABLE_STATUSES and attempt < max_retries:
+                retry.add(sub['id'])
+                retry_after = max(retry_after, int((sub.get('headers') or {}).get('Retry-After', 2 ** attempt)))
+            elif status == FAILED_DEPENDENCY and chains:
+                cause = _cause(sub['id'])
+                if cause in RETRYABLE_STATUSES or cause is None:
+                    if attempt < max_retries:
+                        retry.add(sub['id'])
+                    else:
+                        results[sub['id']] = sub
+                else:
+                    # The item it waited for failed for good and is not resent, so the skipped
+                    # item is resent right away, no longer depending on it.
+                    resend.add(sub['id'])
+            else:
+                results[sub['id']] = sub
+        if retry:
+            _deadline = current_deadline()
+            if _deadline is not None and retry_after >= _deadline.remaining():
+                raise DeadlineExceeded(f'Batch sub-requests rate limited for {retry_after}s, beyond the deadline')
+            logging.info(f'Retrying {len(retry)} throttled batch sub-requests after {retry_after} seconds...')
+            started = time.perf_counter()
+            time.sleep(retry_after)
+            if session.tracer is not None:
+                session.tracer.record('batch.retry_wait', started, retried=len(retry))
+            attempt += 1
+        # Rounds resending only skipped items always make progress, since the first item of
+        # every chain runs; they therefore do not count towards `max_retries`.
+        pending = [r for r in pending if r['id'] in retry or r['id'] in resend]
+    return results
+
+
+def iter_batch(session, requests: list, max_workers: int = 1, max_retries: int = 5, chains: int = None):
+    """
+    Executes sub-requests through Graph's `/$batch` endpoint in batches of `BATCH_LIMIT`,
+    running up to `max_workers` batches concurrently. Sub-requests answered with a throttling
+    or transient status are resent on their own, up to `max_retries` times, after the longest
+    `Retry-After` of the batch.
+
+    :param session: The token session to send the batches through.
+    :type session: TokenAuthSession
+    :param requests: Sub-requests with unique `id`, `method` and relative `url`, plus optional
+        `body` and `headers`.
+    :type requests: list[dict]
+    :param max_workers: The number of batches in flight at the same time.
+    :type max_workers: int
+    :param max_retries: How often a throttled sub-request is resent before its response is returned.
+    :type max_retries: int
+    :param chains: When set, the sub-requests of a batch are linked into this many `dependsOn`
+        chains, bounding how many of them Graph executes at once (e.g. against one mailbox).
+        Items skipped with 424 because an earlier item of their chain was throttled are
+        retried with it; items skipped because it failed for good are resent at once.
+    :type chains: int | None
+    :raises RuntimeError: If a batch request as a whole fails.
+    :raises DeadlineExceeded: If throttled sub-requests would have to wait past the deadline in effect.
+    :return: A generator yielding `(id, sub_response)` pairs as batches complete, where a
+        sub-response carries `status`, `headers` and `body`. Sub-requests missing from Graph's
+        response are reported with status `MISSING_RESPONSE`.
+    :rtype: Iterator[tuple[str, dict]]
+    """
+    chunks = [requests[i:i + BATCH_LIMIT] for i in range(0, len(requests), BATCH_LIMIT)]
+    if max_workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from _execute_chunk(session, chunk, max_retries, chains).items()
+        return
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='GraphBatch') as executor:
+        futures = [executor.submit(bind_context(_execute_chunk), session, chunk, max_retries, chains) for chunk in chunks]
+        for future in as_completed(futures):
+            yield from future.result().items()
+
+
+def execute_batch(session, requests: list, max_workers: int = 1, max_retries: int = 5, chains: int = None) -> dict:
+    """
+    Executes sub-requests like `iter_batch` and returns all sub-responses keyed by request id.
+
+    :rtype: dict[str, dict]
+    """
+    return dict(iter_batch(session, requests, max_workers, max_retries, chains))
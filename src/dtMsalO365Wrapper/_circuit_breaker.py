@@ -0,0 +1,223 @@
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+_active_guard = contextvars.ContextVar('dtMsalO365Wrapper_breaker', default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised instead of sending a request while the circuit of its endpoint is open.
+    """
+    def __init__(self, template: str, retry_in: float):
+        super().__init__(f'Circuit open for {template}, next probe in {max(retry_in, 0):.1f}s')
+        self.template = template
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of requests to one endpoint template and fails fast while it is unhealthy.
+
+    The breaker starts `closed`. Once at least `min_requests` outcomes were recorded within
+    the last `window` seconds and the share of failures reaches `failure_threshold`, it
+    opens and rejects requests for `open_duration` seconds. It then turns `half_open` and
+    lets up to `half_open_probes` requests through: a successful probe closes the circuit,
+    a failed one opens it again. Throttled requests are neutral, they count neither way.
+
+    :ivar template: The endpoint template this breaker guards, e.g. `/communications/getPresencesByUserId`.
+    :type template: str
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, template: str, failure_threshold: float = 0.5, min_requests: int = 20,
+                 window: float = 30.0, open_duration: float = 30.0, half_open_probes: int = 1):
+        self.template = template
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.window = window
+        self.open_duration = open_duration
+        self.half_open_probes = half_open_probes
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self._outcomes = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probes = 0
+        logging.warning(f'Circuit opened for {self.template}')
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_duration:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return self._opened_at + self.open_duration - time.monotonic()
+
+    def allow(self) -> bool:
+        """
+        Decides whether a request may be sent. While half-open, each allowed request counts
+        as a probe and must be followed by a call to `record`.
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.open_duration:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probes = 0
+                logging.info(f'Circuit half-open for {self.template}, probing')
+            if self._probes >= self.half_open_probes:
+                return False
+            self._probes += 1
+            return True
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def release(self):
+        """
+        Ends a request allowed by `allow` without recording an outcome, e.g. one that was
+        throttled, so that a half-open probe slot becomes free again.
+        """
+        with self._lock:
+            if self._state == self.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                if success:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                    logging.info(f'Circuit closed for {self.template}')
+                else:
+                    self._open(now)
+                return
+            self._outcomes.append((now, success))
+            self._trim(now)
+            if self._state == self.CLOSED and len(self._outcomes) >= self.min_requests:
+                failures = sum(1 for _, ok in self._outcomes if not ok)
+                if failures / len(self._outcomes) >= self.failure_threshold:
+                    self._open(now)
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._outcomes.clear()
+            self._probes = 0
+
+    def snapshot(self) -> dict:
+        state = self.state
+        with self._lock:
+            self._trim(time.monotonic())
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+        return {'state': state, 'requests': total, 'failures': failures,
+                'error_rate': failures / total if total else 0.0}
+
+
+class Guard:
+    """
+    The breaker guarding a request, and whether the transport's retries already recorded
+    failures of the request with it.
+    """
+    __slots__ = ('breaker', 'recorded')
+
+    def __init__(self, breaker: CircuitBreaker):
+        self.breaker = breaker
+        self.recorded = False
+
+    def record_retried_failure(self):
+        self.breaker.record(False)
+        self.recorded = True
+
+
+def active_guard():
+    """
+    Returns the `Guard` of the request being sent in the calling context, or None.
+    """
+    return _active_guard.get()
+
+
+def active_breaker():
+    """
+    Returns the breaker guarding the request being sent in the calling context, or None.
+    """
+    guard = _active_guard.get()
+    return None if guard is None else guard.breaker
+
+
+@contextmanager
+def guarding(breaker: CircuitBreaker):
+    """
+    Makes `breaker` visible to the transport's `Retry` for the duration of the block, which
+    records every retried attempt as a failure and stops retrying once the circuit opens.
+
+    :return: A context manager yielding the request's `Guard`.
+    """
+    guard = Guard(breaker)
+    token = _active_guard.set(guard)
+    try:
+        yield guard
+    finally:
+        _active_guard.reset(token)
+
+
+class CircuitBreakerRegistry:
+    """
+    Creates and holds one `CircuitBreaker` per endpoint template, all sharing the same settings.
+
+    :ivar failure_statuses: Response status codes counted as failures.
+    :type failure_statuses: set
+    """
+    def __init__(self, failure_statuses=(500, 502, 503, 504), **breaker_settings):
+        self.failure_statuses = set(failure_statuses)
+        self._settings = breaker_settings
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, template: str) -> CircuitBreaker:
+        breaker = self._breakers.get(template)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(template)
+                if breaker is None:
+                    breaker = self._breakers[template] = CircuitBreaker(template, **self._settings)
+        return breaker
+
+    def states(self) -> dict:
+        """
+        Returns a snapshot of every breaker, keyed by endpoint template.
+
+        :rtype: dict[str, dict]
+        """
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {b.template: b.snapshot() for b in breakers}
+
+    def reset(self, template: str = None):
+        with self._lock:
+            breakers = list(self._breakers.values()) if template is None else [self._breakers.get(template)]
+        for breaker in breakers:
+            if breaker is not None:
+                breaker.reset()
@@ -0,0 +1,118 @@
+import time
+import contextvars
+from contextlib import contextmanager
+
+from urllib3.util.retry import Retry
+
+from dtMsalO365Wrapper._tracing import current_span
+from dtMsalO365Wrapper._circuit_breaker import active_breaker, active_guard
+
+_current_deadline = contextvars.ContextVar('dtMsalO365Wrapper_deadline', default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when a call or operation runs past the deadline it was given.
+    """
+
+
+class Deadline:
+    """
+    A point in time by which a call or a whole operation has to complete.
+
+    :ivar expires_at: The `time.monotonic()` value at which the deadline expires.
+    :type expires_at: float
+    """
+    __slots__ = ('expires_at',)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = 'Operation'):
+        if self.expired:
+            raise DeadlineExceeded(f'{what} exceeded its deadline')
+
+
+def current_deadline():
+    """
+    Returns the deadline in effect for the calling context, or None when there is none.
+    """
+    return _current_deadline.get()
+
+
+def remaining():
+    """
+    Returns the seconds left until the deadline in effect expires, or None without a deadline.
+    """
+    deadline = _current_deadline.get()
+    return None if deadline is None else deadline.remaining()
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Applies a deadline to every request made in the `with` block, including their retries,
+    backoff sleeps and rate-limit waits. Nested deadlines never extend an enclosing one.
+
+    :param seconds: The time budget of the block in seconds.
+    :type seconds: float
+    :return: A context manager yielding the effective `Deadline`.
+    """
+    new = Deadline(seconds)
+    outer = _current_deadline.get()
+    if outer is not None and outer.expires_at < new.expires_at:
+        new = outer
+    token = _current_deadline.set(new)
+    try:
+        yield new
+    finally:
+        _current_deadline.reset(token)
+
+
+class DeadlineRetry(Retry):
+    """
+    urllib3 `Retry` that shortens backoff and `Retry-After` sleeps to the remaining deadline
+    and stops retrying once the deadline has expired.
+
+    When the request is guarded by a circuit breaker, every failed attempt is recorded with
+    the breaker as it happens, and retrying stops as soon as the circuit opens, instead of
+    working through the whole retry schedule against an unhealthy endpoint.
+    """
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        left = remaining()
+        return backoff if left is None else max(0.0, min(backoff, left))
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        left = remaining()
+        if retry_after is None or left is None:
+            return retry_after
+        return max(0.0, min(retry_after, left))
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        guard = active_guard()
+        if guard is not None and not (response is not None and response.get_redirect_location()):
+            guard.record_retried_failure()
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    def is_exhausted(self):
+        left = remaining()
+        breaker = active_breaker()
+        return (super().is_exhausted() or (left is not None and left <= 0)
+                or (breaker is not None and breaker.is_open))
+
+    def sleep(self, response=None):
+        span = current_span()
+        if span is None:
+            return super().sleep(response)
+        started = time.perf_counter()
+        super().sleep(response)
+        span.tracer.record('retry.sleep', started, status=getattr(response, 'status', None))
@@ -0,0 +1,127 @@
+import abc
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+
+class DeltaReplica(abc.ABC):
+    """
+    Base of the local replicas fed from a Graph delta query into an embedded SQLite store.
+
+    It runs delta queries page by page, stores the resulting delta link, and detects delta
+    links Graph no longer accepts. A full load and every incremental replay run in one
+    transaction, so a run failing partway leaves the store as it was. Subclasses create
+    their tables, apply the items of each page in `_apply` and clear their tables in `_clear`.
+
+    :ivar path: Path of the SQLite database, `:memory:` for a purely in-memory replica.
+    :type path: str
+    """
+    # Names the replica in log and error messages.
+    NAME = 'replica'
+    # Error codes with which Graph rejects a delta link that has to be replaced by a full load.
+    EXPIRED_CODES = ('syncStateNotFound', 'resyncRequired')
+
+    def __init__(self, session, path: str = ':memory:'):
+        self._session = session
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('CREATE TABLE IF NOT EXISTS replica_state (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.commit()
+
+    @property
+    def delta_link(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM replica_state WHERE key = 'delta_link'").fetchone()
+        return row[0] if row else None
+
+    @abc.abstractmethod
+    def _apply(self, changes):
+        """
+        Applies the items of one delta page to the store.
+
+        :return: A summary of the page, collected by `_run_delta`.
+        """
+
+    @abc.abstractmethod
+    def _clear(self):
+        """
+        Removes all replicated items before a full load.
+        """
+
+    def _discard(self):
+        """
+        Drops in-memory state derived from the store after a run was rolled back.
+        """
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            try:
+                with self._conn:
+                    yield
+            except BaseException:
+                self._discard()
+                raise
+
+    def _run_delta(self, url, params=None) -> list:
+        """
+        Follows a delta query to its last page, applying every page and storing the new
+        delta link. Must be called within `_transaction()`.
+
+        :raises RuntimeError: If a page is not returned with status 200.
+        :return: The summaries returned by `_apply` for every page.
+        :rtype: list
+        """
+        pages = []
+        delta_link = None
+        while url:
+            resp = self._session.request('GET', url, params=params)
+            if resp.status_code != 200:
+                raise RuntimeError(f'Failed to sync {self.NAME}: {resp.status_code} -> {resp.text}')
+            body = resp.json()
+            pages.append(self._apply(body.get('value', [])))
+            url = body.get('@odata.nextLink')
+            params = None
+            delta_link = body.get('@odata.deltaLink', delta_link)
+        if delta_link:
+            self._conn.execute("INSERT OR REPLACE INTO replica_state VALUES ('delta_link', ?)", (delta_link,))
+        return pages
+
+    def _load(self, url, params=None) -> list:
+        """
+        Replaces everything stored with the result of a full delta query.
+
+        :return: The summaries of all pages.
+        :rtype: list
+        """
+        with self._transaction():
+            self._clear()
+            self._conn.execute("DELETE FROM replica_state WHERE key = 'delta_link'")
+            return self._run_delta(url, params)
+
+    def _replay(self, then=None):
+        """
+        Replays the changes since the stored delta link. `then`, if given, is called with
+        the page summaries inside the same transaction.
+
+        :return: The summaries of all pages, or the result of `then`; None when there is no
+            delta link yet or Graph reports that it expired, in which case a full load is due.
+        """
+        delta_link = self.delta_link
+        if delta_link is None:
+            return None
+        try:
+            with self._transaction():
+                pages = self._run_delta(delta_link)
+                return then(pages) if then is not None else pages
+        except RuntimeError as e:
+            if not any(code in str(e) for code in self.EXPIRED_CODES):
+                raise
+            logging.warning(f'{self.NAME.capitalize()} delta link expired, performing a full load')
+            return None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,30 @@
+import re
+from urllib.parse import urlsplit
+
+# Navigation properties, actions and system segments such as `mailFolders`, `getPresencesByUserId`,
+# `microsoft.graph.delta()` or `$count`. Everything else in a path is treated as a key.
+_NAMED_SEGMENT = re.compile(r'^\$?[A-Za-z][A-Za-z.]*(\(\))?$')
+
+
+def endpoint_template(url: str, root_url: str = None) -> str:
+    """
+    Reduces a Graph URL to its endpoint template by dropping the API root and query string
+    and replacing every key segment with `{id}`, e.g. `/users/{id}/mailFolders/{id}`.
+    Requests against the same kind of resource therefore share one template.
+
+    :param url: The relative or absolute URL of a request.
+    :type url: str
+    :param root_url: The API root to strip from absolute URLs.
+    :type root_url: str | None
+    :return: The endpoint template.
+    :rtype: str
+    """
+    if root_url and url.startswith(root_url):
+        path = url[len(root_url):]
+    elif url.startswith('https://'):
+        path = urlsplit(url).path
+    else:
+        path = url
+    path = path.split('?', 1)[0]
+    segments = [s if _NAMED_SEGMENT.match(s) and len(s) < 64 else '{id}' for s in path.strip('/').split('/') if s]
+    return '/' + '/'.join(segments)
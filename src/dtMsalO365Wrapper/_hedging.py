@@ -0,0 +1,66 @@
+import threading
+from collections import deque
+
+
+class HedgePolicy:
+    """
+    Decides when an idempotent `GET` is hedged, i.e. duplicated while the first attempt is
+    still outstanding, with the faster of the two answers being used.
+
+    Latencies are sampled per endpoint template. Once `min_samples` have been recorded, a
+    request still unanswered after the `percentile` latency of its endpoint (clamped to
+    `min_delay`..`max_delay`) is sent a second time. Endpoints with too few samples are not
+    hedged.
+
+    :ivar percentile: The latency percentile after which a hedge is sent, e.g. 0.95.
+    :type percentile: float
+    :ivar min_delay: The shortest delay before hedging, in seconds.
+    :type min_delay: float
+    :ivar max_delay: The longest delay before hedging, in seconds.
+    :type max_delay: float
+    :ivar min_samples: The number of samples an endpoint needs before it is hedged.
+    :type min_samples: int
+    :ivar max_workers: The number of threads available for outstanding first attempts, and
+        separately for outstanding hedges, so that first attempts never queue behind hedges.
+    :type max_workers: int
+    """
+    def __init__(self, percentile: float = 0.95, min_delay: float = 0.05, max_delay: float = 2.0,
+                 min_samples: int = 20, window: int = 200, max_workers: int = 8):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_workers = max_workers
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record_hedge(self):
+        with self._lock:
+            self.hedged += 1
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def record(self, template: str, elapsed: float):
+        with self._lock:
+            samples = self._samples.get(template)
+            if samples is None:
+                samples = self._samples[template] = deque(maxlen=self.window)
+            samples.append(elapsed)
+
+    def delay_for(self, template: str):
+        """
+        Returns the delay after which a request to the endpoint is hedged, or None if the
+        endpoint has not been sampled often enough yet.
+        """
+        with self._lock:
+            samples = self._samples.get(template)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        value = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+        return max(self.min_delay, min(self.max_delay, value))
@@ -0,0 +1,209 @@
+import time
+import datetime
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from dtMsalO365Wrapper._limits import ThrottleGate
+
+
+class AppIdentity:
+    """
+    One app registration of a tenant, authenticating with a client secret or a certificate.
+
+    Every identity keeps its own tokens per scope, acquired once under a per-scope lock, and
+    its own `ThrottleGate`, since Graph throttles each app separately. It also counts its
+    requests and the 429 responses it received.
+
+    :ivar client_id: Azure AD application (client) ID.
+    :type client_id: str
+    :ivar throttle_gate: Rate-limit pauses of this identity, per mailbox or endpoint template.
+    :type throttle_gate: ThrottleGate
+    :ivar in_flight: The number of requests currently sent with this identity.
+    :type in_flight: int
+    :ivar requests: The number of requests sent with this identity.
+    :type requests: int
+    :ivar throttled: The number of 429 responses received.
+    :type throttled: int
+    :ivar throttle_seconds: The sum of the `Retry-After` pauses received.
+    :type throttle_seconds: float
+    """
+    # Throttles within this many seconds count towards `recent_throttles`.
+    THROTTLE_WINDOW = 60
+
+    def __init__(self, tenant_id, client_id, client_secret=None, certificate_path=None, certificate_password=None):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self._client_secret = client_secret
+        self._certificate_path = certificate_path
+        self._certificate_password = certificate_password
+        self._access_tokens = {}
+        self._token_expiry = {}
+        self._token_locks = {}
+        self._lock = threading.Lock()
+        self.throttle_gate = ThrottleGate()
+        self.in_flight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.throttle_seconds = 0.0
+        self._throttle_times = deque()
+
+    def __repr__(self):
+        return f'AppIdentity(client_id={self.client_id!r})'
+
+    def valid_token(self, scope):
+        # The token is stored before its expiry, so a token seen without a current expiry
+        # is treated as missing and re-checked under the scope's lock.
+        _access_token = self._access_tokens.get(scope)
+        _token_expiry = self._token_expiry.get(scope)
+        if _access_token is None or _token_expiry is None or datetime.datetime.now() > _token_expiry:
+            return None
+        return _access_token
+
+    def acquire_token(self, scope="https://graph.microsoft.com/.default"):
+        """
+        Returns a valid token of this identity for `scope`, acquiring one through MSAL (client
+        secret) or azure-identity (certificate) when none is cached or it has expired.
+        Concurrent callers wait for a single acquisition per scope.
+
+        :raises ValueError: If the identity has neither a client secret nor a certificate.
+        :return: The token response, including `access_token` and `expires_in`.
+        :rtype: dict
+        """
+        _access_token = self.valid_token(scope)
+        if _access_token is not None:
+            return _access_token
+        with self._lock:
+            scope_lock = self._token_locks.setdefault(scope, threading.Lock())
+        with scope_lock:
+            _access_token = self.valid_token(scope)
+            if _access_token is not None:
+                return _access_token
+            if self._client_secret is None and self._certificate_path is None:
+                raise ValueError(f'App registration {self.client_id} has no client secret or certificate')
+            authority_url = "https://login.microsoftonline.com/{0}".format(self.tenant_id)
+            if self._client_secret is not None:
+                import msal
+                app = msal.ConfidentialClientApplication(
+                    authority=authority_url,
+                    client_id=self.client_id,
+                    client_credential=self._client_secret,
+                )
+                self._access_tokens[scope] = app.acquire_token_for_client(scopes=[scope])
+            else:
+                from azure.identity import CertificateCredential
+                creds = CertificateCredential(tenant_id=self.tenant_id,
+                                              client_id=self.client_id,
+                                              certificate_path=self._certificate_path,
+                                              password=self._certificate_password)
+                token = creds.get_token(scope)
+                self._access_tokens[scope] = {
+                    "access_token": token.token,
+                    "expires_in": int(token.expires_on - time.time()),
+                    "token_type": "Bearer",
+                    "ext_expires_in": int(token.expires_on - time.time()),
+                    "token_source": 'identity_provider'
+                }
+
+            self._token_expiry[scope] = datetime.datetime.now() + datetime.timedelta(seconds=self._access_tokens[scope]["expires_in"])
+            return self._access_tokens[scope]
+
+    def clear_tokens(self):
+        with self._lock:
+            self._access_tokens.clear()
+            self._token_expiry.clear()
+
+    def record_throttle(self, key, retry_after: float):
+        now = time.monotonic()
+        self.throttle_gate.pause(key, retry_after)
+        with self._lock:
+            self.throttled += 1
+            self.throttle_seconds += retry_after
+            self._throttle_times.append(now)
+
+    @property
+    def recent_throttles(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            while self._throttle_times and now - self._throttle_times[0] > self.THROTTLE_WINDOW:
+                self._throttle_times.popleft()
+            return len(self._throttle_times)
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'in_flight': self.in_flight, 'throttled': self.throttled,
+                'throttle_seconds': self.throttle_seconds, 'recent_throttles': self.recent_throttles,
+                'paused_for': self.throttle_gate.longest_pause()}
+
+
+class IdentityRouter:
+    """
+    Spreads the requests of a token session across several app registrations of one tenant.
+
+    Identities currently paused by a `Retry-After` for the request's mailbox (or, for other
+    requests, its endpoint) are skipped. Among the others, `least_loaded` routing picks
+    the identity with the fewest requests in flight, while `throttle_aware` routing first
+    prefers the identity throttled least often within `AppIdentity.THROTTLE_WINDOW`. When
+    every identity is paused, the one free again soonest is used.
+
+    :ivar identities: The app registrations to route across.
+    :type identities: list[AppIdentity]
+    :ivar strategy: `LEAST_LOADED` or `THROTTLE_AWARE`.
+    :type strategy: str
+    """
+    LEAST_LOADED = 'least_loaded'
+    THROTTLE_AWARE = 'throttle_aware'
+
+    def __init__(self, identities: list, strategy: str = THROTTLE_AWARE):
+        if not identities:
+            raise ValueError('IdentityRouter needs at least one identity')
+        if strategy not in (self.LEAST_LOADED, self.THROTTLE_AWARE):
+            raise ValueError(f'Unknown routing strategy: {strategy}')
+        self.identities = list(identities)
+        self.strategy = strategy
+        self._lock = threading.Lock()
+
+    def select(self, key=None) -> AppIdentity:
+        """
+        Picks the identity for the next attempt of a request.
+
+        :param key: The throttling key of the request: its mailbox or endpoint template.
+        :return: The chosen identity.
+        :rtype: AppIdentity
+        """
+        with self._lock:
+            candidates = [(i.throttle_gate.remaining(key), i) for i in self.identities]
+            free = [i for pause, i in candidates if not pause]
+            if not free:
+                return min(candidates, key=lambda c: c[0])[1]
+            if self.strategy == self.THROTTLE_AWARE:
+                return min(free, key=lambda i: (i.recent_throttles, i.in_flight, i.requests))
+            return min(free, key=lambda i: (i.in_flight, i.requests))
+
+    def wait_time(self, key=None) -> float:
+        """
+        Returns how long a request with throttling key `key` must wait until some identity is
+        no longer paused, 0 if one is free now.
+        """
+        return min(i.throttle_gate.remaining(key) for i in self.identities)
+
+    @contextmanager
+    def track(self, identity: AppIdentity):
+        """
+        Counts a request sent with `identity` as in flight for the duration of the block.
+        """
+        with self._lock:
+            identity.in_flight += 1
+            identity.requests += 1
+        try:
+            yield identity
+        finally:
+            with self._lock:
+                identity.in_flight -= 1
+
+    def stats(self) -> dict:
+        """
+        Reports request, in-flight and throttle counts per identity.
+
+        :rtype: dict[str, dict]
+        """
+        return {i.client_id: i.stats() for i in self.identities}
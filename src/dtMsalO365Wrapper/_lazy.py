@@ -0,0 +1,73 @@
+import time
+import logging
+import threading
+
+from dtMsalO365Wrapper._endpoints import endpoint_template
+
+
+class LazyGraphClient:
+    """
+    Stand-in for `office365.graph_client.GraphClient` that defers importing and constructing
+    the client until one of its attributes is first used.
+
+    The office365 package is large and slow to import, and many workloads only talk raw JSON
+    through a `TokenAuthSession`. Subsystems receive this proxy in place of a `GraphClient`
+    and use it exactly as before; the real client is built on the first ORM-backed call.
+
+    :ivar _token_func: Token callback handed to the `GraphClient` when it is created.
+    :type _token_func: Callable[[], dict]
+    :ivar tracer: When set, the requests the GraphClient executes are recorded as spans.
+    :type tracer: Tracer | None
+    """
+    GRAPH_ROOT = 'https://graph.microsoft.com/v1.0'
+
+    def __init__(self, token_func):
+        self._token_func = token_func
+        self._client = None
+        self._lock = threading.Lock()
+        self.tracer = None
+
+    @property
+    def loaded(self):
+        return self._client is not None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from office365.graph_client import GraphClient
+                    client = GraphClient(self._token_func)
+                    self._install_tracing(client)
+                    self._client = client
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _install_tracing(self, client):
+        """
+        Hooks the GraphClient's request events so that its requests show up in the tracer,
+        if one is set at the time they run.
+        """
+        started = threading.local()
+
+        def _before(request_options):
+            if self.tracer is not None:
+                method = getattr(request_options.method, 'value', request_options.method)
+                started.request = (time.perf_counter(), method, request_options.url)
+
+        def _after(response):
+            request = getattr(started, 'request', None)
+            started.request = None
+            if self.tracer is not None and request is not None:
+                start, method, url = request
+                self.tracer.record(f'{method} {endpoint_template(url, self.GRAPH_ROOT)}', start, 'http', url=url,
+                                   status=getattr(response, 'status_code', None), orm=True)
+
+        try:
+            pending_request = client.pending_request()
+            pending_request.beforeExecute += _before
+            pending_request.afterExecute += _after
+        except AttributeError as e:
+            logging.debug(f'GraphClient requests cannot be traced: {e}')
@@ -0,0 +1,87 @@
+import re
+import time
+import threading
+from contextlib import contextmanager
+
+# Outlook resources below a user count against Graph's per-mailbox concurrency limit.
+_MAILBOX_PATH = re.compile(r'/(?:users/([^/?]+)|(me))/(?:messages|mailFolders|events|calendars?|calendarView|'
+                           r'contacts|contactFolders|mailboxSettings|inferenceClassification|outlook)\b')
+
+
+def mailbox_of(url: str):
+    """
+    Extracts the mailbox (user id, UPN or `me`) addressed by a Graph URL, or None when the
+    URL does not target a mailbox resource.
+    """
+    match = _MAILBOX_PATH.search(url)
+    if match is None:
+        return None
+    return (match.group(1) or match.group(2)).lower()
+
+
+class KeyedSemaphore:
+    """
+    Bounded semaphores created on demand per key, limiting how many callers hold the same
+    key at once. Semaphores of keys nobody holds are discarded, so the number of distinct
+    keys seen over time does not grow memory.
+
+    :ivar limit: The maximum number of concurrent holders per key.
+    :type limit: int
+    """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._semaphores.get(key)
+            if entry is None:
+                entry = self._semaphores[key] = [threading.BoundedSemaphore(self.limit), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._semaphores[key]
+
+
+class ThrottleGate:
+    """
+    Shares `Retry-After` pauses between threads. Once one request is throttled, every other
+    request for the same key waits out the pause instead of being sent into the throttle.
+    Keys are mailboxes for mailbox resources and endpoint templates for everything else,
+    so a throttled endpoint does not hold up requests to unrelated ones.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paused_until = {}
+
+    def pause(self, key, seconds: float):
+        until = time.monotonic() + seconds
+        with self._lock:
+            if until > self._paused_until.get(key, 0):
+                self._paused_until[key] = until
+
+    def remaining(self, key) -> float:
+        now = time.monotonic()
+        with self._lock:
+            until = self._paused_until.get(key)
+            if until is None:
+                return 0.0
+            if until <= now:
+                del self._paused_until[key]
+                return 0.0
+            return until - now
+
+    def longest_pause(self) -> float:
+        """
+        Returns the seconds until the last of the current pauses ends, 0 when none is active.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return max([until - now for until in self._paused_until.values()] + [0.0])
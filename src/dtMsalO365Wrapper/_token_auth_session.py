@@ -1,7 +1,42 @@
 import time
+import logging
+import threading
 import requests
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from dtMsalO365Wrapper._limits import KeyedSemaphore, ThrottleGate, mailbox_of
+from dtMsalO365Wrapper._endpoints import endpoint_template
+from dtMsalO365Wrapper._deadline import DeadlineRetry, DeadlineExceeded, current_deadline
+from dtMsalO365Wrapper._deadline import deadline as deadline_scope
+from dtMsalO365Wrapper._circuit_breaker import CircuitOpenError, guarding
+from dtMsalO365Wrapper._tracing import bind_context
+
+
+def create_http_adapter(pool_connections=10, pool_maxsize=10):
+    """
+    Creates the HTTP adapter mounted by `TokenAuthSession`, configured to retry transient
+    server errors. A single adapter may be shared by many sessions so that they draw on one
+    connection pool per host.
+
+    :param pool_connections: The number of per-host connection pools to keep.
+    :type pool_connections: int
+    :param pool_maxsize: The maximum number of connections kept per host.
+    :type pool_maxsize: int
+    :return: The configured adapter.
+    :rtype: HTTPAdapter
+    """
+    # Configure retries for transient errors (except 429, which we handle separately).
+    # Backoff sleeps are cut short by, and retries stop at, the caller's deadline.
+    retries = DeadlineRetry(
+        total=5,
+        backoff_factor=2,  # Exponential backoff (2^retry seconds)
+        status_forcelist=[500, 502, 503],  # Retry on these HTTP errors
+        allowed_methods={"GET", "POST", "PUT", "DELETE", "PATCH"}  # Methods to retry
+    )
+    return HTTPAdapter(max_retries=retries, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+
 
 class TokenAuthSession(requests.Session):
     """
@@ -19,21 +54,68 @@ class TokenAuthSession(requests.Session):
     :ivar root_url: Base URL for the API. This will be prefixed to all requested
         URLs to construct the complete endpoint path.
     :type root_url: str
+    :ivar tenant_id: Tenant the session authenticates against. Used to partition the response cache.
+    :type tenant_id: str | None
+    :ivar response_cache: Optional `ResponseCache` consulted for `GET` requests. None disables caching.
+    :type response_cache: ResponseCache | None
+    :ivar http_adapter: The adapter mounted for `https://`, possibly shared with other sessions.
+    :type http_adapter: HTTPAdapter
+    :ivar mailbox_limiter: Caps concurrent requests per mailbox when set through
+        `set_mailbox_concurrency`. None leaves mailbox requests unbounded.
+    :type mailbox_limiter: KeyedSemaphore | None
+    :ivar hedge_policy: When set, idempotent `GET` requests are hedged according to this policy.
+    :type hedge_policy: HedgePolicy | None
+    :ivar circuit_breakers: When set, requests are guarded by a circuit breaker per endpoint template.
+    :type circuit_breakers: CircuitBreakerRegistry | None
+    :ivar throttle_gate: Shares `Retry-After` pauses between the threads using the session.
+    :type throttle_gate: ThrottleGate
+    :ivar tracer: When set, every request, attempt and wait is recorded as a span.
+    :type tracer: Tracer | None
+    :ivar identity_router: When set, each attempt is authenticated as one of several app
+        registrations picked by the router, and 429 pauses apply to that registration only.
+    :type identity_router: IdentityRouter | None
+    :ivar identity_token_func: Callable `(identity, scope)` returning the token of a routed
+        identity. Defaults to `AppIdentity.acquire_token`.
+    :type identity_token_func: Callable | None
+
+    The session may be shared between threads. Requests are sent through one plain
+    `requests.Session` per thread, all mounting the same `http_adapter`, which copy the
+    `headers`, `proxies`, `verify`, `cert` and `trust_env` settings of this session when
+    a thread first sends a request.
     """
-    def __init__(self, token_func, scope, root_url='https://graph.microsoft.com/v1.0'):
+    def __init__(self, token_func, scope, root_url='https://graph.microsoft.com/v1.0', tenant_id=None,
+                 response_cache=None, http_adapter: HTTPAdapter = None):
         super().__init__()
         self.token_func = token_func
         self.root_url = root_url
         self.scope = scope
+        self.tenant_id = tenant_id
+        self.response_cache = response_cache
+        self._owns_adapter = http_adapter is None
+        self.http_adapter = http_adapter if http_adapter is not None else create_http_adapter()
+        self.mount("https://", self.http_adapter)
+        self.mailbox_limiter = None
+        self.hedge_policy = None
+        self._hedge_executors = None
+        self.circuit_breakers = None
+        self.throttle_gate = ThrottleGate()
+        self.tracer = None
+        self.identity_router = None
+        self.identity_token_func = None
+        self._local = threading.local()
+        self._transports = []
+        self._lock = threading.Lock()
+
+    def set_mailbox_concurrency(self, limit):
+        """
+        Limits how many requests against the same mailbox (messages, mail folders, events,
+        contacts, ...) may be in flight at once across all threads using this session.
+        Graph throttles a mailbox that receives more than a few concurrent requests.
 
-        # Configure retries for transient errors (except 429, which we handle separately)
-        retries = Retry(
-            total=5,
-            backoff_factor=2,  # Exponential backoff (2^retry seconds)
-            status_forcelist=[500, 502, 503],  # Retry on these HTTP errors
-            allowed_methods={"GET", "POST", "PUT", "DELETE", "PATCH"}  # Methods to retry
-        )
-        self.mount("https://", HTTPAdapter(max_retries=retries))
+        :param limit: The maximum number of concurrent requests per mailbox, or None to remove the limit.
+        :type limit: int | None
+        """
+        self.mailbox_limiter = KeyedSemaphore(limit) if limit else None
 
     def get_token(self):
         """
@@ -51,38 +133,332 @@ class TokenAuthSession(requests.Session):
         resp = self.token_func(self.scope)
         return resp['access_token']
 
-    def request(self, method, url, **kwargs):
+    def request(self, method, url, deadline=None, hedge=None, **kwargs):
         """
         Sends an HTTP request with an authorization token and handles rate-limiting responses
         automatically. This method dynamically fetches a new token for each request, utilizes
         it in the request headers, and retries the request if rate limits are hit.
 
+        Every attempt, retry backoff and rate-limit wait is bounded by the deadline in effect,
+        either set for a block with `MsalO365Client.deadline()` or for this call alone.
+
         :param method: The HTTP method to use for the request (e.g., "GET", "POST").
         :type method: str
         :param url: The relative URL path for the request to be appended to the root URL.
         :type url: str
+        :param deadline: Optional time budget of this call in seconds. It never extends an
+            enclosing deadline.
+        :type deadline: float | None
+        :param hedge: Set to False to exempt a `GET` from hedging when a `hedge_policy` is set.
+        :type hedge: bool | None
         :param kwargs: Additional keyword arguments to pass to the request, such as payload
             or custom headers.
         :type kwargs: dict
+        :raises DeadlineExceeded: If the deadline expires before a response is received.
+        :raises CircuitOpenError: If the circuit of the endpoint is open and no cached response
+            can be served instead.
         :return: The HTTP response object returned after a successful request or when
             errors other than rate-limiting are encountered.
         :rtype: requests.Response
         """
-        # Get a fresh token for each request
-        token = self.get_token()
-        kwargs.setdefault("headers", {})
-        kwargs["headers"]["Authorization"] = f"Bearer {token}"
+        if deadline is not None:
+            with deadline_scope(deadline):
+                return self.request(method, url, hedge=hedge, **kwargs)
+        if self.tracer is None:
+            return self._request(method, url, hedge, **kwargs)
+        full_url = url if url.startswith('https://') else f'{self.root_url}{url}'
+        with self.tracer.span(f'{method.upper()} {endpoint_template(full_url, self.root_url)}', 'http',
+                              url=full_url) as span:
+            response = self._request(method, url, hedge, **kwargs)
+            span.args['status'] = response.status_code
+            if getattr(response, 'from_cache', False):
+                span.args['from_cache'] = True
+            return response
 
-        while True:
-            if url.startswith('https://'):
-                response = super().request(method, f'{url}', **kwargs)
+    def _request(self, method, url, hedge, **kwargs):
+        _deadline = current_deadline()
+        if _deadline is not None:
+            _deadline.check(f'{method} {url}')
+
+        kwargs["headers"] = dict(kwargs.get("headers") or {})  # never mutate a caller's dict shared across threads
+        router = self.identity_router
+        if router is None:
+            # Get a fresh token for each request
+            kwargs["headers"]["Authorization"] = f"Bearer {self.get_token()}"
+
+        full_url = url if url.startswith('https://') else f'{self.root_url}{url}'
+        cache = self.response_cache
+        cache_key = cached = ttl = None
+        if cache is not None:
+            if method.upper() == 'GET':
+                ttl = cache.ttl_for(self._relative_path(full_url))
+                if ttl is not None:
+                    cache_key = cache.make_key(self.tenant_id, self.scope, full_url, kwargs.get('params'),
+                                               kwargs['headers'])
+                    cached = cache.lookup(cache_key)
+                    if cached is not None and cached.fresh:
+                        cache.record_hit()
+                        return cache.to_response(cached)
+                    if cached is not None and cached.etag:
+                        kwargs["headers"]["If-None-Match"] = cached.etag
             else:
-                response = super().request(method, f'{self.root_url}{url}', **kwargs)
+                self._invalidate_written(full_url)
+
+        breaker = None
+        if self.circuit_breakers is not None:
+            breaker = self.circuit_breakers.get(endpoint_template(full_url, self.root_url))
+
+        hedged = self.hedge_policy is not None and hedge is not False and method.upper() == 'GET'
+        # Pauses are shared per mailbox, or per endpoint for requests outside mailboxes.
+        throttle_key = mailbox_of(full_url) or endpoint_template(full_url, self.root_url)
+        attempt = 0
+        while True:
+            identity = None
+            throttle_gate = self.throttle_gate
+            if router is not None:
+                identity = router.select(throttle_key)
+                throttle_gate = identity.throttle_gate
+                kwargs["headers"]["Authorization"] = f"Bearer {self._identity_token(identity)}"
+            pause = throttle_gate.remaining(throttle_key)
+            if pause:
+                if _deadline is not None and pause >= _deadline.remaining():
+                    raise DeadlineExceeded(f'Rate limited for {pause:.1f}s, beyond the deadline of {method} {url}')
+                started = time.perf_counter()
+                time.sleep(pause)
+                if self.tracer is not None:
+                    self.tracer.record('throttle.wait', started, key=throttle_key)
+
+            if breaker is not None and not breaker.allow():
+                if cached is not None:  # Serve stale content rather than failing outright
+                    return cache.to_response(cached)
+                raise CircuitOpenError(breaker.template, breaker.retry_in())
+
+            attempt += 1
+            guard = guarding(breaker) if breaker is not None else nullcontext()
+            tracking = router.track(identity) if identity is not None else nullcontext()
+            attempt_span = self.tracer.span('attempt', 'http', attempt=attempt, hedged=hedged) \
+                if self.tracer is not None else nullcontext()
+            guard_state = None
+            try:
+                with guard as guard_state, tracking, attempt_span as span:
+                    response = self._send_hedged(method, full_url, **kwargs) if hedged \
+                        else self._send(method, full_url, **kwargs)
+                    if span is not None:
+                        span.args['status'] = response.status_code
+                        if identity is not None:
+                            span.args['client_id'] = identity.client_id
+            except Exception as e:
+                if breaker is not None:
+                    if isinstance(e, requests.exceptions.RetryError) and breaker.is_open:
+                        # The retries already recorded their failures and opened the circuit
+                        raise CircuitOpenError(breaker.template, breaker.retry_in()) from e
+                    if guard_state is None or not guard_state.recorded:
+                        breaker.record(False)
+                raise
+            if breaker is not None:
+                if response.status_code == 429:
+                    breaker.release()  # Throttling says nothing about the endpoint's health
+                else:
+                    breaker.record(response.status_code not in self.circuit_breakers.failure_statuses)
 
             if response.status_code == 429:  # Handle Rate Limiting
                 retry_after = int(response.headers.get("Retry-After", 5))  # Default to 5s if not provided
-                print(f"Rate limited! Retrying after {retry_after} seconds...")
-                time.sleep(retry_after)
+                if identity is not None:
+                    # Only this app registration is paused; the retry goes to another one when possible
+                    identity.record_throttle(throttle_key, retry_after)
+                    if _deadline is not None and router.wait_time(throttle_key) >= _deadline.remaining():
+                        raise DeadlineExceeded(f'Rate limited for {retry_after}s on every app registration, '
+                                               f'beyond the deadline of {method} {url}')
+                    logging.warning(f'Rate limited for {identity.client_id}, retrying after {retry_after} seconds...')
+                    continue
+                if _deadline is not None and retry_after >= _deadline.remaining():
+                    raise DeadlineExceeded(f'Rate limited for {retry_after}s, beyond the deadline of {method} {url}')
+                logging.warning(f'Rate limited, retrying after {retry_after} seconds...')
+                self.throttle_gate.pause(throttle_key, retry_after)  # Other threads wait out the same pause
                 continue  # Retry the request
 
-            return response  # Return successful response or other non-retry errors
\ No newline at end of file
+            if cache_key is not None:
+                if response.status_code == 304 and cached is not None:
+                    cache.record_revalidation()
+                    cache.refresh(cache_key, cached, ttl)
+                    return cache.to_response(cached, response.request)
+                cache.record_miss()
+                if response.status_code == 200:
+                    cache.store(cache_key, self.tenant_id, self.scope, full_url, ttl, response)
+
+            return response  # Return successful response or other non-retry errors
+
+    def _identity_token(self, identity):
+        if self.identity_token_func is not None:
+            return self.identity_token_func(identity, self.scope)['access_token']
+        return identity.acquire_token(self.scope)['access_token']
+
+    def _send(self, method, full_url, **kwargs):
+        _deadline = current_deadline()
+        if _deadline is not None:
+            left = _deadline.remaining()
+            if left <= 0:
+                raise DeadlineExceeded(f'{method} {full_url} exceeded its deadline')
+            timeout = kwargs.get('timeout')
+            if timeout is None:
+                kwargs['timeout'] = left
+            elif isinstance(timeout, tuple):
+                kwargs['timeout'] = tuple(left if t is None else min(t, left) for t in timeout)
+            else:
+                kwargs['timeout'] = min(timeout, left)
+
+        mailbox = mailbox_of(full_url) if self.mailbox_limiter is not None else None
+        try:
+            started = time.perf_counter()
+            with self.mailbox_limiter.hold(mailbox) if mailbox else nullcontext():
+                if mailbox and self.tracer is not None and time.perf_counter() - started > 0.001:
+                    self.tracer.record('mailbox.wait', started, mailbox=mailbox)
+                return self._transport().request(method, full_url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            if _deadline is not None and _deadline.expired:
+                raise DeadlineExceeded(f'{method} {full_url} exceeded its deadline') from e
+            raise
+
+    def _transport(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", self.http_adapter)
+            session.headers = self.headers.copy()
+            session.proxies = dict(self.proxies)
+            session.verify = self.verify
+            session.cert = self.cert
+            session.trust_env = self.trust_env
+            self._local.session = session
+            with self._lock:
+                self._transports.append(session)
+        return session
+
+    def _send_hedged(self, method, full_url, **kwargs):
+        """
+        Sends a request and, if it is still unanswered after the endpoint's hedge delay, sends
+        a duplicate. The first successful response wins; the slower attempt is left to finish
+        in the background.
+        """
+        policy = self.hedge_policy
+        template = endpoint_template(full_url, self.root_url)
+        delay = policy.delay_for(template)
+        started = time.monotonic()
+        if delay is None:
+            response = self._send(method, full_url, **kwargs)
+            policy.record(template, time.monotonic() - started)
+            return response
+
+        if self._hedge_executors is None:
+            with self._lock:
+                if self._hedge_executors is None:
+                    # First attempts and hedges get pools of their own, so that under load a
+                    # first attempt never waits in the queue behind other requests' hedges.
+                    self._hedge_executors = (
+                        ThreadPoolExecutor(max_workers=policy.max_workers, thread_name_prefix='TokenAuthSession-primary'),
+                        ThreadPoolExecutor(max_workers=policy.max_workers, thread_name_prefix='TokenAuthSession-hedge'))
+        primaries, hedges = self._hedge_executors
+
+        def _attempt(executor):
+            attempt_kwargs = dict(kwargs, headers=dict(kwargs['headers']))
+            return executor.submit(bind_context(self._send), method, full_url, **attempt_kwargs)
+
+        primary = _attempt(primaries)
+        attempts = [primary]
+        done, _ = wait(attempts, timeout=delay)
+        _deadline = current_deadline()
+        if not done and (_deadline is None or not _deadline.expired):
+            policy.record_hedge()
+            attempts.append(_attempt(hedges))
+
+        error = None
+        while attempts:
+            done, _ = wait(attempts, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempts.remove(future)
+                if future.exception() is None:
+                    if future is not primary:
+                        policy.record_hedge_win()
+                    policy.record(template, time.monotonic() - started)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def get_paged(self, url, **kwargs):
+        """
+        Iterates over the items of a paged collection, following `@odata.nextLink` until
+        the last page has been read. Pages are only requested as the caller consumes items.
+
+        :param url: Relative or absolute URL of the collection.
+        :type url: str
+        :param kwargs: Additional keyword arguments for the first request, such as `params`
+            or `headers`. Headers are re-sent with every page.
+        :type kwargs: dict
+        :raises RuntimeError: If any page is not returned with status 200.
+        :return: A generator yielding the raw JSON items of the collection.
+        :rtype: Iterator[dict]
+        """
+        headers = kwargs.pop('headers', None)
+        while url:
+            resp = self.request('GET', url, headers=dict(headers or {}), **kwargs)
+            if resp.status_code != 200:
+                raise RuntimeError(f'Failed to get page of {url}: {resp.status_code} -> {resp.text}')
+            body = resp.json()
+            yield from body.get('value', [])
+            url = body.get('@odata.nextLink')
+            kwargs.pop('params', None)  # nextLink already carries the query
+
+    def _relative_path(self, full_url):
+        path = full_url.split('?')[0]
+        if path.startswith(self.root_url):
+            path = path[len(self.root_url):]
+        return path
+
+    def _invalidate_written(self, full_url):
+        """
+        Drops the cached responses a write to `full_url` may have made stale: the resource,
+        everything below it and the listing of its parent collection.
+        """
+        path = full_url.split('?')[0].rstrip('/')
+        self.response_cache.invalidate(tenant_id=self.tenant_id, scope=self.scope, url_prefix=path)
+        parent = path.rsplit('/', 1)[0]
+        if parent.startswith(self.root_url) and len(parent) > len(self.root_url):
+            self.response_cache.invalidate(tenant_id=self.tenant_id, scope=self.scope, url=parent)
+
+    def invalidate_cache(self, url=None):
+        """
+        Drops cached responses of this session's tenant and scope, optionally limited to
+        the entries below a given URL.
+
+        :param url: Relative or absolute URL prefix whose cached entries should be removed.
+            Removes every entry of the session when not supplied.
+        :type url: str | None
+        :return: The number of removed entries, or 0 when caching is disabled.
+        :rtype: int
+        """
+        if self.response_cache is None:
+            return 0
+        url_prefix = None
+        if url is not None:
+            url_prefix = url if url.startswith('https://') else f'{self.root_url}{url}'
+        return self.response_cache.invalidate(tenant_id=self.tenant_id, scope=self.scope, url_prefix=url_prefix)
+
+    def close(self):
+        """
+        Stops the hedging threads, closes the per-thread transport sessions of every thread
+        and closes the HTTP adapter, unless it was supplied by the caller and may still be
+        used by other sessions.
+        """
+        with self._lock:
+            executors, self._hedge_executors = self._hedge_executors, None
+            transports, self._transports = self._transports, []
+            self._local = threading.local()
+        for session in transports:
+            # The shared adapter is closed below, and only if this session owns it.
+            for adapter in session.adapters.values():
+                if adapter is not self.http_adapter:
+                    adapter.close()
+        for pool in executors or ():
+            pool.shutdown(wait=False)
+        if self._owns_adapter:
+            super().close()
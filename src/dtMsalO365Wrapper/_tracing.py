@@ -0,0 +1,208 @@
+import json
+import time
+import inspect
+import threading
+import functools
+import itertools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+_current_span = contextvars.ContextVar('dtMsalO365Wrapper_span', default=None)
+
+
+class Span:
+    """
+    A timed section of a trace: a library operation, an HTTP request or a wait.
+
+    :ivar tracer: The tracer recording the span.
+    :type tracer: Tracer
+    :ivar span_id: Identifier of the span, unique within its tracer.
+    :type span_id: int
+    :ivar parent_id: Identifier of the enclosing span, which may run on another thread.
+    :type parent_id: int | None
+    :ivar args: Details shown with the span, such as URL or status code.
+    :type args: dict
+    """
+    __slots__ = ('tracer', 'name', 'category', 'span_id', 'parent_id', 'thread_id', 'start', 'end', 'args')
+
+    def __init__(self, tracer, name: str, category: str, parent_id, args: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.span_id = next(tracer._ids)
+        self.parent_id = parent_id
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+        self.args = args
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Tracer:
+    """
+    Records spans of library operations, HTTP requests, token acquisitions and waits, and
+    exports them in the Chrome trace event format (viewable in chrome://tracing or Perfetto).
+
+    The active span is kept in a context variable, so spans opened while another is active
+    become its children, including on executor threads the library hands work to. Children
+    running on another thread than their parent are linked to it with flow arrows.
+
+    :ivar max_spans: The number of finished spans kept; older spans are dropped beyond it.
+    :type max_spans: int
+    :ivar dropped: The number of spans dropped because of `max_spans`.
+    :type dropped: int
+    """
+    def __init__(self, max_spans: int = 1_000_000):
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._spans = deque(maxlen=max_spans)
+        self._thread_names = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str = 'operation', **args):
+        """
+        Records the `with` block as a span, nested below the span active in the calling context.
+
+        :return: A context manager yielding the `Span`, whose `args` may be amended.
+        """
+        parent = _current_span.get()
+        span = Span(self, name, category, parent.span_id if parent is not None else None, args)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.args['error'] = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            self._finish(span)
+
+    def record(self, name: str, start: float, category: str = 'wait', **args):
+        """
+        Records a span that started at `start` (a `time.perf_counter()` value) and ends now.
+        """
+        parent = _current_span.get()
+        span = Span(self, name, category, parent.span_id if parent is not None else None, args)
+        span.start = start
+        span.end = time.perf_counter()
+        self._finish(span)
+
+    def _finish(self, span: Span):
+        with self._lock:
+            if span.thread_id not in self._thread_names:
+                self._thread_names[span.thread_id] = threading.current_thread().name
+            if len(self._spans) == self.max_spans:
+                self.dropped += 1
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> list:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+            self.dropped = 0
+
+    def summary(self) -> dict:
+        """
+        Aggregates the recorded spans by name, which makes N+1 patterns stand out as names
+        with a high count.
+
+        :return: `count`, `total` and `max` seconds per span name, slowest total first.
+        :rtype: dict[str, dict]
+        """
+        totals = {}
+        for span in self.spans:
+            entry = totals.setdefault(span.name, {'count': 0, 'total': 0.0, 'max': 0.0})
+            entry['count'] += 1
+            entry['total'] += span.duration
+            entry['max'] = max(entry['max'], span.duration)
+        return dict(sorted(totals.items(), key=lambda kv: kv[1]['total'], reverse=True))
+
+    def to_chrome_trace(self) -> dict:
+        """
+        Renders the recorded spans as a Chrome trace: one complete event per span on the
+        thread it ran on, plus flow events from parents to children on other threads.
+
+        :rtype: dict
+        """
+        spans = self.spans
+        with self._lock:
+            thread_names = dict(self._thread_names)
+        by_id = {s.span_id: s for s in spans}
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in thread_names.items()]
+        for s in spans:
+            ts = (s.start - self._origin) * 1e6
+            events.append({'name': s.name, 'cat': s.category, 'ph': 'X', 'pid': 1, 'tid': s.thread_id,
+                           'ts': ts, 'dur': s.duration * 1e6,
+                           'args': dict(s.args, span_id=s.span_id, parent_id=s.parent_id)})
+            parent = by_id.get(s.parent_id)
+            if parent is not None and parent.thread_id != s.thread_id:
+                events.append({'name': 'spawn', 'cat': 'flow', 'ph': 's', 'id': s.span_id, 'pid': 1,
+                               'tid': parent.thread_id, 'ts': ts})
+                events.append({'name': 'spawn', 'cat': 'flow', 'ph': 'f', 'bp': 'e', 'id': s.span_id, 'pid': 1,
+                               'tid': s.thread_id, 'ts': ts})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str):
+        """
+        Writes the trace as Chrome trace JSON to `path`.
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+
+
+def current_span():
+    """
+    Returns the span active in the calling context, or None when nothing is being traced.
+    """
+    return _current_span.get()
+
+
+def traced(name: str = None):
+    """
+    Decorates a method of a subsystem so that each call is recorded as an operation span
+    when the tracer of the subsystem's token session is enabled. Without a tracer the
+    call runs unchanged. Generator functions are not supported; the requests they make
+    are traced on their own.
+    """
+    def decorator(fn):
+        if inspect.isgeneratorfunction(fn):
+            raise TypeError(f'Cannot trace generator function {fn.__qualname__}')
+        span_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            session = getattr(self, '_token_auth_session', None)
+            tracer = getattr(session, 'tracer', None)
+            if tracer is None:
+                return fn(self, *args, **kwargs)
+            with tracer.span(span_name):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind_context(fn):
+    """
+    Binds `fn` to a copy of the caller's context, so that the active span and deadline carry
+    over when it is run on another thread. Each call runs in its own copy, which lets the
+    bound function be used by several threads at once.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def _run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return _run
@@ -0,0 +1,183 @@
+import re
+import time
+import threading
+import hashlib
+import logging
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from dtMsalO365Wrapper.cache.backend import CacheEntry, MemoryCacheBackend, SQLiteCacheBackend
+
+__all__ = ['ResponseCache', 'CachePolicy', 'CacheEntry', 'MemoryCacheBackend', 'SQLiteCacheBackend']
+
+# Segments such as `$count` or `delta()` name functions whose results change with every
+# call; paths containing them are never cached, whatever the policies say.
+_FUNCTION_SEGMENT = re.compile(r'/(\$|delta(\(\))?(/|$))')
+# A path segment naming an entity rather than a function.
+_ID = r'(?!\$|delta(?:\(\))?(?:/|$))[^/]+'
+
+
+class CachePolicy:
+    """
+    Time-to-live rule for responses whose path matches a regular expression.
+
+    A TTL of 0 keeps the response only for `If-None-Match` revalidation, so every call
+    still reaches Graph but unchanged resources come back as a body-less 304. A TTL of
+    `None` disables caching for matching paths altogether.
+
+    :ivar pattern: Compiled regular expression matched against the request path.
+    :type pattern: re.Pattern
+    :ivar ttl: Number of seconds a response is served without revalidation.
+    :type ttl: int | None
+    """
+    def __init__(self, pattern: str, ttl):
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+
+    def matches(self, path: str):
+        return self.pattern.search(path) is not None
+
+
+class ResponseCache:
+    """
+    Conditional-request cache for `GET` calls made through a `TokenAuthSession`.
+
+    Responses are keyed by tenant, token scope, URL, query parameters and the request
+    headers that change what Graph returns. Within the TTL of the first matching policy
+    a response is served without a round trip; once it has expired the stored ETag is
+    sent as `If-None-Match` and a 304 reply is answered from the cache. Write requests
+    made through the same session invalidate the written URL, every entry below it and
+    the listing of the collection containing it.
+
+    :ivar backend: Storage backend, e.g. `MemoryCacheBackend` or `SQLiteCacheBackend`.
+    :ivar policies: Ordered list of `CachePolicy` rules; the first match wins.
+    :type policies: list[CachePolicy]
+    :ivar default_ttl: TTL applied when no policy matches. `None` disables caching.
+    :type default_ttl: int | None
+    """
+
+    VARY_HEADERS = ('ConsistencyLevel', 'Prefer', 'Accept')
+
+    DEFAULT_POLICIES = [
+        CachePolicy(rf'^/teams/{_ID}/(all)?[cC]hannels(/{_ID})?$', 300),
+        CachePolicy(rf'^/teams/{_ID}$', 300),
+        CachePolicy(rf'^/users/{_ID}/mailFolders/{_ID}$', 300),
+        CachePolicy(rf'^/users/{_ID}$', 300),
+    ]
+
+    def __init__(self, backend=None, policies: list = None, default_ttl=None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.policies = policies if policies is not None else list(self.DEFAULT_POLICIES)
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def record_revalidation(self):
+        with self._lock:
+            self.revalidations += 1
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def ttl_for(self, path: str):
+        """
+        Resolves the TTL of the first policy matching the given request path.
+
+        :param path: The request path relative to the API root, e.g. `/teams/{id}/allChannels`.
+        :type path: str
+        :return: The TTL in seconds, or `None` if the path must not be cached. Paths calling
+            a function such as `$count` or `delta` are never cached.
+        :rtype: int | None
+        """
+        if _FUNCTION_SEGMENT.search(path):
+            return None
+        for policy in self.policies:
+            if policy.matches(path):
+                return policy.ttl
+        return self.default_ttl
+
+    @classmethod
+    def make_key(cls, tenant_id, scope, url, params=None, headers=None):
+        if params:
+            items = params.items() if isinstance(params, dict) else params
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(sorted(items))}"
+        vary = []
+        if headers:
+            lowered = {k.lower(): v for k, v in headers.items()}
+            vary = [f'{h}={lowered[h.lower()]}' for h in cls.VARY_HEADERS if h.lower() in lowered]
+        raw = '\n'.join([tenant_id or '', scope or '', url] + vary)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        return self.backend.get(key)
+
+    def store(self, key, tenant_id, scope, url, ttl, response: requests.Response):
+        """
+        Stores a successful response, recording its ETag for later revalidation.
+
+        Responses without an ETag are only kept when the policy grants a positive TTL,
+        since there would be no way to revalidate them cheaply.
+        """
+        etag = response.headers.get('ETag')
+        if etag is None and 'json' in response.headers.get('Content-Type', ''):
+            try:
+                body = response.json()
+                etag = body.get('@odata.etag') if isinstance(body, dict) else None
+            except ValueError:
+                etag = None
+        if not ttl and etag is None:
+            return
+        headers = {k: v for k, v in response.headers.items() if k.lower() in ('content-type', 'etag')}
+        entry = CacheEntry(url, tenant_id, scope, response.status_code, headers, response.content, etag,
+                           time.time() + (ttl or 0))
+        self.backend.set(key, entry)
+
+    def refresh(self, key, entry: CacheEntry, ttl):
+        entry.expires_at = time.time() + (ttl or 0)
+        self.backend.set(key, entry)
+
+    def invalidate(self, tenant_id=None, scope=None, url_prefix=None, url=None):
+        """
+        Removes cached entries matching every supplied criterion.
+
+        :param tenant_id: Only remove entries belonging to this tenant.
+        :type tenant_id: str | None
+        :param scope: Only remove entries fetched with this token scope.
+        :type scope: str | None
+        :param url_prefix: Only remove entries for this absolute URL or a path below it. The
+            prefix matches whole path segments, so `/users/abc` does not match `/users/abcdef`.
+        :type url_prefix: str | None
+        :param url: Only remove entries for exactly this absolute URL, with any query string,
+            e.g. the listing of a collection but not its items.
+        :type url: str | None
+        :return: The number of removed entries.
+        :rtype: int
+        """
+        removed = self.backend.invalidate(tenant_id=tenant_id, scope=scope, url_prefix=url_prefix, url=url)
+        logging.debug(f'Invalidated {removed} cached responses (prefix: {url_prefix}, url: {url})')
+        return removed
+
+    def clear(self):
+        self.backend.clear()
+
+    @staticmethod
+    def to_response(entry: CacheEntry, request=None) -> requests.Response:
+        response = requests.Response()
+        response.status_code = entry.status_code
+        response._content = entry.content
+        response.headers = CaseInsensitiveDict(entry.headers)
+        response.url = entry.url
+        response.encoding = 'utf-8'
+        response.reason = 'OK'
+        response.request = request
+        response.from_cache = True
+        return response
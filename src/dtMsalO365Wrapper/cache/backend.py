@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheEntry:
+    """
+    A single cached HTTP response together with the validators needed to revalidate it.
+
+    :ivar url: The absolute URL the response was fetched from.
+    :type url: str
+    :ivar tenant_id: The tenant the response belongs to.
+    :type tenant_id: str | None
+    :ivar scope: The token scope the response was fetched with.
+    :type scope: str
+    :ivar status_code: The HTTP status code of the cached response.
+    :type status_code: int
+    :ivar headers: The subset of response headers retained with the entry.
+    :type headers: dict
+    :ivar content: The raw response body.
+    :type content: bytes
+    :ivar etag: The entity tag of the response, used for `If-None-Match` revalidation.
+    :type etag: str | None
+    :ivar expires_at: Epoch time after which the entry must be revalidated.
+    :type expires_at: float
+    """
+    __slots__ = ('url', 'tenant_id', 'scope', 'status_code', 'headers', 'content', 'etag', 'expires_at')
+
+    def __init__(self, url, tenant_id, scope, status_code, headers, content, etag, expires_at):
+        self.url = url
+        self.tenant_id = tenant_id
+        self.scope = scope
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.etag = etag
+        self.expires_at = expires_at
+
+    @property
+    def fresh(self):
+        return time.time() < self.expires_at
+
+    def matches(self, tenant_id=None, scope=None, url_prefix=None, url=None):
+        if tenant_id is not None and self.tenant_id != tenant_id:
+            return False
+        if scope is not None and self.scope != scope:
+            return False
+        if url_prefix is not None and not _below(self.url, url_prefix):
+            return False
+        if url is not None and self.url != url and not self.url.startswith(url + '?'):
+            return False
+        return True
+
+
+def _below(url: str, prefix: str) -> bool:
+    """
+    Tells whether `url` is `prefix` itself, with or without a query, or a path below it.
+    """
+    prefix = prefix.rstrip('/')
+    return url == prefix or url.startswith(prefix + '/') or url.startswith(prefix + '?')
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU cache backend.
+
+    Entries are held in an ordered dictionary and the least recently used entry is
+    discarded once `max_entries` is reached. The backend is safe to share between threads.
+
+    :ivar max_entries: Maximum number of entries retained before eviction.
+    :type max_entries: int
+    """
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry: CacheEntry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, tenant_id=None, scope=None, url_prefix=None, url=None):
+        with self._lock:
+            keys = [k for k, e in self._entries.items() if e.matches(tenant_id, scope, url_prefix, url)]
+            for k in keys:
+                del self._entries[k]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Persistent cache backend storing entries in a SQLite database.
+
+    Useful when the cache should survive process restarts or be shared between worker
+    processes on the same host. Least recently used entries are pruned once the table
+    grows past `max_entries`.
+
+    :ivar path: Path of the SQLite database file.
+    :type path: str
+    :ivar max_entries: Maximum number of entries retained before pruning.
+    :type max_entries: int
+    """
+    def __init__(self, path, max_entries=100000):
+        # Imported here so that `import dtMsalO365Wrapper` does not load sqlite3 for in-memory caches.
+        import sqlite3
+
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS response_cache ('
+                           'key TEXT PRIMARY KEY, url TEXT NOT NULL, tenant_id TEXT, scope TEXT, '
+                           'status_code INTEGER, headers TEXT, content BLOB, etag TEXT, '
+                           'expires_at REAL, accessed_at REAL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_url ON response_cache (url)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_response_cache_accessed ON response_cache (accessed_at)')
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute('SELECT url, tenant_id, scope, status_code, headers, content, etag, expires_at '
+                                     'FROM response_cache WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE response_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+        url, tenant_id, scope, status_code, headers, content, etag, expires_at = row
+        return CacheEntry(url, tenant_id, scope, status_code, json.loads(headers), content, etag, expires_at)
+
+    def set(self, key, entry: CacheEntry):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               (key, entry.url, entry.tenant_id, entry.scope, entry.status_code,
+                                json.dumps(entry.headers), entry.content, entry.etag, entry.expires_at,
+                                time.time()))
+            self._conn.execute('DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache '
+                               'ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def invalidate(self, tenant_id=None, scope=None, url_prefix=None, url=None):
+        clauses, params = [], []
+        if tenant_id is not None:
+            clauses.append('tenant_id = ?')
+            params.append(tenant_id)
+        if scope is not None:
+            clauses.append('scope = ?')
+            params.append(scope)
+        if url_prefix is not None:
+            url_prefix = url_prefix.rstrip('/')
+            clauses.append('(url = ? OR substr(url, 1, ?) IN (?, ?))')
+            params.extend([url_prefix, len(url_prefix) + 1, url_prefix + '/', url_prefix + '?'])
+        if url is not None:
+            clauses.append('(url = ? OR substr(url, 1, ?) = ?)')
+            params.extend([url, len(url) + 1, url + '?'])
+        where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+        with self._lock:
+            cursor = self._conn.execute(f'DELETE FROM response_cache{where}', params)
+            self._conn.commit()
+            return cursor.rowcount
+
+    def clear(self):
+        self.invalidate()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0]
@@ -1,9 +1,19 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.collection import UserCollection
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+from dtMsalO365Wrapper._tracing import traced, bind_context
+from dtMsalO365Wrapper.communications.presence_history import PresenceHistory
 
+import time
 import logging
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
 
 class Communications:
 
@@ -25,6 +35,7 @@ class Communications:
         self._token_auth_session = token_auth_session
 
 
+    @traced('Communications.get_presence')
     def get_presence(self, users, batch_size = 650):
         """
         Fetches the presence of users by processing them in batches and associating the results
@@ -45,28 +56,74 @@ class Communications:
         :return: A consolidated list of presence data with associated user information.
         :rtype: list
         """
-        _users = users
-        _ids = [u.id for u in _users]
-        consolidated_results = []  # Store all results
+        return list(self.iter_presence(users, batch_size))
 
-        # Process users in batches
-        for i in range(0, len(_ids), batch_size):
-            batch_ids = _ids[i:i + batch_size]
-            logging.info(f"Processing batch {i // batch_size + 1} ({len(batch_ids)} users)...")
+    def iter_presence(self, users, batch_size=650, prefetch=2):
+        """
+        Streams the presence of users, consuming `users` lazily (e.g. straight from
+        `Users.iter_all()`) in batches of `batch_size`. Up to `prefetch` presence requests are
+        in flight while earlier results are consumed, so fetching overlaps with whatever the
+        caller does with the rows. Results keep the order of the batches, and each carries
+        its user under `'user'`. Batches that fail are logged and skipped.
 
+        :param users: Iterable of user objects exposing `id`.
+        :type users: Iterable
+        :param batch_size: The number of users per `getPresencesByUserId` request.
+        :type batch_size: int
+        :param prefetch: The number of batch requests running ahead of the consumer.
+        :type prefetch: int
+        :return: A generator yielding presence dicts.
+        :rtype: Iterator[dict]
+        """
+        def _fetch(batch_no, batch):
+            logging.info(f"Processing batch {batch_no} ({len(batch)} users)...")
             response = self._token_auth_session.request(
                 "POST",
                 "/communications/getPresencesByUserId",
-                json={"ids": batch_ids}
+                json={"ids": [u.id for u in batch]}
             )
+            if not response.ok:
+                logging.error(f"Error processing batch {batch_no}: {response.status_code} -> {response.content}")
+                return []
+            by_id = {u.id: u for u in batch}
+            results = response.json()['value']
+            for a in results:
+                if a['id'] in by_id:
+                    a['user'] = by_id[a['id']]
+            return results
+
+        _fetch = bind_context(_fetch)
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=max(prefetch, 1), thread_name_prefix='PresenceFetch') as executor:
+            for batch_no, batch in enumerate(_chunks(users, batch_size), start=1):
+                if len(pending) >= max(prefetch, 1):
+                    yield from pending.popleft().result()
+                pending.append(executor.submit(_fetch, batch_no, batch))
+            while pending:
+                yield from pending.popleft().result()
+
+    @traced('Communications.record_presence')
+    def record_presence(self, users, history: PresenceHistory, batch_size=650, prefetch=2) -> int:
+        """
+        Polls the presence of users once and records it in a `PresenceHistory`, which keeps
+        only the users whose presence changed since the previous poll. All rows of the poll
+        are recorded with the time the poll started.
+
+        :param users: Iterable of user objects exposing `id`.
+        :type users: Iterable
+        :param history: The history to record the poll in.
+        :type history: PresenceHistory
+        :return: The number of presence changes recorded.
+        :rtype: int
+        """
+        polled_at = time.time()
+        return history.record(self.iter_presence(users, batch_size, prefetch), polled_at)
+
 
-            if response.ok:
-                consolidated_results.extend(response.json()['value'])  # Store successful results
-            else:
-                logging.error(f"Error processing batch {i // batch_size + 1}: {response.status_code} -> {response.content}")
-        for a in consolidated_results:
-            for u in _users:
-                if a['id'] == u.id:
-                    a['user'] = u
-                    break
-        return consolidated_results
\ No newline at end of file
+def _chunks(items, size):
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,91 @@
+import datetime
+from enum import IntEnum
+
+
+class Availability(IntEnum):
+    """
+    The `availability` of a presence as a small integer code.
+    """
+    PresenceUnknown = 0
+    Available = 1
+    AvailableIdle = 2
+    Away = 3
+    BeRightBack = 4
+    Busy = 5
+    BusyIdle = 6
+    DoNotDisturb = 7
+    Offline = 8
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Returns the code of a Graph availability string; values unknown to this enum map to
+        `PresenceUnknown`.
+        """
+        return cls.__members__.get(value, cls.PresenceUnknown)
+
+
+class Activity(IntEnum):
+    """
+    The `activity` of a presence as a small integer code.
+    """
+    PresenceUnknown = 0
+    Available = 1
+    Away = 2
+    BeRightBack = 3
+    Busy = 4
+    DoNotDisturb = 5
+    InACall = 6
+    InAConferenceCall = 7
+    Inactive = 8
+    InAMeeting = 9
+    Offline = 10
+    OffWork = 11
+    OutOfOffice = 12
+    Presenting = 13
+    UrgentInterruptionsOnly = 14
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Returns the code of a Graph activity string; values unknown to this enum map to
+        `PresenceUnknown`.
+        """
+        return cls.__members__.get(value, cls.PresenceUnknown)
+
+
+class PresenceRun:
+    """
+    A period during which a user's presence did not change.
+
+    :ivar start: Start of the run, in seconds since the epoch.
+    :type start: int
+    :ivar end: End of the run (exclusive), in seconds since the epoch.
+    :type end: int
+    :ivar availability: The availability during the run.
+    :type availability: Availability
+    :ivar activity: The activity during the run.
+    :type activity: Activity
+    """
+    __slots__ = ('start', 'end', 'availability', 'activity')
+
+    def __init__(self, start: int, end: int, availability: Availability, activity: Activity):
+        self.start = start
+        self.end = end
+        self.availability = availability
+        self.activity = activity
+
+    @property
+    def duration(self) -> int:
+        return self.end - self.start
+
+    @property
+    def started_at(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.start, datetime.timezone.utc)
+
+    @property
+    def ended_at(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.end, datetime.timezone.utc)
+
+    def __repr__(self):
+        return f'PresenceRun({self.started_at.isoformat()}, {self.duration}s, {self.availability.name}, {self.activity.name})'
@@ -0,0 +1,446 @@
+import os
+import json
+import mmap
+import time
+import bisect
+import itertools
+import struct
+import logging
+import datetime
+import threading
+from array import array
+
+from dtMsalO365Wrapper.communications.presence import Availability, Activity, PresenceRun
+
+_MAGIC = b'DTPH'
+_VERSION = 1
+# magic, version, users in the segment, changes in the segment, first and last change time
+_HEADER = struct.Struct('<4sIIIqq')
+_SEGMENT_SUFFIX = '.seg'
+
+
+def _epoch(value) -> int:
+    if value is None:
+        return int(time.time())
+    if isinstance(value, datetime.datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def _user_key(user) -> str:
+    if isinstance(user, str):
+        return user
+    return getattr(user, 'user_id', None) or user.id
+
+
+class _Segment:
+    """
+    A flushed, immutable segment of presence changes, memory-mapped for reading.
+
+    After the header the file holds five columns: the sorted user indices of the segment,
+    the offset of each user's first change (plus a closing offset), and the time,
+    availability and activity of every change, grouped by user and ordered by time.
+    """
+    def __init__(self, path: str, first_seq: int, last_seq: int):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = last_seq
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_users, n_changes, self.first, self.last = _HEADER.unpack_from(self._mmap)
+        if magic != _MAGIC or version != _VERSION:
+            self._mmap.close()
+            raise ValueError(f'Not a presence history segment: {path}')
+        self._view = memoryview(self._mmap)
+        self._columns = []
+        offset = _HEADER.size
+        for fmt, count, size in (('I', n_users, 4), ('I', n_users + 1, 4), ('I', n_changes, 4),
+                                 ('B', n_changes, 1), ('B', n_changes, 1)):
+            self._columns.append(self._view[offset:offset + count * size].cast(fmt))
+            offset += count * size
+        self.users, self.offsets, self.times, self.availability, self.activity = self._columns
+
+    def __len__(self):
+        return len(self.times)
+
+    def bounds(self, user_idx: int):
+        """
+        Returns the `[lo, hi)` range of the user's changes, or None if the user did not change.
+        """
+        i = bisect.bisect_left(self.users, user_idx)
+        if i == len(self.users) or self.users[i] != user_idx:
+            return None
+        return self.offsets[i], self.offsets[i + 1]
+
+    def latest(self):
+        """
+        Yields the user index and the state after the user's last change in the segment.
+        """
+        for i, user_idx in enumerate(self.users):
+            j = self.offsets[i + 1] - 1
+            yield user_idx, (self.availability[j], self.activity[j])
+
+    def records(self):
+        for i, user_idx in enumerate(self.users):
+            for j in range(self.offsets[i], self.offsets[i + 1]):
+                yield user_idx, self.times[j], self.availability[j], self.activity[j]
+
+    def close(self):
+        for column in self._columns:
+            column.release()
+        self._view.release()
+        self._mmap.close()
+
+
+def _write_segment(path: str, changes: dict):
+    """
+    Writes changes, given as `{user index: (times, availabilities, activities)}`, as a segment.
+    The file is written aside and moved into place, so readers never see a partial segment.
+    """
+    users = array('I', sorted(changes))
+    offsets, times, availability, activity = array('I', [0]), array('I'), array('B'), array('B')
+    for user_idx in users:
+        t, a, b = changes[user_idx]
+        times.extend(t)
+        availability.extend(a)
+        activity.extend(b)
+        offsets.append(len(times))
+    header = _HEADER.pack(_MAGIC, _VERSION, len(users), len(times), min(times), max(times))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        for column in (users, offsets, times, availability, activity):
+            column.tofile(f)
+    os.replace(tmp, path)
+
+
+class PresenceHistory:
+    """
+    On-disk history of user presence that stores changes only.
+
+    Each recorded poll is compared with the last known state of every user, and only users
+    whose availability or activity changed add a change: the poll time plus both values as
+    one-byte `Availability` and `Activity` codes. A state therefore lasts as a run until the
+    user's next change, or until the latest poll. Storage and query time grow with the
+    number of presence changes, not with polls × users.
+
+    Changes are buffered in memory and flushed into immutable segment files once
+    `segment_size` changes are pending, or on `flush()` and `close()`. Segments are
+    column-oriented arrays grouped by user and memory-mapped for queries, so a user's runs
+    in a time range are found by binary search. `compact()` merges old segments and can
+    drop history before a retention cut-off.
+
+    The store is meant for a single writing process; times are seconds since the epoch, and
+    segment files use the byte order of the machine that wrote them.
+
+    :ivar directory: The directory holding the segments, the user index and the store state.
+    :type directory: str
+    :ivar segment_size: The number of pending changes that triggers a flush.
+    :type segment_size: int
+    """
+
+    def __init__(self, directory: str, segment_size: int = 1_000_000):
+        self.directory = directory
+        self.segment_size = segment_size
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._user_ids = []
+        self._user_index = {}
+        self._saved_users = 0
+        users_path = os.path.join(directory, 'users.txt')
+        if os.path.exists(users_path):
+            with open(users_path, encoding='utf-8') as f:
+                for line in f:
+                    self._index(line.rstrip('\n'))
+            self._saved_users = len(self._user_ids)
+        self._segments = self._open_segments()
+        self._last = {}
+        for segment in self._segments:
+            self._last.update(segment.latest())
+        self._pending = {}
+        self._pending_count = 0
+        self._observed_until = self._segments[-1].last if self._segments else 0
+        state_path = os.path.join(directory, 'state.json')
+        if os.path.exists(state_path):
+            with open(state_path, encoding='utf-8') as f:
+                self._observed_until = max(self._observed_until, json.load(f).get('observed_until', 0))
+
+    def _open_segments(self) -> list:
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+            elif name.endswith(_SEGMENT_SUFFIX):
+                first_seq, last_seq = (int(s) for s in name[:-len(_SEGMENT_SUFFIX)].split('-'))
+                found.append((first_seq, last_seq, name))
+        segments = []
+        for first_seq, last_seq, name in found:
+            path = os.path.join(self.directory, name)
+            # A compaction interrupted before removing its inputs leaves segments whose
+            # sequence range lies inside the merged segment's range.
+            if any(f <= first_seq and last_seq <= l and (f, l) != (first_seq, last_seq) for f, l, _ in found):
+                logging.warning(f'Removing presence history segment {name}, superseded by a compacted segment')
+                os.remove(path)
+                continue
+            segments.append(_Segment(path, first_seq, last_seq))
+        return sorted(segments, key=lambda s: s.last_seq)
+
+    def _index(self, user_id: str) -> int:
+        idx = self._user_index.get(user_id)
+        if idx is None:
+            idx = self._user_index[user_id] = len(self._user_ids)
+            self._user_ids.append(user_id)
+        return idx
+
+    @property
+    def observed_until(self) -> int:
+        """
+        The time of the latest recorded poll, in seconds since the epoch.
+        """
+        return self._observed_until
+
+    @property
+    def segments(self) -> list:
+        """
+        Describes the flushed segments, oldest first.
+
+        :rtype: list[dict]
+        """
+        with self._lock:
+            return [{'path': s.path, 'first': s.first, 'last': s.last, 'changes': len(s),
+                     'users': len(s.users), 'bytes': os.path.getsize(s.path)} for s in self._segments]
+
+    def record(self, presences, timestamp=None) -> int:
+        """
+        Records one poll of presences, such as the rows of `Communications.iter_presence`,
+        keeping only the users whose availability or activity changed since their last poll.
+
+        :param presences: Presence dicts with `id`, `availability` and `activity`.
+        :type presences: Iterable[dict]
+        :param timestamp: Time of the poll as a datetime or seconds since the epoch. Defaults to now.
+        :raises ValueError: If the poll is older than the latest recorded poll.
+        :return: The number of changes recorded.
+        :rtype: int
+        """
+        t = _epoch(timestamp)
+        with self._lock:
+            if t < self._observed_until:
+                raise ValueError(f'Presence poll at {t} is older than the latest recorded poll at {self._observed_until}')
+            changes = 0
+            for presence in presences:
+                user_idx = self._index(presence['id'])
+                state = (Availability.parse(presence.get('availability')), Activity.parse(presence.get('activity')))
+                if self._last.get(user_idx) == state:
+                    continue
+                self._last[user_idx] = state
+                times, availability, activity = self._pending.setdefault(user_idx, (array('I'), array('B'), array('B')))
+                if times and times[-1] == t:
+                    availability[-1], activity[-1] = state
+                    continue
+                times.append(t)
+                availability.append(state[0])
+                activity.append(state[1])
+                changes += 1
+            self._pending_count += changes
+            self._observed_until = t
+            if self._pending_count >= self.segment_size:
+                self.flush()
+        return changes
+
+    def _save_state(self):
+        if self._saved_users < len(self._user_ids):
+            with open(os.path.join(self.directory, 'users.txt'), 'a', encoding='utf-8') as f:
+                f.writelines(u + '\n' for u in self._user_ids[self._saved_users:])
+            self._saved_users = len(self._user_ids)
+        path = os.path.join(self.directory, 'state.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'observed_until': self._observed_until}, f)
+        os.replace(path + '.tmp', path)
+
+    def flush(self):
+        """
+        Writes the pending changes as a new segment and persists the time of the latest poll.
+        """
+        with self._lock:
+            # Users are persisted before the segment referring to them.
+            self._save_state()
+            if not self._pending:
+                return
+            seq = self._segments[-1].last_seq + 1 if self._segments else 0
+            path = os.path.join(self.directory, f'{seq:08d}-{seq:08d}{_SEGMENT_SUFFIX}')
+            _write_segment(path, self._pending)
+            self._segments.append(_Segment(path, seq, seq))
+            logging.info(f'Flushed {self._pending_count} presence changes of {len(self._pending)} users')
+            self._pending = {}
+            self._pending_count = 0
+
+    def _state_at(self, user_idx: int, t: int):
+        """
+        Returns the user's last change at or before `t` as `(time, availability, activity)`.
+        """
+        pending = self._pending.get(user_idx)
+        if pending is not None:
+            j = bisect.bisect_right(pending[0], t) - 1
+            if j >= 0:
+                return pending[0][j], pending[1][j], pending[2][j]
+        for segment in reversed(self._segments):
+            if segment.first > t:
+                continue
+            bounds = segment.bounds(user_idx)
+            if bounds is None:
+                continue
+            j = bisect.bisect_right(segment.times, t, *bounds) - 1
+            if j >= bounds[0]:
+                return segment.times[j], segment.availability[j], segment.activity[j]
+        return None
+
+    def _changes(self, user_idx: int, start: int, end: int) -> list:
+        """
+        Returns the user's changes after `start` and before `end`, in time order.
+        """
+        changes = []
+        for segment in self._segments:
+            if segment.last <= start or segment.first >= end:
+                continue
+            bounds = segment.bounds(user_idx)
+            if bounds is None:
+                continue
+            lo = bisect.bisect_right(segment.times, start, *bounds)
+            hi = bisect.bisect_left(segment.times, end, lo, bounds[1])
+            changes.extend(zip(segment.times[lo:hi], segment.availability[lo:hi], segment.activity[lo:hi]))
+        pending = self._pending.get(user_idx)
+        if pending is not None:
+            lo = bisect.bisect_right(pending[0], start)
+            hi = bisect.bisect_left(pending[0], end, lo)
+            changes.extend(zip(pending[0][lo:hi], pending[1][lo:hi], pending[2][lo:hi]))
+        return changes
+
+    def _runs(self, user_idx: int, start: int, end: int) -> list:
+        end = min(end, self._observed_until)
+        if user_idx is None or start >= end:
+            return []
+        points = self._changes(user_idx, start, end)
+        current = self._state_at(user_idx, start)
+        if current is not None:
+            points.insert(0, (start,) + tuple(current[1:]))
+        runs = []
+        for i, (t, availability, activity) in enumerate(points):
+            run_end = points[i + 1][0] if i + 1 < len(points) else end
+            if runs and runs[-1].availability == availability and runs[-1].activity == activity:
+                runs[-1].end = run_end
+            else:
+                runs.append(PresenceRun(t, run_end, Availability(availability), Activity(activity)))
+        return runs
+
+    def runs(self, user, start=None, end=None) -> list:
+        """
+        Returns the presence runs of a user that overlap a time range, clipped to the range.
+
+        :param user: The user, as an id or an object exposing `id` (or `user_id`, e.g. a team `Member`).
+        :param start: Start of the range as a datetime or seconds since the epoch. Defaults to the beginning.
+        :param end: End of the range (exclusive). Defaults to the latest poll.
+        :rtype: list[PresenceRun]
+        """
+        start = 0 if start is None else _epoch(start)
+        end = self._observed_until if end is None else _epoch(end)
+        with self._lock:
+            return self._runs(self._user_index.get(_user_key(user)), start, end)
+
+    def team_runs(self, users, start=None, end=None) -> dict:
+        """
+        Returns the presence runs of several users, such as the members of a team, in a time range.
+
+        :param users: Ids or objects exposing `id` or `user_id`.
+        :type users: Iterable
+        :return: The runs of every user, keyed by user id.
+        :rtype: dict[str, list[PresenceRun]]
+        """
+        start = 0 if start is None else _epoch(start)
+        end = self._observed_until if end is None else _epoch(end)
+        with self._lock:
+            return {key: self._runs(self._user_index.get(key), start, end) for key in map(_user_key, users)}
+
+    def durations(self, users, start=None, end=None, by: str = 'availability') -> dict:
+        """
+        Sums the time the given users spent in each availability (or activity) in a time range.
+
+        :param by: `availability` or `activity`.
+        :type by: str
+        :return: Seconds per code, summed over all users.
+        :rtype: dict[Availability | Activity, int]
+        """
+        if by not in ('availability', 'activity'):
+            raise ValueError(f'Unknown presence property: {by}')
+        totals = {}
+        for runs in self.team_runs(users, start, end).values():
+            for run in runs:
+                code = getattr(run, by)
+                totals[code] = totals.get(code, 0) + run.duration
+        return totals
+
+    def compact(self, before=None, retain_from=None) -> int:
+        """
+        Merges the oldest flushed segments into one segment, and drops the history before
+        `retain_from`: every user's state at that time is kept as a change at the cut-off,
+        and earlier changes are discarded. Pending changes are flushed first.
+
+        :param before: Merge the segments whose changes all lie before this time. Defaults to
+            all segments unless `retain_from` is given.
+        :param retain_from: Start of the history to keep; the segments starting before it are
+            merged as well. Defaults to keeping everything.
+        :return: The number of segments merged.
+        :rtype: int
+        """
+        retain_from = None if retain_from is None else _epoch(retain_from)
+        before = None if before is None else _epoch(before)
+        merge_all = before is None and retain_from is None
+        with self._lock:
+            self.flush()
+            selected = list(itertools.takewhile(
+                lambda s: merge_all or (before is not None and s.last < before)
+                or (retain_from is not None and s.first < retain_from), self._segments))
+            if not selected or (len(selected) == 1 and retain_from is None):
+                return 0
+            remaining = self._segments[len(selected):]
+            if retain_from is not None:
+                # The cut-off may not move changes past the next segment's or future polls.
+                retain_from = min([retain_from, self._observed_until] + [s.first for s in remaining[:1]])
+            merged = {}
+            for segment in selected:
+                for user_idx, t, availability, activity in segment.records():
+                    times, av, ac = merged.setdefault(user_idx, (array('I'), array('B'), array('B')))
+                    if times and (av[-1], ac[-1]) == (availability, activity):
+                        continue
+                    if retain_from is not None and t < retain_from:
+                        # Earlier changes collapse into the state at the cut-off.
+                        t = retain_from
+                    if times and times[-1] == t:
+                        av[-1], ac[-1] = availability, activity
+                        continue
+                    times.append(t)
+                    av.append(availability)
+                    ac.append(activity)
+            first_seq, last_seq = selected[0].first_seq, selected[-1].last_seq
+            path = os.path.join(self.directory, f'{first_seq:08d}-{last_seq:08d}{_SEGMENT_SUFFIX}')
+            for segment in selected:
+                segment.close()
+            _write_segment(path, merged)
+            for segment in selected:
+                if segment.path != path:
+                    os.remove(segment.path)
+            self._segments = [_Segment(path, first_seq, last_seq)] + remaining
+        logging.info(f'Compacted {len(selected)} presence history segments')
+        return len(selected)
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            for segment in self._segments:
+                segment.close()
+            self._segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
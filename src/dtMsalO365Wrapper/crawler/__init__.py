@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import zlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from dtMsalO365Wrapper.crawler.checkpoint import MailboxCheckpoint
+from dtMsalO365Wrapper._tracing import bind_context
+
+
+class MailboxCrawler:
+    """
+    Runs a per-mailbox task over a stream of users, many mailboxes at a time.
+
+    Up to `max_mailboxes` mailboxes are processed concurrently, while the client's token
+    session caps the requests in flight against any single mailbox at
+    `per_mailbox_concurrency`, matching Graph's per-mailbox throttling limit. The task may
+    itself fan out (e.g. fetch several folders at once) without exceeding that cap. When a
+    `MailboxCheckpoint` is supplied, finished mailboxes are recorded and skipped on restart.
+
+    :ivar _client: The client the task talks to Graph through.
+    :type _client: MsalO365Client
+    :ivar _task: Callable invoked as `task(client, user)` for every mailbox.
+    :type _task: Callable
+    :ivar max_mailboxes: The number of mailboxes processed concurrently.
+    :type max_mailboxes: int
+    :ivar checkpoint: Optional checkpoint recording finished mailboxes.
+    :type checkpoint: MailboxCheckpoint | None
+    """
+    def __init__(self, client, task, max_mailboxes: int = 16, per_mailbox_concurrency: int = 4,
+                 checkpoint: MailboxCheckpoint = None):
+        self._client = client
+        self._task = task
+        self.max_mailboxes = max_mailboxes
+        self.checkpoint = checkpoint
+        client.token_auth_session.set_mailbox_concurrency(per_mailbox_concurrency)
+
+    @staticmethod
+    def in_shard(mailbox_id, shard_index: int, shard_count: int) -> bool:
+        """
+        Assigns mailboxes to shards by a stable hash of their id, so every process of a
+        sharded crawl agrees on the split without coordination.
+        """
+        return zlib.crc32(str(mailbox_id).lower().encode('utf-8')) % shard_count == shard_index
+
+    def _crawl(self, user):
+        mailbox_id = getattr(user, 'id', user)
+        try:
+            self._task(self._client, user)
+        except Exception as e:
+            logging.error(f'Failed to crawl mailbox {mailbox_id}: {e}')
+            if self.checkpoint is not None:
+                self.checkpoint.mark_failed(mailbox_id, e)
+            raise
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done(mailbox_id)
+
+    def run(self, users, shard_index: int = 0, shard_count: int = 1) -> dict:
+        """
+        Crawls every mailbox of the user stream that belongs to the given shard and has not
+        been finished by an earlier run. The stream is consumed lazily, keeping at most twice
+        `max_mailboxes` mailboxes queued at any time.
+
+        :param users: Iterable of `User`, `UserRecord` or user ids, e.g. `Users.get_all()`.
+        :type users: Iterable
+        :param shard_index: The shard this crawl is responsible for.
+        :type shard_index: int
+        :param shard_count: The total number of shards.
+        :type shard_count: int
+        :return: A summary with the number of `completed` and `skipped` mailboxes and the
+            errors of `failed` mailboxes by id.
+        :rtype: dict
+        """
+        done = self.checkpoint.done_ids() if self.checkpoint is not None else set()
+        summary = {'completed': 0, 'skipped': 0, 'failed': {}}
+        pending = {}
+
+        def _collect(futures):
+            for future in futures:
+                mailbox_id = pending.pop(future)
+                if future.exception() is not None:
+                    summary['failed'][mailbox_id] = str(future.exception())
+                else:
+                    summary['completed'] += 1
+
+        crawl = bind_context(self._crawl)
+        with ThreadPoolExecutor(max_workers=self.max_mailboxes, thread_name_prefix='MailboxCrawler') as executor:
+            for user in users:
+                mailbox_id = getattr(user, 'id', user)
+                if shard_count > 1 and not self.in_shard(mailbox_id, shard_index, shard_count):
+                    continue
+                if mailbox_id in done:
+                    summary['skipped'] += 1
+                    continue
+                if len(pending) >= self.max_mailboxes * 2:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    _collect(finished)
+                pending[executor.submit(crawl, user)] = mailbox_id
+            _collect(wait(pending).done)
+
+        logging.info(f"Mailbox crawl of shard {shard_index + 1}/{shard_count} finished: {summary['completed']} "
+                     f"completed, {summary['skipped']} skipped, {len(summary['failed'])} failed")
+        return summary
+
+
+def _crawl_shard(client_factory, users_factory, task, shard_index, shard_count, checkpoint_path,
+                 max_mailboxes, per_mailbox_concurrency):
+    client = client_factory()
+    checkpoint = MailboxCheckpoint(checkpoint_path) if checkpoint_path else None
+    try:
+        crawler = MailboxCrawler(client, task, max_mailboxes, per_mailbox_concurrency, checkpoint)
+        return crawler.run(users_factory(client), shard_index, shard_count)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+
+def run_sharded(client_factory, users_factory, task, processes: int, checkpoint_path: str = None,
+                max_mailboxes: int = 16, per_mailbox_concurrency: int = 4) -> dict:
+    """
+    Splits a mailbox crawl across worker processes on this host. Each process builds its
+    own client and user stream, keeps the mailboxes of its shard and crawls them with a
+    `MailboxCrawler`. All processes share one checkpoint file when `checkpoint_path` is set.
+
+    `client_factory`, `users_factory` and `task` are sent to the worker processes and must
+    therefore be picklable, i.e. defined at module level.
+
+    :param client_factory: Callable returning a new `MsalO365Client`.
+    :type client_factory: Callable[[], MsalO365Client]
+    :param users_factory: Callable taking the client and returning the user stream to crawl.
+    :type users_factory: Callable[[MsalO365Client], Iterable]
+    :param task: Callable invoked as `task(client, user)` for every mailbox.
+    :type task: Callable
+    :param processes: The number of worker processes (and shards).
+    :type processes: int
+    :param checkpoint_path: Path of the SQLite checkpoint shared by all workers.
+    :type checkpoint_path: str | None
+    :return: The summaries of all shards merged into one.
+    :rtype: dict
+    """
+    if checkpoint_path:
+        MailboxCheckpoint(checkpoint_path).close()  # create the schema once before workers race for it
+    summary = {'completed': 0, 'skipped': 0, 'failed': {}}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(_crawl_shard, client_factory, users_factory, task, i, processes, checkpoint_path,
+                                   max_mailboxes, per_mailbox_concurrency) for i in range(processes)]
+        for future in futures:
+            shard = future.result()
+            summary['completed'] += shard['completed']
+            summary['skipped'] += shard['skipped']
+            summary['failed'].update(shard['failed'])
+    return summary
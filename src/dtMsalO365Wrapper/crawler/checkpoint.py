@@ -0,0 +1,60 @@
+import time
+import sqlite3
+import threading
+
+
+class MailboxCheckpoint:
+    """
+    Records which mailboxes a crawl has finished, so a restarted crawl can skip them.
+
+    State is kept in a SQLite database, which lets several worker processes of a sharded
+    crawl share one checkpoint file.
+
+    :ivar path: Path of the SQLite database file.
+    :type path: str
+    """
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS mailboxes ('
+                           'id TEXT PRIMARY KEY, status TEXT NOT NULL, updated_at REAL, error TEXT)')
+        self._conn.commit()
+
+    def _set(self, mailbox_id, status, error=None):
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO mailboxes VALUES (?, ?, ?, ?)',
+                               (mailbox_id, status, time.time(), error))
+            self._conn.commit()
+
+    def mark_done(self, mailbox_id):
+        self._set(mailbox_id, self.DONE)
+
+    def mark_failed(self, mailbox_id, error):
+        self._set(mailbox_id, self.FAILED, str(error))
+
+    def is_done(self, mailbox_id) -> bool:
+        with self._lock:
+            row = self._conn.execute('SELECT status FROM mailboxes WHERE id = ?', (mailbox_id,)).fetchone()
+        return row is not None and row[0] == self.DONE
+
+    def done_ids(self) -> set:
+        with self._lock:
+            return {r[0] for r in self._conn.execute('SELECT id FROM mailboxes WHERE status = ?', (self.DONE,))}
+
+    def failed(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute('SELECT id, error FROM mailboxes WHERE status = ?', (self.FAILED,)))
+
+    def reset(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM mailboxes')
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,75 @@
+import queue
+import logging
+import threading
+
+from dtMsalO365Wrapper.export.sinks import NDJSONSink, ParquetSink, ArrowSink
+
+__all__ = ['export_rows', 'NDJSONSink', 'ParquetSink', 'ArrowSink']
+
+_DONE = object()
+
+
+def export_rows(rows, sink, batch_size: int = 5000, queue_depth: int = 2) -> int:
+    """
+    Streams rows from one of the library's iterators, e.g. `Users.iter_all()`,
+    `Communications.iter_presence()` or `Messages.iter_messages()`, into an export sink.
+
+    Rows are grouped into batches of `batch_size`, which a writer thread projects and writes
+    while the caller's thread keeps pulling rows, so the next page downloads while the
+    current batch is written. At most `queue_depth` finished batches wait for the writer,
+    which bounds memory to a few batches regardless of the size of the export.
+
+    :param rows: The rows to export: raw JSON dicts or the library's wrapper objects.
+    :type rows: Iterable
+    :param sink: The sink to write to, e.g. `ParquetSink('users.parquet', ['id', 'mail'])`.
+        It is opened and closed by this call.
+    :type sink: NDJSONSink | ParquetSink | ArrowSink
+    :param batch_size: The number of rows per written batch.
+    :type batch_size: int
+    :param queue_depth: The number of batches that may wait for the writer.
+    :type queue_depth: int
+    :return: The number of rows written.
+    :rtype: int
+    """
+    batches = queue.Queue(maxsize=queue_depth)
+    errors = []
+
+    def _write():
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                return
+            if errors:
+                continue  # drain so the producer never blocks on a failed writer
+            try:
+                sink.write_batch(batch)
+            except BaseException as e:
+                errors.append(e)
+
+    def _put(batch):
+        if errors:
+            raise errors[0]
+        batches.put(batch)
+
+    written = 0
+    with sink:
+        writer = threading.Thread(target=_write, name='ExportWriter', daemon=True)
+        writer.start()
+        try:
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    _put(batch)
+                    written += len(batch)
+                    batch = []
+            if batch:
+                _put(batch)
+                written += len(batch)
+        finally:
+            batches.put(_DONE)
+            writer.join()
+        if errors:
+            raise errors[0]
+    logging.info(f'Exported {written} rows to {sink.path}')
+    return written
@@ -0,0 +1,195 @@
+import abc
+import gzip
+import json
+
+
+def _as_dict(row):
+    """
+    Returns the raw JSON behind a row: dicts are used as they are, and the library's wrapper
+    objects (`UserRecord`, `User`, `Message`, `Member`, ...) expose the JSON they were built from.
+    """
+    if isinstance(row, dict):
+        return row
+    properties = getattr(row, 'properties', None)
+    if isinstance(properties, dict):
+        return properties
+    for attribute in ('_message_detail', '_member_detail', '_folder_detail'):
+        detail = getattr(row, attribute, None)
+        if isinstance(detail, dict):
+            return detail
+    user = getattr(row, '_user', None)
+    if user is not None and isinstance(getattr(user, 'properties', None), dict):
+        return user.properties
+    raise TypeError(f'Cannot export rows of type {type(row).__name__}')
+
+
+def _extract(row: dict, path: str):
+    """
+    Reads a field from a row, following dotted paths into nested objects,
+    e.g. `sender.emailAddress.address` or `user.displayName`.
+    """
+    value = row
+    for key in path.split('.'):
+        if value is None:
+            return None
+        if not isinstance(value, dict):
+            value = _as_dict(value)
+        value = value.get(key)
+    return value
+
+
+def _json_default(value):
+    try:
+        return _as_dict(value)
+    except TypeError:
+        return str(value)
+
+
+class NDJSONSink:
+    """
+    Writes rows as newline-delimited JSON, optionally gzip-compressed.
+
+    :ivar path: The file to write.
+    :type path: str
+    :ivar fields: The fields (or dotted paths) to write, in order. All fields of each row when None.
+    :type fields: list[str] | None
+    :ivar compression: `'gzip'` or None. Defaults to gzip when `path` ends with `.gz`.
+    :type compression: str | None
+    """
+    def __init__(self, path: str, fields: list = None, compression: str = None):
+        if compression is None and str(path).endswith('.gz'):
+            compression = 'gzip'
+        if compression not in (None, 'gzip'):
+            raise ValueError(f'Unsupported NDJSON compression: {compression}')
+        self.path = path
+        self.fields = list(fields) if fields else None
+        self.compression = compression
+        self._file = None
+
+    def open(self):
+        if self.compression == 'gzip':
+            self._file = gzip.open(self.path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+
+    def write_batch(self, rows: list):
+        lines = []
+        for row in rows:
+            row = _as_dict(row)
+            if self.fields is not None:
+                row = {f: _extract(row, f) for f in self.fields}
+            lines.append(json.dumps(row, default=_json_default, separators=(',', ':')))
+        lines.append('')
+        self._file.write('\n'.join(lines))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class _ArrowSink(abc.ABC):
+    """
+    Base of the sinks writing column batches through pyarrow, which is an optional dependency.
+
+    Every batch becomes one record batch (a row group in Parquet). Nested values, such as
+    `assignedLicenses` or `sender`, are stored as JSON strings. Without an explicit `schema`
+    the column types are inferred from the first batch, with columns that are empty there
+    typed as strings.
+    """
+    def __init__(self, path: str, fields: list, compression: str = 'zstd', schema=None):
+        if not fields:
+            raise ValueError('Columnar export requires the fields to write')
+        self.path = path
+        self.fields = list(fields)
+        self.compression = compression
+        self.schema = schema
+        self._writer = None
+        self._pa = None
+
+    def _import(self):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(f'{type(self).__name__} requires pyarrow: pip install pyarrow') from None
+        return pyarrow
+
+    def open(self):
+        self._pa = self._import()
+
+    def _columns(self, rows: list) -> dict:
+        columns = {f: [] for f in self.fields}
+        for row in rows:
+            row = _as_dict(row)
+            for f in self.fields:
+                value = _extract(row, f)
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value, default=_json_default, separators=(',', ':'))
+                columns[f].append(value)
+        return columns
+
+    def _infer_schema(self, columns: dict):
+        pa = self._pa
+        fields = []
+        for name, values in columns.items():
+            data_type = pa.array(values).type
+            fields.append(pa.field(name, pa.string() if pa.types.is_null(data_type) else data_type))
+        return pa.schema(fields)
+
+    @abc.abstractmethod
+    def _open_writer(self):
+        """
+        Opens the format's writer for `self.path` once the schema is known.
+        """
+
+    def write_batch(self, rows: list):
+        columns = self._columns(rows)
+        if self.schema is None:
+            self.schema = self._infer_schema(columns)
+        if self._writer is None:
+            self._writer = self._open_writer()
+        batch = self._pa.RecordBatch.from_arrays(
+            [self._pa.array(columns[f.name], type=f.type) for f in self.schema], schema=self.schema)
+        self._writer.write_batch(batch)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ParquetSink(_ArrowSink):
+    """
+    Writes rows to a Parquet file, one row group per batch. Requires pyarrow.
+
+    :ivar compression: The Parquet codec, e.g. `'zstd'`, `'snappy'` or None.
+    """
+    def _open_writer(self):
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+
+class ArrowSink(_ArrowSink):
+    """
+    Writes rows to an Arrow IPC (Feather v2) file, one record batch per batch. Requires pyarrow.
+
+    :ivar compression: The IPC buffer codec, `'zstd'`, `'lz4'` or None.
+    """
+    def _open_writer(self):
+        pa = self._pa
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(self.path, self.schema, options=options)
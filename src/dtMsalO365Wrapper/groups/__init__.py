@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+from dtMsalO365Wrapper._batch import iter_batch, relative_url
+from dtMsalO365Wrapper._tracing import traced
+from dtMsalO365Wrapper.groups.group import Group
+from dtMsalO365Wrapper.groups.membership_graph import MembershipGraph, member_type
+from dtMsalO365Wrapper.groups.membership_replica import GroupMembershipReplica
+from dtMsalO365Wrapper.users.user_record import UserRecord
+from dtMsalO365Wrapper.query import ODataQuery
+
+import logging
+
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+
+
+class Groups:
+    """
+    Reads groups and expands their nested memberships.
+
+    :ivar _graph_client: GraphClient passed on to the user records returned as members.
+    :type _graph_client: GraphClient
+    :ivar _token_auth_session: The TokenAuthSession used for all requests.
+    :type _token_auth_session: TokenAuthSession
+    """
+
+    # Properties requested for members; `@odata.type` is always returned.
+    MEMBER_FIELDS = ['id', 'displayName', 'userPrincipalName', 'mail']
+
+    def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession):
+        self._graph_client = graph_client
+        self._token_auth_session = token_auth_session
+
+    def get_by_id(self, group_id) -> Group:
+        resp = self._token_auth_session.request("GET", f"/groups/{group_id}")
+        if resp.status_code != 200:
+            logging.error(f'Failed to get Group: {resp.content}')
+            raise Exception(f'Failed to get Group: {resp.content}')
+        return Group(resp.json())
+
+    def iter_groups(self, query: ODataQuery = None):
+        """
+        Iterates over the groups of the tenant, or those matching a query, page by page.
+
+        :rtype: Iterator[Group]
+        """
+        request_kwargs = query.request_kwargs(directory=True) if query is not None else {}
+        for g in self._token_auth_session.get_paged("/groups", **request_kwargs):
+            yield Group(g)
+
+    def _member(self, member: dict):
+        kind = member_type(member)
+        if kind == 'user':
+            return UserRecord(self._graph_client, self._token_auth_session, member)
+        if kind == 'group':
+            return Group(member)
+        return member
+
+    def iter_members(self, group_id, transitive: bool = False, select_fields: list = MEMBER_FIELDS):
+        """
+        Iterates over the members of a group, fetching further pages only as they are consumed.
+        With `transitive`, members of nested groups are included (`transitiveMembers`).
+
+        :return: A generator yielding `UserRecord` for users, `Group` for groups and the raw
+            JSON of other directory objects such as devices or service principals.
+        :rtype: Iterator
+        """
+        relation = 'transitiveMembers' if transitive else 'members'
+        query = ODataQuery().select('id', select_fields)
+        for m in self._token_auth_session.get_paged(f"/groups/{group_id}/{relation}", **query.request_kwargs()):
+            yield self._member(m)
+
+    def _direct_members(self, group_ids: list, workers: int) -> tuple:
+        """
+        Fetches the direct members of many groups through JSON batches, following the further
+        pages of large groups in subsequent batch rounds.
+
+        :return: `(member id, member type)` pairs per group id, and the ids of the groups whose
+            members could not be fetched completely; these are left out of the pairs.
+        :rtype: tuple[dict[str, list], set]
+        """
+        members = {g: [] for g in group_ids}
+        failed = set()
+        pending = [{'id': g, 'method': 'GET', 'url': f'/groups/{g}/members?$select=id'} for g in group_ids]
+        while pending:
+            next_round = []
+            for group_id, resp in iter_batch(self._token_auth_session, pending, max_workers=workers):
+                if resp.get('status') != 200:
+                    logging.error(f"Failed to get members of Group {group_id}: {resp.get('status')} -> {resp.get('body')}")
+                    members.pop(group_id, None)
+                    failed.add(group_id)
+                    continue
+                body = resp.get('body') or {}
+                members[group_id].extend((m['id'], member_type(m)) for m in body.get('value', []))
+                next_link = body.get('@odata.nextLink')
+                if next_link:
+                    next_round.append({'id': group_id, 'method': 'GET',
+                                       'url': relative_url(self._token_auth_session, next_link)})
+            pending = next_round
+        return members, failed
+
+    @traced('Groups.expand')
+    def expand(self, group_ids, graph: MembershipGraph = None, workers: int = 4) -> dict:
+        """
+        Flattens many groups into the ids of their transitive user members.
+
+        Direct members are fetched level by level in JSON batches, and every group reached,
+        root or nested, is fetched exactly once and recorded in `graph`. Subgroups shared by
+        several groups are therefore requested and flattened only once. Passing the same
+        graph to later calls makes groups already in it free; use `replica()` to keep such a
+        graph current through `/groups/delta`.
+
+        :param group_ids: The groups to expand.
+        :type group_ids: Iterable[str]
+        :param graph: Membership graph to reuse and extend. A new one is used when omitted.
+        :type graph: MembershipGraph | None
+        :param workers: The number of batches in flight at the same time.
+        :type workers: int
+        :raises Exception: If the members of a group could not be fetched. The groups fetched
+            successfully are still recorded in `graph`; the failed ones are not.
+        :return: The transitive user ids of every group, keyed by group id.
+        :rtype: dict[str, frozenset]
+        """
+        graph = graph if graph is not None else MembershipGraph()
+        group_ids = list(dict.fromkeys(group_ids))
+        pending = [g for g in group_ids if g not in graph]
+        fetched = 0
+        failed = set()
+        while pending:
+            members, round_failed = self._direct_members(pending, workers)
+            fetched += len(members)
+            failed |= round_failed
+            discovered = {}
+            for group_id, direct in members.items():
+                graph.set_members(group_id, direct)
+                for member_id, kind in direct:
+                    if kind == 'group' and member_id not in graph:
+                        discovered[member_id] = None
+            pending = list(discovered)
+        if failed:
+            logging.error(f'Failed to get the members of {len(failed)} groups: {sorted(failed)}')
+            raise Exception(f'Failed to get the members of {len(failed)} groups: {sorted(failed)}')
+        logging.info(f'Expanded {len(group_ids)} groups, fetching the members of {fetched} groups')
+        return graph.expand(group_ids)
+
+    def replica(self, path: str = ':memory:', load: bool = True) -> GroupMembershipReplica:
+        """
+        Creates a local `GroupMembershipReplica` of all groups and their members. A replica
+        persisted at `path` by an earlier run is brought up to date incrementally through
+        its stored delta link rather than reloaded.
+
+        :param path: Path of the SQLite database backing the replica. Defaults to an in-memory store.
+        :type path: str
+        :param load: Populate or refresh the replica before returning it.
+        :type load: bool
+        :rtype: GroupMembershipReplica
+        """
+        replica = GroupMembershipReplica(self, path)
+        if load:
+            replica.sync()
+        return replica
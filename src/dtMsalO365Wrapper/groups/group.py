@@ -0,0 +1,52 @@
+class Group:
+    """
+    A group as returned by `/groups`, wrapping its raw JSON.
+
+    :ivar _group_detail: The raw JSON of the group.
+    :type _group_detail: dict
+    """
+    def __init__(self, group_detail: dict):
+        self._group_detail = group_detail
+
+    def __repr__(self):
+        return f'Group(id={self.id!r}, display_name={self.display_name!r})'
+
+    @property
+    def properties(self) -> dict:
+        return self._group_detail
+
+    @property
+    def id(self):
+        return self._group_detail.get('id')
+
+    @property
+    def display_name(self):
+        return self._group_detail.get('displayName')
+
+    @property
+    def description(self):
+        return self._group_detail.get('description')
+
+    @property
+    def mail(self):
+        return self._group_detail.get('mail')
+
+    @property
+    def mail_enabled(self):
+        return self._group_detail.get('mailEnabled')
+
+    @property
+    def security_enabled(self):
+        return self._group_detail.get('securityEnabled')
+
+    @property
+    def group_types(self):
+        return self._group_detail.get('groupTypes') or []
+
+    @property
+    def is_unified(self):
+        return 'Unified' in self.group_types
+
+    @property
+    def is_dynamic(self):
+        return 'DynamicMembership' in self.group_types
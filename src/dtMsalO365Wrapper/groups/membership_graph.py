@@ -0,0 +1,184 @@
+import threading
+
+
+def member_type(member: dict) -> str:
+    """
+    Returns the kind of a directory object from its `@odata.type`, e.g. `user` or `group`.
+    """
+    return (member.get('@odata.type') or '').rsplit('.', 1)[-1]
+
+
+class MembershipGraph:
+    """
+    In-memory graph of direct group memberships that flattens nested groups into the set of
+    their transitive user members.
+
+    Flattened sets are memoised per group, so a subgroup shared by many groups is expanded
+    once no matter how many expansions reach it. Changing a group's direct members drops the
+    memoised sets of that group and of every group containing it, directly or transitively,
+    leaving all other expansions intact. Membership cycles are resolved correctly.
+    """
+    def __init__(self):
+        self._users = {}
+        self._subgroups = {}
+        self._parents = {}
+        self._flat = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, group_id):
+        return group_id in self._users
+
+    def __len__(self):
+        return len(self._users)
+
+    @property
+    def groups(self) -> list:
+        with self._lock:
+            return list(self._users)
+
+    def _ensure(self, group_id):
+        if group_id not in self._users:
+            self._users[group_id] = set()
+            self._subgroups[group_id] = set()
+
+    def set_members(self, group_id, members):
+        """
+        Replaces the direct members of a group.
+
+        :param members: Pairs of `(member id, member type)`.
+        :type members: Iterable[tuple[str, str]]
+        """
+        with self._lock:
+            self._ensure(group_id)
+            for subgroup in self._subgroups[group_id]:
+                self._parents.get(subgroup, set()).discard(group_id)
+            self._users[group_id] = set()
+            self._subgroups[group_id] = set()
+            for member_id, kind in members:
+                self._add(group_id, member_id, kind)
+            self.invalidate(group_id)
+
+    def _add(self, group_id, member_id, kind):
+        if kind == 'group':
+            self._subgroups[group_id].add(member_id)
+            self._parents.setdefault(member_id, set()).add(group_id)
+        elif kind == 'user':
+            self._users[group_id].add(member_id)
+
+    def add_member(self, group_id, member_id, kind: str):
+        with self._lock:
+            self._ensure(group_id)
+            self._add(group_id, member_id, kind)
+            self.invalidate(group_id)
+
+    def remove_member(self, group_id, member_id):
+        with self._lock:
+            if group_id not in self._users:
+                return
+            self._users[group_id].discard(member_id)
+            if member_id in self._subgroups[group_id]:
+                self._subgroups[group_id].discard(member_id)
+                self._parents.get(member_id, set()).discard(group_id)
+            self.invalidate(group_id)
+
+    def remove_group(self, group_id):
+        with self._lock:
+            if group_id not in self._users:
+                return
+            self.invalidate(group_id)
+            for subgroup in self._subgroups.pop(group_id):
+                self._parents.get(subgroup, set()).discard(group_id)
+            del self._users[group_id]
+
+    def invalidate(self, group_id):
+        """
+        Drops the memoised sets of a group and of all groups containing it.
+        """
+        with self._lock:
+            stack, seen = [group_id], {group_id}
+            while stack:
+                g = stack.pop()
+                self._flat.pop(g, None)
+                for parent in self._parents.get(g, ()):
+                    if parent not in seen:
+                        seen.add(parent)
+                        stack.append(parent)
+
+    def direct_users(self, group_id) -> frozenset:
+        with self._lock:
+            return frozenset(self._users.get(group_id, ()))
+
+    def direct_subgroups(self, group_id) -> frozenset:
+        with self._lock:
+            return frozenset(self._subgroups.get(group_id, ()))
+
+    def transitive_users(self, group_id) -> frozenset:
+        """
+        Returns the ids of all users that are members of the group directly or through any
+        depth of nested groups. Subgroups not present in the graph contribute nothing.
+        """
+        with self._lock:
+            flat = self._flat.get(group_id)
+            if flat is not None:
+                return flat
+            # Post-order walk memoising every subgroup on the way; groups on a cycle are
+            # left for the closure below.
+            stack, visiting = [(group_id, False)], set()
+            while stack:
+                g, expanded = stack.pop()
+                if expanded:
+                    visiting.discard(g)
+                    users = set(self._users.get(g, ()))
+                    for subgroup in self._subgroups.get(g, ()):
+                        sub = self._flat.get(subgroup)
+                        if sub is None:
+                            break
+                        users |= sub
+                    else:
+                        self._flat[g] = frozenset(users)
+                    continue
+                if g in self._flat or g in visiting:
+                    continue
+                visiting.add(g)
+                stack.append((g, True))
+                stack.extend((s, False) for s in self._subgroups.get(g, ()) if s not in self._flat)
+
+            flat = self._flat.get(group_id)
+            if flat is None:
+                users, seen, queue = set(), {group_id}, [group_id]
+                while queue:
+                    g = queue.pop()
+                    sub = self._flat.get(g)
+                    if sub is not None:
+                        users |= sub
+                        continue
+                    users |= self._users.get(g, ())
+                    for subgroup in self._subgroups.get(g, ()):
+                        if subgroup not in seen:
+                            seen.add(subgroup)
+                            queue.append(subgroup)
+                flat = self._flat[group_id] = frozenset(users)
+            return flat
+
+    def expand(self, group_ids) -> dict:
+        """
+        Flattens many groups at once.
+
+        :return: The transitive user ids of every group, keyed by group id.
+        :rtype: dict[str, frozenset]
+        """
+        return {g: self.transitive_users(g) for g in group_ids}
+
+    def ancestors(self, group_ids) -> set:
+        """
+        Returns the given groups together with every group containing any of them, i.e. the
+        groups whose expansion changes when the given groups change.
+        """
+        with self._lock:
+            result, stack = set(group_ids), list(group_ids)
+            while stack:
+                for parent in self._parents.get(stack.pop(), ()):
+                    if parent not in result:
+                        result.add(parent)
+                        stack.append(parent)
+            return result
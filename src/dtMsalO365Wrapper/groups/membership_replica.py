@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import json
+import logging
+
+from dtMsalO365Wrapper._delta_replica import DeltaReplica
+from dtMsalO365Wrapper.groups.group import Group
+from dtMsalO365Wrapper.groups.membership_graph import MembershipGraph, member_type
+
+
+class GroupMembershipReplica(DeltaReplica):
+    """
+    Local replica of the tenant's groups and their direct members, kept in an embedded SQLite
+    store and fed from `/groups/delta`.
+
+    The first `sync()` loads every group with its members and stores the delta link; later
+    calls only replay the membership changes since then, also across process restarts when
+    the replica is persisted to a file. Expansions are answered from a `MembershipGraph`
+    built from the store, whose memoised sets are only dropped for groups affected by a sync.
+
+    :ivar _groups: The `Groups` subsystem whose token session is used to talk to Graph.
+    :type _groups: Groups
+    :ivar path: Path of the SQLite database, `:memory:` for a purely in-memory replica.
+    :type path: str
+    """
+
+    SELECT_FIELDS = ['id', 'displayName', 'description', 'mail', 'mailEnabled', 'securityEnabled',
+                     'groupTypes', 'members']
+    NAME = 'group replica'
+
+    def __init__(self, groups, path: str = ':memory:'):
+        super().__init__(groups._token_auth_session, path)
+        self._groups = groups
+        self._graph = None
+        self._conn.execute('CREATE TABLE IF NOT EXISTS groups (id TEXT PRIMARY KEY, properties TEXT NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS members (group_id TEXT NOT NULL, member_id TEXT NOT NULL, '
+                           'member_type TEXT, PRIMARY KEY (group_id, member_id))')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_members_member_id ON members (member_id)')
+        self._conn.commit()
+
+    def _apply(self, changes) -> set:
+        """
+        Applies a stream of delta items to the store and, if built, the membership graph.
+
+        :return: The ids of the groups whose direct members or existence changed.
+        :rtype: set
+        """
+        changed = set()
+        for item in changes:
+            group_id = item.get('id')
+            if group_id is None:
+                continue
+            changed.add(group_id)
+            if '@removed' in item:
+                self._conn.execute('DELETE FROM groups WHERE id = ?', (group_id,))
+                self._conn.execute('DELETE FROM members WHERE group_id = ?', (group_id,))
+                if self._graph is not None:
+                    self._graph.remove_group(group_id)
+                continue
+            properties = {k: v for k, v in item.items() if not k.startswith('@') and not k.startswith('members')}
+            existing = self._conn.execute('SELECT properties FROM groups WHERE id = ?', (group_id,)).fetchone()
+            if existing is not None:
+                properties = {**json.loads(existing[0]), **properties}
+            self._conn.execute('INSERT OR REPLACE INTO groups VALUES (?, ?)', (group_id, json.dumps(properties)))
+            for member in item.get('members@delta', []):
+                kind = member_type(member)
+                if '@removed' in member:
+                    self._conn.execute('DELETE FROM members WHERE group_id = ? AND member_id = ?',
+                                       (group_id, member['id']))
+                    if self._graph is not None:
+                        self._graph.remove_member(group_id, member['id'])
+                else:
+                    self._conn.execute('INSERT OR REPLACE INTO members VALUES (?, ?, ?)', (group_id, member['id'], kind))
+                    if self._graph is not None:
+                        self._graph.add_member(group_id, member['id'], kind)
+        return changed
+
+    def _clear(self):
+        self._conn.execute('DELETE FROM groups')
+        self._conn.execute('DELETE FROM members')
+        self._graph = None
+
+    def _discard(self):
+        # The graph may hold changes of the rolled back run; rebuild it from the store.
+        self._graph = None
+
+    def _affected(self, pages) -> tuple:
+        changed = set().union(*pages)
+        return changed, self.graph.ancestors(changed)
+
+    def load(self) -> int:
+        """
+        Performs a full load of all groups and their members, replacing everything currently
+        stored, and records the delta link used by subsequent `sync()` calls. The load runs in
+        one transaction, so a load failing partway leaves the previous contents in place.
+
+        :return: The number of groups stored.
+        :rtype: int
+        """
+        pages = self._load('/groups/delta', params={'$select': ','.join(self.SELECT_FIELDS)})
+        loaded = len(set().union(*pages))
+        logging.info(f'Group replica loaded with {loaded} groups')
+        return loaded
+
+    def sync(self) -> set:
+        """
+        Brings the replica up to date by replaying the changes since the last load or sync.
+        Falls back to a full `load()` when no delta link is stored yet, or when Graph reports
+        that the stored delta link has expired.
+
+        :return: The ids of the groups whose transitive expansion may have changed: the
+            changed groups and every group containing them. After a full load, all groups.
+        :rtype: set
+        """
+        result = self._replay(self._affected)
+        if result is None:
+            self.load()
+            return set(self.group_ids())
+        changed, affected = result
+        logging.info(f'Group replica synced: {len(changed)} groups changed, {len(affected)} expansions affected')
+        return affected
+
+    @property
+    def graph(self) -> MembershipGraph:
+        """
+        The membership graph of all replicated groups, built from the store on first use
+        and then kept current by `sync()`.
+        """
+        with self._lock:
+            if self._graph is None:
+                graph = MembershipGraph()
+                members = {}
+                for group_id, member_id, kind in self._conn.execute('SELECT group_id, member_id, member_type FROM members'):
+                    members.setdefault(group_id, []).append((member_id, kind))
+                for (group_id,) in self._conn.execute('SELECT id FROM groups'):
+                    graph.set_members(group_id, members.pop(group_id, ()))
+                self._graph = graph
+            return self._graph
+
+    def group_ids(self) -> list:
+        with self._lock:
+            return [r[0] for r in self._conn.execute('SELECT id FROM groups')]
+
+    def get_by_id(self, group_id) -> Group | None:
+        with self._lock:
+            row = self._conn.execute('SELECT properties FROM groups WHERE id = ?', (group_id,)).fetchone()
+        return Group(json.loads(row[0])) if row else None
+
+    def groups_of(self, member_id) -> list:
+        """
+        Returns the ids of the groups the user or group is a direct member of.
+        """
+        with self._lock:
+            return [r[0] for r in self._conn.execute('SELECT group_id FROM members WHERE member_id = ?', (member_id,))]
+
+    def expand(self, group_ids) -> dict:
+        """
+        Flattens groups into the ids of their transitive user members without calling Graph.
+
+        :rtype: dict[str, frozenset]
+        """
+        return self.graph.expand(group_ids)
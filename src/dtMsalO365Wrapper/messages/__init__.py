@@ -1,20 +1,219 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.collection import UserCollection
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from dtMsalO365Wrapper._batch import iter_batch
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+from dtMsalO365Wrapper.messages.bulk_outcome import BulkOutcome
 from dtMsalO365Wrapper.messages.message import Message
+from dtMsalO365Wrapper.messages.conversation import Conversation
+from dtMsalO365Wrapper.messages.conversation_index import ConversationIndex
+from dtMsalO365Wrapper.query import ODataQuery, F
+from dtMsalO365Wrapper._tracing import traced, bind_context
 
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
 
 class Messages:
 
+    # Properties needed to list or triage messages without downloading their bodies.
+    HEADER_FIELDS = ['id', 'subject', 'sender', 'from', 'toRecipients', 'ccRecipients', 'receivedDateTime',
+                     'sentDateTime', 'isRead', 'isDraft', 'importance', 'hasAttachments', 'categories',
+                     'conversationId', 'conversationIndex', 'internetMessageId', 'parentFolderId']
+
+    # Graph serves at most four concurrent requests per mailbox.
+    MAILBOX_CONCURRENCY = 4
+
     def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession):
         self._graph_client = graph_client
         self._token_auth_session = token_auth_session
 
-    def get_message(self, user, message_id):
-        resp = self._token_auth_session.request("GET", f"/users/{user.id}/messages/{message_id}")
+    @traced('Messages.get_message')
+    def get_message(self, user, message_id, query: ODataQuery = None):
+        """
+        Retrieves a single message of a user's mailbox. Supplying a query with a projection,
+        e.g. `ODataQuery().select(Messages.HEADER_FIELDS)`, avoids downloading the body.
+        """
+        request_kwargs = query.request_kwargs() if query is not None else {}
+        resp = self._token_auth_session.request("GET", f"/users/{user.id}/messages/{message_id}", **request_kwargs)
         if resp.status_code != 200:
             logging.error(f'Failed to get Message: {resp.content}')
             raise Exception(f'Failed to get Message: {resp.content}')
 
-        return Message(self._graph_client, self._token_auth_session, user, resp.json())
\ No newline at end of file
+        return Message(self._graph_client, self._token_auth_session, user, resp.json())
+
+    def iter_messages(self, user, query: ODataQuery = None, folder_id: str = None):
+        """
+        Iterates over the messages of a user's mailbox, or of one of its folders, with the
+        query's filter, projection, ordering and search applied on the server. Without a
+        query only `HEADER_FIELDS` are fetched. Pages are requested as they are consumed.
+
+        :param user: The owner of the mailbox.
+        :param query: The query to apply. Defaults to a projection on `HEADER_FIELDS`.
+        :type query: ODataQuery | None
+        :param folder_id: Restrict the listing to this mail folder (id or well-known name).
+        :type folder_id: str | None
+        :return: A generator yielding the matching messages.
+        :rtype: Iterator[Message]
+        """
+        if query is None:
+            query = ODataQuery().select(self.HEADER_FIELDS)
+        url = f"/users/{user.id}/mailFolders/{folder_id}/messages" if folder_id else f"/users/{user.id}/messages"
+        for m in self._token_auth_session.get_paged(url, **query.request_kwargs()):
+            yield Message(self._graph_client, self._token_auth_session, user, m)
+
+    @traced('Messages.get_conversation')
+    def get_conversation(self, user, conversation_id, select_fields: list = None,
+                         index: ConversationIndex = None) -> Conversation:
+        """
+        Fetches all messages of a conversation in a user's mailbox with one filtered, projected
+        and paged query, and arranges them into a reply tree by their `conversationIndex`.
+
+        :param user: The owner of the mailbox.
+        :param conversation_id: The id of the conversation.
+        :type conversation_id: str
+        :param select_fields: The message properties to fetch. Defaults to `HEADER_FIELDS`;
+            the properties needed to build the tree are always included.
+        :type select_fields: list | None
+        :param index: An index to add the fetched messages to.
+        :type index: ConversationIndex | None
+        :rtype: Conversation
+        """
+        query = (ODataQuery().select(select_fields or self.HEADER_FIELDS)
+                 .select('id', 'conversationId', 'conversationIndex', 'sentDateTime', 'receivedDateTime')
+                 .filter(F.eq('conversationId', conversation_id)))
+        messages = list(self.iter_messages(user, query))
+        if index is not None:
+            index.add_many(messages)
+        return Conversation(conversation_id, messages)
+
+    def get_conversations(self, user, conversation_ids, workers: int = MAILBOX_CONCURRENCY,
+                          select_fields: list = None, index: ConversationIndex = None):
+        """
+        Fetches many conversations of one mailbox like `get_conversation`, with up to
+        `workers` of them in flight at once. Conversation ids are consumed lazily and the
+        conversations are yielded as they complete, so the order is not guaranteed.
+        Conversations that fail to load are logged and skipped.
+
+        :param conversation_ids: The ids of the conversations.
+        :type conversation_ids: Iterable[str]
+        :param workers: The number of conversations fetched at the same time. Graph serves
+            at most `MAILBOX_CONCURRENCY` concurrent requests per mailbox.
+        :type workers: int
+        :return: A generator yielding the conversations.
+        :rtype: Iterator[Conversation]
+        """
+        fetch = bind_context(self.get_conversation)
+        pending = {}
+
+        def _completed():
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                conversation_id = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logging.error(f'Failed to get conversation {conversation_id} of {user.id}: {e}')
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ConversationFetch') as executor:
+            try:
+                for conversation_id in conversation_ids:
+                    if len(pending) >= workers * 2:
+                        yield from _completed()
+                    pending[executor.submit(fetch, user, conversation_id, select_fields, index)] = conversation_id
+                while pending:
+                    yield from _completed()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _mutate_many(self, user, message_ids, build, workers: int, max_retries: int) -> dict:
+        message_ids = list(dict.fromkeys(message_ids))
+        # Batches in flight run against the same mailbox, so they share its concurrency.
+        workers = max(1, min(workers, self.MAILBOX_CONCURRENCY))
+        chains = self.MAILBOX_CONCURRENCY // workers
+        requests = []
+        for i, message_id in enumerate(message_ids):
+            request = {'id': str(i), 'url': f"/users/{user.id}/messages/{message_id}"}
+            request.update(build(request['url']))
+            requests.append(request)
+
+        outcomes = {}
+        for request_id, sub in iter_batch(self._token_auth_session, requests, max_workers=workers,
+                                          max_retries=max_retries, chains=chains):
+            message_id = message_ids[int(request_id)]
+            outcomes[message_id] = BulkOutcome(message_id, sub.get('status'), sub.get('body'))
+
+        failed = sum(1 for o in outcomes.values() if not o.ok)
+        if failed:
+            logging.warning(f'{failed} of {len(outcomes)} bulk message operations failed for {user.id}')
+        # Item and unread counts of the mailbox's folders changed behind the cache's back.
+        self._token_auth_session.invalidate_cache(f"/users/{user.id}/mailFolders")
+        return outcomes
+
+    @traced('Messages.update_many')
+    def update_many(self, user, message_ids, changes: dict, workers: int = 1, max_retries: int = 5) -> dict:
+        """
+        Applies the same property changes, e.g. `{'isRead': True}` or `{'categories': ['Triage']}`,
+        to many messages of one mailbox.
+
+        The updates are sent as JSON batches of 20, whose sub-requests are chained so that no
+        more than `MAILBOX_CONCURRENCY` of them run against the mailbox at once, across all
+        batches in flight. Throttled or transiently failed items are resent on their own;
+        items that failed for good are reported in the result rather than raised.
+
+        :param user: The owner of the mailbox.
+        :param message_ids: The ids of the messages to update.
+        :type message_ids: Iterable[str]
+        :param changes: The message properties to set.
+        :type changes: dict
+        :param workers: The number of batches in flight at the same time, at most
+            `MAILBOX_CONCURRENCY`. The chains of each batch are narrowed accordingly.
+        :type workers: int
+        :param max_retries: How often a throttled item is resent before it is reported as failed.
+        :type max_retries: int
+        :raises DeadlineExceeded: If throttled items would have to wait past the deadline in effect.
+        :return: The outcome of every message, keyed by message id.
+        :rtype: dict[str, BulkOutcome]
+        """
+        return self._mutate_many(user, message_ids,
+                                 lambda url: {'method': 'PATCH', 'body': changes,
+                                              'headers': {'Content-Type': 'application/json'}},
+                                 workers, max_retries)
+
+    def mark_read_many(self, user, message_ids, is_read: bool = True, **kwargs) -> dict:
+        return self.update_many(user, message_ids, {'isRead': is_read}, **kwargs)
+
+    def categorize_many(self, user, message_ids, categories: list, **kwargs) -> dict:
+        return self.update_many(user, message_ids, {'categories': list(categories)}, **kwargs)
+
+    @traced('Messages.move_many')
+    def move_many(self, user, message_ids, dest_folder, workers: int = 1, max_retries: int = 5) -> dict:
+        """
+        Moves many messages of one mailbox to a folder, batched like `update_many`. Note that
+        Graph gives a moved message a new id, which is returned in the body of its outcome.
+
+        :param dest_folder: The destination `Folder`, folder id or well-known name such as `archive`.
+        :return: The outcome of every message, keyed by its original id.
+        :rtype: dict[str, BulkOutcome]
+        """
+        destination_id = getattr(dest_folder, 'id', dest_folder)
+        return self._mutate_many(user, message_ids,
+                                 lambda url: {'method': 'POST', 'url': f'{url}/move',
+                                              'body': {'destinationId': destination_id},
+                                              'headers': {'Content-Type': 'application/json'}},
+                                 workers, max_retries)
+
+    @traced('Messages.delete_many')
+    def delete_many(self, user, message_ids, workers: int = 1, max_retries: int = 5) -> dict:
+        """
+        Deletes many messages of one mailbox, batched like `update_many`. Deleted messages
+        are moved to the Deleted Items folder.
+
+        :return: The outcome of every message, keyed by message id.
+        :rtype: dict[str, BulkOutcome]
+        """
+        return self._mutate_many(user, message_ids, lambda url: {'method': 'DELETE'}, workers, max_retries)
@@ -0,0 +1,31 @@
+class BulkOutcome:
+    """
+    The result of one item of a bulk mailbox mutation.
+
+    :ivar message_id: The id of the message the mutation targeted.
+    :type message_id: str
+    :ivar status: The HTTP status of the item's sub-request.
+    :type status: int
+    :ivar body: The JSON body of the sub-response, e.g. the moved message or a Graph error.
+    :type body: dict | None
+    """
+    __slots__ = ('message_id', 'status', 'body')
+
+    def __init__(self, message_id: str, status: int, body: dict = None):
+        self.message_id = message_id
+        self.status = status
+        self.body = body
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+    @property
+    def error(self):
+        if self.ok or not isinstance(self.body, dict):
+            return None
+        error = self.body.get('error') or {}
+        return error.get('message') or error.get('code')
+
+    def __repr__(self):
+        return f'BulkOutcome({self.message_id!r}, {self.status})'
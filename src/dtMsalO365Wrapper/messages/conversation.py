@@ -0,0 +1,168 @@
+import uuid
+import base64
+import binascii
+import datetime
+
+# A conversation index is a 22 byte header followed by one 5 byte block per reply level.
+INDEX_HEADER_SIZE = 22
+INDEX_BLOCK_SIZE = 5
+_FILETIME_EPOCH = datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _index_bytes(value):
+    if not value:
+        return None
+    if isinstance(value, (bytes, bytearray)):
+        raw = bytes(value)
+    else:
+        try:
+            raw = base64.b64decode(value)
+        except (binascii.Error, ValueError):
+            return None
+    if len(raw) < INDEX_HEADER_SIZE or (len(raw) - INDEX_HEADER_SIZE) % INDEX_BLOCK_SIZE:
+        return None
+    return raw
+
+
+def _filetime(value: int) -> datetime.datetime:
+    return _FILETIME_EPOCH + datetime.timedelta(microseconds=value // 10)
+
+
+def decode_conversation_index(value):
+    """
+    Decodes a `conversationIndex` (base64 as returned by Graph, or raw bytes).
+
+    The header carries the time the conversation started and its GUID; every reply level
+    appends a block holding the time elapsed since the level above it.
+
+    :return: `(started, guid, reply_times)`, where `reply_times` holds the time of each reply
+        level of the message, or None if the value is not a valid conversation index.
+    :rtype: tuple[datetime.datetime, uuid.UUID, list[datetime.datetime]] | None
+    """
+    raw = _index_bytes(value)
+    if raw is None:
+        return None
+    # The header holds the 48 high bits of a FILETIME.
+    filetime = int.from_bytes(raw[:6], 'big') << 16
+    started = _filetime(filetime)
+    reply_times = []
+    for offset in range(INDEX_HEADER_SIZE, len(raw), INDEX_BLOCK_SIZE):
+        block = int.from_bytes(raw[offset:offset + 4], 'big')
+        delta = block & 0x7FFFFFFF
+        filetime += delta << 23 if block & 0x80000000 else delta << 18
+        reply_times.append(_filetime(filetime))
+    return started, uuid.UUID(bytes=raw[6:INDEX_HEADER_SIZE]), reply_times
+
+
+class ConversationNode:
+    """
+    A message in the reply tree of a conversation.
+
+    :ivar message: The message.
+    :type message: Message
+    :ivar children: The replies to the message, oldest first.
+    :type children: list[ConversationNode]
+    :ivar depth: The reply level of the message within the tree, 0 for a root.
+    :type depth: int
+    """
+    __slots__ = ('message', 'children', 'depth', '_key', '_time')
+
+    def __init__(self, message, key, time):
+        self.message = message
+        self.children = []
+        self.depth = 0
+        self._key = key
+        self._time = time
+
+    def __repr__(self):
+        return f'ConversationNode({self.message.id!r}, replies={len(self.children)})'
+
+
+class Conversation:
+    """
+    The messages of one conversation arranged as a reply tree.
+
+    A message's parent is the message whose `conversationIndex` equals its own without the
+    last reply block. When that message is not present, e.g. because it was deleted or never
+    reached the mailbox, the nearest earlier ancestor present is used instead, and messages
+    without any present ancestor become roots. Messages without a valid conversation index
+    are treated as roots too.
+
+    :ivar conversation_id: The id of the conversation.
+    :type conversation_id: str
+    :ivar roots: The top-level messages of the tree, oldest first.
+    :type roots: list[ConversationNode]
+    """
+
+    def __init__(self, conversation_id: str, messages):
+        self.conversation_id = conversation_id
+        nodes = []
+        for m in messages:
+            key = _index_bytes(m.conversation_index)
+            decoded = decode_conversation_index(key) if key is not None else None
+            if decoded is not None:
+                time = decoded[2][-1] if decoded[2] else decoded[0]
+            else:
+                time = m.sent or m.received
+            nodes.append(ConversationNode(m, key, time))
+        self._nodes = sorted(nodes, key=self._order)
+
+        by_key = {}
+        self.roots = []
+        # Shorter indexes first, so that every parent is placed before its replies.
+        for node in sorted(self._nodes, key=lambda n: len(n._key) if n._key is not None else 0):
+            parent = None
+            if node._key is not None:
+                key = node._key[:-INDEX_BLOCK_SIZE]
+                while parent is None and len(key) >= INDEX_HEADER_SIZE:
+                    parent = by_key.get(key)
+                    key = key[:-INDEX_BLOCK_SIZE]
+                by_key.setdefault(node._key, node)
+            if parent is None:
+                self.roots.append(node)
+            else:
+                parent.children.append(node)
+        self.roots.sort(key=self._order)
+        stack = list(self.roots)
+        while stack:
+            node = stack.pop()
+            node.children.sort(key=self._order)
+            for child in node.children:
+                child.depth = node.depth + 1
+            stack.extend(node.children)
+
+    @staticmethod
+    def _order(node: ConversationNode):
+        time = node._time
+        if time is not None and time.tzinfo is None:
+            time = time.replace(tzinfo=datetime.timezone.utc)
+        return time is None, time or _FILETIME_EPOCH, node._key or b''
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __iter__(self):
+        return (node.message for node in self._nodes)
+
+    def __repr__(self):
+        return f'Conversation({self.conversation_id!r}, messages={len(self)})'
+
+    @property
+    def messages(self) -> list:
+        """
+        The messages of the conversation in chronological order.
+        """
+        return [node.message for node in self._nodes]
+
+    def walk(self):
+        """
+        Walks the reply tree depth first, each message followed by its replies.
+
+        :return: A generator yielding `(depth, message)` pairs.
+        :rtype: Iterator[tuple[int, Message]]
+        """
+        stack = list(reversed(self.roots))
+        while stack:
+            node = stack.pop()
+            yield node.depth, node.message
+            stack.extend(reversed(node.children))
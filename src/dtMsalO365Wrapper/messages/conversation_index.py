@@ -0,0 +1,104 @@
+import threading
+
+from dtMsalO365Wrapper.messages.conversation import Conversation
+
+
+class ConversationIndex:
+    """
+    In-memory index from conversation id to its messages, for ingesting messages
+    incrementally, e.g. from successive `iter_messages` or delta runs, and rebuilding only
+    the threads that received new messages.
+
+    Reply trees are built on demand and kept until a message of their conversation is
+    added or removed. The index is safe to feed from several threads.
+    """
+    def __init__(self):
+        self._messages = {}
+        self._conversation_of = {}
+        self._trees = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self._messages
+
+    def add(self, message):
+        """
+        Adds a message, replacing an earlier copy with the same id.
+
+        :return: The id of the message's conversation, or None if the message has none.
+        :rtype: str | None
+        """
+        conversation_id = message.conversation_id
+        if conversation_id is None:
+            return None
+        with self._lock:
+            previous = self._conversation_of.get(message.id)
+            if previous is not None and previous != conversation_id:
+                self._discard(message.id, previous)
+            self._messages.setdefault(conversation_id, {})[message.id] = message
+            self._conversation_of[message.id] = conversation_id
+            self._trees.pop(conversation_id, None)
+        return conversation_id
+
+    def add_many(self, messages) -> set:
+        """
+        Adds many messages.
+
+        :return: The ids of the conversations that changed.
+        :rtype: set[str]
+        """
+        changed = set()
+        for m in messages:
+            conversation_id = self.add(m)
+            if conversation_id is not None:
+                changed.add(conversation_id)
+        return changed
+
+    def _discard(self, message_id, conversation_id):
+        messages = self._messages.get(conversation_id)
+        if messages is not None:
+            messages.pop(message_id, None)
+            if not messages:
+                del self._messages[conversation_id]
+        self._trees.pop(conversation_id, None)
+
+    def remove(self, message_id):
+        """
+        Removes a message, e.g. one deleted or moved to a new id.
+
+        :return: The id of the message's conversation, or None if the message was not indexed.
+        :rtype: str | None
+        """
+        with self._lock:
+            conversation_id = self._conversation_of.pop(message_id, None)
+            if conversation_id is not None:
+                self._discard(message_id, conversation_id)
+        return conversation_id
+
+    @property
+    def conversation_ids(self) -> list:
+        with self._lock:
+            return list(self._messages)
+
+    def messages(self, conversation_id) -> list:
+        with self._lock:
+            return list(self._messages.get(conversation_id, {}).values())
+
+    def conversation(self, conversation_id):
+        """
+        Returns the reply tree of an indexed conversation.
+
+        :rtype: Conversation | None
+        """
+        with self._lock:
+            tree = self._trees.get(conversation_id)
+            if tree is not None:
+                return tree
+            messages = self._messages.get(conversation_id)
+            if messages is None:
+                return None
+            tree = self._trees[conversation_id] = Conversation(conversation_id, list(messages.values()))
+            return tree
@@ -1,11 +1,15 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.user import User as Office365User
-from office365.directory.users.user import Presence
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+from dtMsalO365Wrapper._tracing import traced
 
 import logging
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+
 class Folder:
 
     def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession, user, folder_detail: dict):
@@ -14,6 +18,7 @@ class Folder:
         self._token_auth_session = token_auth_session
         self.user = user
 
+    @traced('Folder.get_parent_folder')
     def get_parent_folder(self):
         parent_folder_id = self._folder_detail['parentFolderId']
         resp = self._token_auth_session.request("GET", f"/users/{self.user.id}/mailFolders/{parent_folder_id}")
@@ -24,6 +29,7 @@ class Folder:
         return Folder(self._graph_client, self._token_auth_session, self.user, resp.json())
 
     @property
+    @traced('Folder.folder_path')
     def folder_path(self):
         path = [self.display_name]
         current_folder_id = self.id
@@ -1,6 +1,6 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.user import User as Office365User
-from office365.directory.users.user import Presence
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper.messages.folders.folder import Folder
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
@@ -8,6 +8,9 @@ from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
 import logging
 import datetime
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+
 class Message:
 
     def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession, user, message_detail: dict):
@@ -25,95 +28,99 @@ class Message:
 
         return Folder(self._graph_client, self._token_auth_session, self.user, resp.json())
 
+    def _datetime(self, key):
+        value = self._message_detail.get(key)
+        return datetime.datetime.fromisoformat(value) if value else None
+
     @property
     def id(self):
-        return self._message_detail['id']
+        return self._message_detail.get('id')
 
     @property
     def created(self):
-        return datetime.datetime.fromisoformat(self._message_detail['createdDateTime'])
+        return self._datetime('createdDateTime')
 
     @property
     def last_modified(self):
-        return datetime.datetime.fromisoformat(self._message_detail['lastModifiedDateTime'])
+        return self._datetime('lastModifiedDateTime')
 
     @property
     def categories(self):
-        return self._message_detail['categories']
+        return self._message_detail.get('categories')
 
     @property
     def received(self):
-        return datetime.datetime.fromisoformat(self._message_detail['receivedDateTime'])
+        return self._datetime('receivedDateTime')
 
     @property
     def sent(self):
-        return datetime.datetime.fromisoformat(self._message_detail['sentDateTime'])
+        return self._datetime('sentDateTime')
 
     @property
     def has_attachments(self):
-        return self._message_detail['hasAttachments']
+        return self._message_detail.get('hasAttachments')
 
     @property
     def internet_message_id(self):
-        return self._message_detail['internetMessageId']
+        return self._message_detail.get('internetMessageId')
 
     @property
     def subject(self):
-        return self._message_detail['subject']
+        return self._message_detail.get('subject')
 
     @property
     def body_preview(self):
-        return self._message_detail['bodyPreview']
+        return self._message_detail.get('bodyPreview')
 
     @property
     def importance(self):
-        return self._message_detail['importance']
+        return self._message_detail.get('importance')
 
     @property
     def conversation_id(self):
-        return self._message_detail['conversationId']
+        return self._message_detail.get('conversationId')
 
     @property
     def conversation_index(self):
-        return self._message_detail['conversationIndex']
+        return self._message_detail.get('conversationIndex')
 
     @property
     def is_read(self):
-        return self._message_detail['isRead']
+        return self._message_detail.get('isRead')
 
     @property
     def is_draft(self):
-        return self._message_detail['isDraft']
+        return self._message_detail.get('isDraft')
 
     @property
     def body(self):
-        return self._message_detail['body']
+        return self._message_detail.get('body')
 
     @property
     def sender(self):
-        return self._message_detail['sender']
+        return self._message_detail.get('sender')
 
     @property
     def from_(self):
-        return self._message_detail['from']
+        return self._message_detail.get('from')
 
     @property
     def to_recipients(self):
-        return self._message_detail['toRecipients']
+        return self._message_detail.get('toRecipients')
 
     @property
     def cc_recipients(self):
-        return self._message_detail['ccRecipients']
+        return self._message_detail.get('ccRecipients')
 
     @property
     def bcc_recipients(self):
-        return self._message_detail['bccRecipients']
+        return self._message_detail.get('bccRecipients')
 
     @property
     def reply_to(self):
-        return self._message_detail['replyTo']
+        return self._message_detail.get('replyTo')
 
     @property
     def flag(self):
-        return self._message_detail['flag']
+        return self._message_detail.get('flag')
 
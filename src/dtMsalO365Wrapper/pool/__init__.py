@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future
+
+from dtMsalO365Wrapper._token_auth_session import create_http_adapter
+from dtMsalO365Wrapper.pool.scheduler import FairScheduler
+from dtMsalO365Wrapper._tracing import bind_context
+
+
+class TenantClientPool:
+    """
+    Pool of `MsalO365Client` instances for many tenants sharing one HTTP transport.
+
+    Clients are created lazily on first use of a tenant and all of them mount the same HTTP
+    adapter, so every tenant draws on a single connection pool per host instead of opening
+    its own. Work submitted through `submit` is scheduled fairly: tenants are served in
+    round-robin order and each tenant is capped at `per_tenant_concurrency` running tasks,
+    so one tenant's large crawl cannot starve the others. Clients that stay idle for longer
+    than `idle_timeout` seconds are evicted together with their cached tokens; clients
+    leased through `lease()` or running submitted work are never evicted.
+
+    :ivar _credentials: Mapping of tenant id to the keyword arguments of `MsalO365Client`
+        (`client_id` and `client_secret` or `certificate_path`), or a callable taking the
+        tenant id and returning them.
+    :type _credentials: dict | Callable[[str], dict]
+    :ivar _client_kwargs: Further keyword arguments of `MsalO365Client` for all tenants. A
+        tenant's credentials take precedence over them, and `tenant_id` and `http_adapter`
+        are always set by the pool.
+    :type _client_kwargs: dict
+    :ivar idle_timeout: Seconds without activity after which a tenant's client is evicted.
+    :type idle_timeout: float
+    :ivar http_adapter: The HTTP adapter shared by all clients of the pool.
+    :type http_adapter: HTTPAdapter
+    """
+    def __init__(self, credentials, max_workers: int = 16, per_tenant_concurrency: int = 4,
+                 idle_timeout: float = 900, pool_maxsize: int = None, client_kwargs: dict = None):
+        self._credentials = credentials
+        self.idle_timeout = idle_timeout
+        self._client_kwargs = client_kwargs or {}
+        self.http_adapter = create_http_adapter(pool_maxsize=pool_maxsize or max_workers)
+        self._scheduler = FairScheduler(max_workers=max_workers, per_key_limit=per_tenant_concurrency,
+                                        thread_name_prefix='TenantClientPool')
+        self._clients = {}
+        self._last_used = {}
+        self._leases = {}
+        self._lock = threading.Lock()
+
+    def _tenant_credentials(self, tenant_id) -> dict:
+        if callable(self._credentials):
+            return self._credentials(tenant_id)
+        try:
+            return self._credentials[tenant_id]
+        except KeyError:
+            raise KeyError(f'No credentials configured for tenant: {tenant_id}') from None
+
+    def client(self, tenant_id):
+        """
+        Returns the client of a tenant, creating it on first use. The client counts as used
+        now; to keep it from being evicted while holding on to it, use `lease()` instead.
+
+        :param tenant_id: The tenant to get the client of.
+        :type tenant_id: str
+        :return: The tenant's client.
+        :rtype: MsalO365Client
+        """
+        from dtMsalO365Wrapper import MsalO365Client
+        self.evict_idle()
+        with self._lock:
+            client = self._clients.get(tenant_id)
+            if client is None:
+                logging.info(f'Creating client for tenant {tenant_id}')
+                kwargs = {**self._client_kwargs, **self._tenant_credentials(tenant_id),
+                          'tenant_id': tenant_id, 'http_adapter': self.http_adapter}
+                client = MsalO365Client(**kwargs)
+                self._clients[tenant_id] = client
+            self._last_used[tenant_id] = time.monotonic()
+            return client
+
+    @contextmanager
+    def lease(self, tenant_id):
+        """
+        Provides the client of a tenant for the duration of the `with` block, during which
+        it is not evicted as idle.
+
+        :return: A context manager yielding the tenant's `MsalO365Client`.
+        """
+        with self._lock:
+            self._leases[tenant_id] = self._leases.get(tenant_id, 0) + 1
+        try:
+            yield self.client(tenant_id)
+        finally:
+            with self._lock:
+                self._leases[tenant_id] -= 1
+                if not self._leases[tenant_id]:
+                    del self._leases[tenant_id]
+                self._last_used[tenant_id] = time.monotonic()
+
+    def submit(self, tenant_id, fn, *args, **kwargs) -> Future:
+        """
+        Schedules `fn(client, *args, **kwargs)` to run with the client of `tenant_id`.
+
+        :param tenant_id: The tenant the work belongs to.
+        :type tenant_id: str
+        :param fn: The callable to run; it receives the tenant's `MsalO365Client` as first argument.
+        :type fn: Callable
+        :return: A future resolved with the result of `fn`.
+        :rtype: Future
+        """
+        def _run():
+            with self.lease(tenant_id) as client:
+                return fn(client, *args, **kwargs)
+
+        return self._scheduler.submit(tenant_id, bind_context(_run))
+
+    def map(self, tenant_id, fn, items):
+        """
+        Runs `fn(client, item)` for every item under the tenant's fair-share limits and yields
+        the results in the order of `items`.
+        """
+        futures = [self.submit(tenant_id, fn, item) for item in items]
+        for future in futures:
+            yield future.result()
+
+    def evict(self, tenant_id) -> bool:
+        """
+        Drops the client of a tenant and discards its cached tokens. The shared transport
+        is left open for the remaining tenants.
+
+        :return: True if a client was evicted.
+        :rtype: bool
+        """
+        with self._lock:
+            client = self._clients.pop(tenant_id, None)
+            self._last_used.pop(tenant_id, None)
+        if client is None:
+            return False
+        self._dispose(tenant_id, client)
+        return True
+
+    @staticmethod
+    def _dispose(tenant_id, client):
+        client.clear_tokens()
+        client.close()
+        logging.info(f'Evicted client for tenant {tenant_id}')
+
+    def evict_idle(self) -> list:
+        """
+        Evicts the clients of all tenants that have been idle longer than `idle_timeout`,
+        are not leased and have no queued or running work. Tenants are checked and removed
+        under one lock, so a client handed out concurrently is never evicted.
+
+        :return: The ids of the evicted tenants.
+        :rtype: list
+        """
+        now = time.monotonic()
+        evicted = {}
+        with self._lock:
+            for t, last_used in list(self._last_used.items()):
+                if (now - last_used > self.idle_timeout and not self._leases.get(t)
+                        and not self._scheduler.in_flight(t) and not self._scheduler.pending(t)):
+                    self._last_used.pop(t)
+                    client = self._clients.pop(t, None)
+                    if client is not None:
+                        evicted[t] = client
+        for t, client in evicted.items():
+            self._dispose(t, client)
+        return list(evicted)
+
+    @property
+    def tenants(self) -> list:
+        with self._lock:
+            return list(self._clients)
+
+    def close(self, wait: bool = True):
+        self._scheduler.shutdown(wait)
+        for tenant_id in self.tenants:
+            self.evict(tenant_id)
+        self.http_adapter.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,102 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class FairScheduler:
+    """
+    Thread pool that runs work submitted under different keys in round-robin order.
+
+    Each key (typically a tenant id) has its own queue. Idle workers take the next task
+    from the next key in rotation that has queued work and is below its concurrency cap,
+    so a key with a huge backlog cannot starve keys that submit only a few tasks.
+
+    :ivar max_workers: The number of worker threads shared by all keys.
+    :type max_workers: int
+    :ivar per_key_limit: The maximum number of tasks of one key running at the same time.
+    :type per_key_limit: int
+    """
+    def __init__(self, max_workers: int = 16, per_key_limit: int = 4, thread_name_prefix: str = 'dtMsalO365Wrapper'):
+        self.max_workers = max_workers
+        self.per_key_limit = per_key_limit
+        self._queues = {}
+        self._in_flight = {}
+        self._rotation = deque()
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._workers = [threading.Thread(target=self._work, name=f'{thread_name_prefix}-{i}', daemon=True)
+                         for i in range(max_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        """
+        Queues `fn(*args, **kwargs)` under `key`.
+
+        :return: A future resolved with the result of the call.
+        :rtype: Future
+        """
+        future = Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('Cannot submit to a scheduler that has been shut down')
+            if key not in self._queues:
+                self._queues[key] = deque()
+                self._in_flight[key] = 0
+                self._rotation.append(key)
+            self._queues[key].append((future, fn, args, kwargs))
+            self._condition.notify()
+        return future
+
+    def in_flight(self, key) -> int:
+        with self._condition:
+            return self._in_flight.get(key, 0)
+
+    def pending(self, key) -> int:
+        with self._condition:
+            return len(self._queues.get(key, ()))
+
+    def _next_task(self):
+        for _ in range(len(self._rotation)):
+            key = self._rotation[0]
+            self._rotation.rotate(-1)
+            queue = self._queues[key]
+            if queue and self._in_flight[key] < self.per_key_limit:
+                self._in_flight[key] += 1
+                return key, queue.popleft()
+        return None, None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                key, task = self._next_task()
+                while task is None:
+                    if self._shutdown:
+                        return
+                    self._condition.wait()
+                    key, task = self._next_task()
+            future, fn, args, kwargs = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        logging.debug(f'Task for {key} failed: {e}')
+                        future.set_exception(e)
+            finally:
+                with self._condition:
+                    self._in_flight[key] -= 1
+                    if not self._queues[key] and not self._in_flight[key]:
+                        del self._queues[key]
+                        del self._in_flight[key]
+                        self._rotation.remove(key)
+                    self._condition.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
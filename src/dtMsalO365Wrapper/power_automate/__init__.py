@@ -1,9 +1,12 @@
-from office365.graph_client import GraphClient
-from office365.teams.team import Team as O365Team
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
-from dtMsalO365Wrapper.teams.channel import Channel
-from dtMsalO365Wrapper.teams import Team
+
+if TYPE_CHECKING:
+    from dtMsalO365Wrapper.teams.channel import Channel
+    from dtMsalO365Wrapper.teams.team import Team
 
 class PowerAutomate:
 
@@ -0,0 +1,292 @@
+from __future__ import annotations
+
+import datetime
+import uuid
+from urllib.parse import urlencode
+
+
+def literal(value) -> str:
+    """
+    Formats a Python value as an OData literal. Strings are quoted with embedded single quotes
+    doubled, booleans and None map to `true`, `false` and `null`, and datetimes are written
+    as unquoted ISO 8601 timestamps in UTC.
+
+    :param value: The value to format.
+    :return: The OData literal.
+    :rtype: str
+    """
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value.isoformat(timespec='seconds') + 'Z'
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return "'{0}'".format(str(value).replace("'", "''"))
+
+
+class Expr:
+    """
+    A `$filter` expression. Expressions combine with `&` (and), `|` (or) and `~` (not) and
+    remember whether they use operators that Graph only supports as advanced queries on
+    directory objects.
+
+    :ivar text: The OData text of the expression.
+    :type text: str
+    :ivar advanced: True if the expression needs `ConsistencyLevel: eventual` and `$count`.
+    :type advanced: bool
+    """
+    __slots__ = ('text', 'advanced')
+
+    def __init__(self, text: str, advanced: bool = False):
+        self.text = text
+        self.advanced = advanced
+
+    def __and__(self, other):
+        other = _expr(other)
+        return Expr(f'({self.text} and {other.text})', self.advanced or other.advanced)
+
+    def __or__(self, other):
+        other = _expr(other)
+        return Expr(f'({self.text} or {other.text})', self.advanced or other.advanced)
+
+    def __invert__(self):
+        return Expr(f'not ({self.text})', True)
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Expr({self.text!r})'
+
+
+def _expr(value) -> Expr:
+    return value if isinstance(value, Expr) else Expr(str(value))
+
+
+class F:
+    """
+    Builders for escaped `$filter` expressions, e.g.
+
+        F.eq('department', "R&D") & F.startswith('displayName', "O'Brien")
+    """
+    @staticmethod
+    def eq(field: str, value) -> Expr:
+        return Expr(f'{field} eq {literal(value)}')
+
+    @staticmethod
+    def ne(field: str, value) -> Expr:
+        return Expr(f'{field} ne {literal(value)}', True)
+
+    @staticmethod
+    def gt(field: str, value) -> Expr:
+        return Expr(f'{field} gt {literal(value)}')
+
+    @staticmethod
+    def ge(field: str, value) -> Expr:
+        return Expr(f'{field} ge {literal(value)}')
+
+    @staticmethod
+    def lt(field: str, value) -> Expr:
+        return Expr(f'{field} lt {literal(value)}')
+
+    @staticmethod
+    def le(field: str, value) -> Expr:
+        return Expr(f'{field} le {literal(value)}')
+
+    @staticmethod
+    def in_(field: str, values) -> Expr:
+        return Expr(f"{field} in ({','.join(literal(v) for v in values)})")
+
+    @staticmethod
+    def startswith(field: str, value) -> Expr:
+        return Expr(f'startswith({field},{literal(value)})')
+
+    @staticmethod
+    def endswith(field: str, value) -> Expr:
+        return Expr(f'endswith({field},{literal(value)})', True)
+
+    @staticmethod
+    def any(collection: str, expression: str) -> Expr:
+        """
+        Lambda filter over a collection property, e.g. `F.any('assignedLicenses', "s:s/skuId eq ...")`.
+        """
+        return Expr(f'{collection}/any({expression})')
+
+    @staticmethod
+    def and_(*expressions) -> Expr:
+        result = _expr(expressions[0])
+        for e in expressions[1:]:
+            result = result & e
+        return result
+
+    @staticmethod
+    def or_(*expressions) -> Expr:
+        result = _expr(expressions[0])
+        for e in expressions[1:]:
+            result = result | e
+        return result
+
+
+class ODataQuery:
+    """
+    Composable builder for OData query options (`$select`, `$filter`, `$orderby`, `$top`,
+    `$expand`, `$search` and `$count`).
+
+    Every option is escaped when the query is rendered. Advanced query handling is opt-in
+    per resource: when rendered with `directory=True` (users, groups and other directory
+    objects) a query that uses `$search`, `$count`, `ne`, `not` or `endswith` also gets
+    `$count=true` and `ConsistencyLevel: eventual`, which other resources such as messages
+    do not accept. Builder methods return the query itself so calls can be chained:
+
+        ODataQuery().select('id', 'subject', 'sender').filter(F.eq('isRead', False)).top(50)
+    """
+    def __init__(self):
+        self._select = []
+        self._expand = []
+        self._filter = None
+        self._orderby = []
+        self._top = None
+        self._search = None
+        self._count = False
+        self._eventual = False
+
+    def select(self, *fields) -> ODataQuery:
+        for f in fields:
+            self._select.extend([f] if isinstance(f, str) else f)
+        return self
+
+    def expand(self, *relations) -> ODataQuery:
+        self._expand.extend(relations)
+        return self
+
+    def filter(self, expression) -> ODataQuery:
+        """
+        Adds a filter expression; multiple calls are combined with `and`. Plain strings are
+        used verbatim, so prefer `F` builders for values that need escaping.
+        """
+        expression = _expr(expression)
+        self._filter = expression if self._filter is None else self._filter & expression
+        return self
+
+    def orderby(self, field: str, descending: bool = False) -> ODataQuery:
+        self._orderby.append(f'{field} desc' if descending else field)
+        return self
+
+    def top(self, count: int) -> ODataQuery:
+        self._top = int(count)
+        return self
+
+    def search(self, term: str, field: str = None) -> ODataQuery:
+        """
+        Sets `$search`. With a `field` the directory-object form `"field:term"` is used,
+        otherwise the term is searched as a phrase (e.g. across message contents).
+        """
+        term = term.replace('"', '\\"')
+        self._search = f'"{field}:{term}"' if field else f'"{term}"'
+        return self
+
+    def count(self, enabled: bool = True) -> ODataQuery:
+        self._count = enabled
+        return self
+
+    def eventual_consistency(self, enabled: bool = True) -> ODataQuery:
+        self._eventual = enabled
+        return self
+
+    @property
+    def selected(self) -> list:
+        return list(self._select)
+
+    @property
+    def filter_expression(self):
+        return None if self._filter is None else self._filter.text
+
+    @property
+    def requires_eventual_consistency(self) -> bool:
+        """
+        True if the query needs `ConsistencyLevel: eventual` when run against directory objects.
+        """
+        return self._eventual or self._uses_advanced_query()
+
+    def _uses_advanced_query(self) -> bool:
+        return (self._count or self._search is not None
+                or (self._filter is not None and self._filter.advanced))
+
+    def params(self, directory: bool = False) -> dict:
+        """
+        Renders the query options as request parameters (to be URL-encoded by the caller).
+
+        :param directory: True if the query targets directory objects, whose advanced
+            filters are only honoured together with `$count=true`.
+        :type directory: bool
+        :rtype: dict
+        """
+        params = {}
+        if self._select:
+            params['$select'] = ','.join(dict.fromkeys(self._select))
+        if self._filter is not None:
+            params['$filter'] = self._filter.text
+        if self._orderby:
+            params['$orderby'] = ','.join(self._orderby)
+        if self._top is not None:
+            params['$top'] = str(self._top)
+        if self._expand:
+            params['$expand'] = ','.join(self._expand)
+        if self._search is not None:
+            params['$search'] = self._search
+        if self._count or (directory and self._filter is not None and self._filter.advanced):
+            params['$count'] = 'true'
+        return params
+
+    def headers(self, directory: bool = False) -> dict:
+        """
+        Returns `ConsistencyLevel: eventual` if it was requested, or if the query targets
+        directory objects and uses an advanced capability.
+
+        :param directory: True if the query targets directory objects.
+        :type directory: bool
+        :rtype: dict
+        """
+        eventual = self._eventual or (directory and self._uses_advanced_query())
+        return {'ConsistencyLevel': 'eventual'} if eventual else {}
+
+    def request_kwargs(self, headers: dict = None, directory: bool = False) -> dict:
+        """
+        Returns the `params` and `headers` keyword arguments for `TokenAuthSession.request`.
+
+        :param headers: Additional headers to send.
+        :type headers: dict | None
+        :param directory: True if the query targets directory objects (users, groups),
+            enabling advanced query handling.
+        :type directory: bool
+        """
+        return {'params': self.params(directory),
+                'headers': {**(headers or {}), **self.headers(directory)}}
+
+    def apply_to(self, collection):
+        """
+        Applies the query to an office365 collection query, for calls still made through the
+        GraphClient. `$search` and `$count` are not supported there.
+        """
+        if self._filter is not None:
+            collection = collection.filter(self._filter.text)
+        if self._select:
+            collection = collection.select(list(dict.fromkeys(self._select)))
+        if self._expand:
+            collection = collection.expand(self._expand)
+        if self._orderby:
+            collection = collection.order_by(','.join(self._orderby))
+        if self._top is not None:
+            collection = collection.top(self._top)
+        return collection
+
+    def __str__(self):
+        return urlencode(self.params(), safe="$,'()/:")
@@ -1,18 +1,24 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.collection import UserCollection
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
-from dtMsalO365Wrapper.users.user import User
-from office365.runtime.paths.resource_path import ResourcePath
 import logging
 import datetime
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+    from dtMsalO365Wrapper.users.user import User
+
 class Subscriptions:
 
     def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession):
         self._graph_client = graph_client
         self._token_auth_session = token_auth_session
-        self._subscriptions = self._graph_client.subscriptions
+
+    @property
+    def _subscriptions(self):
+        return self._graph_client.subscriptions
 
     def add_subscription(self, resource: str, notification_url: str, change_type: str,
                          expiration_date_time: datetime.datetime):
@@ -1,13 +1,20 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.collection import UserCollection
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
-from dtMsalO365Wrapper.users.user import User
-from office365.runtime.paths.resource_path import ResourcePath
 from dtMsalO365Wrapper.teams.team import Team
+from dtMsalO365Wrapper.teams.member import Member
+from dtMsalO365Wrapper._batch import iter_batch, relative_url
+from dtMsalO365Wrapper.query import ODataQuery
+from dtMsalO365Wrapper._tracing import traced
 import logging
 import datetime
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+    from dtMsalO365Wrapper.users.user import User
+
 class Teams:
 
     def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession, power_automate):
@@ -15,14 +22,16 @@ class Teams:
         self._token_auth_session = token_auth_session
         self._power_automate = power_automate
 
+    @traced('Teams.get_joined_teams')
     def get_joined_teams(self, user: User = None):
         if user is None:
             t = self._graph_client.me.joined_teams.get().paged().execute_query()
         else:
-            t = user._user.joined_teams.get().paged().execute_query()
+            t = self._graph_client.users[user.id].joined_teams.get().paged().execute_query()
 
         return [Team(i, self._graph_client, self._token_auth_session, self._power_automate) for i in t]
 
+    @traced('Teams.get_all')
     def get_all(self):
         t = self._graph_client.teams.get_all().paged().execute_query()
         _l = []
@@ -31,6 +40,56 @@ class Teams:
                 _l.append(Team(team, self._graph_client, self._token_auth_session, self._power_automate))
         return _l
 
-    def get_by_query(self, query: str):
-        for t in self._graph_client.teams.filter(query).get().execute_query():
+    def memberships(self, teams, workers: int = 4):
+        """
+        Streams the members of many teams using batched sub-requests: the `members` of up to
+        20 teams are requested per batch, `workers` batches run concurrently, and the further
+        pages of large teams are fetched in subsequent batch rounds. Throttled sub-requests
+        are retried individually. Rows are yielded as their batch completes, so the order
+        is not guaranteed.
+
+        Teams whose members cannot be fetched do not stop the others; once all rows are
+        yielded, an error naming them is raised. A team whose later page failed may already
+        have yielded the rows of its earlier pages.
+
+        :param teams: The teams whose members to enumerate.
+        :type teams: Iterable[Team]
+        :param workers: The number of batches in flight at the same time.
+        :type workers: int
+        :raises Exception: After the last row, if the members of a team could not be fetched completely.
+        :return: A generator yielding `(team, member)` rows.
+        :rtype: Iterator[tuple[Team, Member]]
+        """
+        by_id = {t.id: t for t in teams}
+        pending = [{'id': team_id, 'method': 'GET', 'url': f'/teams/{team_id}/members'} for team_id in by_id]
+        failed = set()
+        while pending:
+            next_round = []
+            for team_id, resp in iter_batch(self._token_auth_session, pending, max_workers=workers):
+                if resp.get('status') != 200:
+                    logging.error(f"Failed to get members of Team {team_id}: {resp.get('status')} -> {resp.get('body')}")
+                    failed.add(team_id)
+                    continue
+                body = resp.get('body') or {}
+                for m in body.get('value', []):
+                    yield by_id[team_id], Member(m)
+                next_link = body.get('@odata.nextLink')
+                if next_link:
+                    next_round.append({'id': team_id, 'method': 'GET',
+                                       'url': relative_url(self._token_auth_session, next_link)})
+            pending = next_round
+        if failed:
+            logging.error(f'Failed to get the members of {len(failed)} teams: {sorted(failed)}')
+            raise Exception(f'Failed to get the members of {len(failed)} teams: {sorted(failed)}')
+
+    def get_by_query(self, query):
+        """
+        Yields the teams matching a query, given either as a raw `$filter` string or as an
+        `ODataQuery` whose filter, projection, ordering and top are pushed to the server.
+        """
+        if isinstance(query, ODataQuery):
+            teams = query.apply_to(self._graph_client.teams).get().execute_query()
+        else:
+            teams = self._graph_client.teams.filter(query).get().execute_query()
+        for t in teams:
             yield Team(t, self._graph_client, self._token_auth_session, self._power_automate)
\ No newline at end of file
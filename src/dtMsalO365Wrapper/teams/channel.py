@@ -1,12 +1,15 @@
-from office365.graph_client import GraphClient
-from office365.teams.team import Team as O365Team
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
-from dtMsalO365Wrapper.users.user import User
-from office365.runtime.paths.resource_path import ResourcePath
+from dtMsalO365Wrapper.teams.member import Member
 import logging
 import datetime
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+
 class Channel:
 
     def __init__(self, channel_detail, team, graph_client: GraphClient, token_auth_session: TokenAuthSession, power_automate):
@@ -48,5 +51,16 @@ class Channel:
     def is_archived(self):
         return self._channel_detail.get('isArchived')
 
+    def iter_members(self):
+        """
+        Iterates over the members of the channel. For standard channels these are the members
+        of the team; private and shared channels have their own membership.
+
+        :return: A generator yielding the members of the channel.
+        :rtype: Iterator[Member]
+        """
+        for m in self._token_auth_session.get_paged(f'/teams/{self._team.id}/channels/{self.id}/members'):
+            yield Member(m)
+
     def send_message(self, power_automate_teams_webhook_url: str, message: str):
         self._power_automate.send_teams_message(self._team, self, power_automate_teams_webhook_url, message)
\ No newline at end of file
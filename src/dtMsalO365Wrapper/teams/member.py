@@ -0,0 +1,49 @@
+import datetime
+
+
+class Member:
+    """
+    A member of a team or channel, as returned by the `members` collection of Graph.
+
+    :ivar _member_detail: The raw JSON of the conversation member.
+    :type _member_detail: dict
+    """
+    def __init__(self, member_detail: dict):
+        self._member_detail = member_detail
+
+    @property
+    def id(self):
+        return self._member_detail.get('id')
+
+    @property
+    def display_name(self):
+        return self._member_detail.get('displayName')
+
+    @property
+    def user_id(self):
+        return self._member_detail.get('userId')
+
+    @property
+    def email(self):
+        return self._member_detail.get('email')
+
+    @property
+    def tenant_id(self):
+        return self._member_detail.get('tenantId')
+
+    @property
+    def roles(self):
+        return self._member_detail.get('roles') or []
+
+    @property
+    def is_owner(self):
+        return 'owner' in self.roles
+
+    @property
+    def is_guest(self):
+        return 'guest' in self.roles
+
+    @property
+    def visible_history_start(self):
+        value = self._member_detail.get('visibleHistoryStartDateTime')
+        return datetime.datetime.fromisoformat(value) if value else None
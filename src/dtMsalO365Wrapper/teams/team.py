@@ -1,12 +1,18 @@
-from office365.graph_client import GraphClient
-from office365.teams.team import Team as O365Team
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
 from dtMsalO365Wrapper.teams.channel import Channel
-from office365.outlook.mail.item_body import ItemBody
+from dtMsalO365Wrapper.teams.member import Member
+from dtMsalO365Wrapper._tracing import traced
 import logging
 import datetime
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+    from office365.teams.team import Team as O365Team
+
 class Team:
 
     def __init__(self, team_detail: O365Team, graph_client: GraphClient, token_auth_session: TokenAuthSession, power_automate):
@@ -27,6 +33,7 @@ class Team:
     def id(self):
         return self._team_detail.id
 
+    @traced('Team.get_channels')
     def get_channels(self):
         resp = self._token_auth_session.request('GET', f'/teams/{self._team_detail.id}/allChannels')
         if resp.status_code != 200:
@@ -34,4 +41,25 @@ class Team:
 
         return [Channel(i, self, self._graph_client, self._token_auth_session, self._power_automate) for i in resp.json()['value']]
 
+    def iter_members(self):
+        """
+        Iterates over the members of the team, fetching further pages only as they are consumed.
+
+        :return: A generator yielding the members of the team.
+        :rtype: Iterator[Member]
+        """
+        for m in self._token_auth_session.get_paged(f'/teams/{self._team_detail.id}/members'):
+            yield Member(m)
+
+    def iter_owners(self):
+        """
+        Iterates over the owners of the team, i.e. the members holding the `owner` role.
+
+        :return: A generator yielding the owners of the team.
+        :rtype: Iterator[Member]
+        """
+        for m in self._token_auth_session.get_paged(f'/teams/{self._team_detail.id}/members',
+                                                    params={'$filter': "roles/any(r:r eq 'owner')"}):
+            yield Member(m)
+
 
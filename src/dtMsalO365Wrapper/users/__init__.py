@@ -1,13 +1,29 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.collection import UserCollection
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper.users.user import User
+from dtMsalO365Wrapper.users.user_record import UserRecord
+from dtMsalO365Wrapper.users.directory_replica import DirectoryReplica
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+from dtMsalO365Wrapper._tracing import traced, bind_context
+from dtMsalO365Wrapper.query import ODataQuery, Expr, F
+from concurrent.futures import ThreadPoolExecutor
 
 import logging
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+    from office365.directory.users.collection import UserCollection
+
 class Users:
 
+    ORM_BACKEND = 'orm'
+    RAW_BACKEND = 'raw'
+
+    # Graph accepts at most 15 values in a single `in (...)` filter expression.
+    IN_FILTER_LIMIT = 15
+
     DEFAULT_SELECT_FIELDS = ['id','userPrincipalName','accountEnabled','assignedLicenses','assignedPlans','businessPhones','city','companyName','country','createdDateTime','department','displayName','givenName','jobTitle','mail','officeLocation']
 
     """
@@ -24,16 +40,210 @@ class Users:
     :type _token_auth_session: TokenAuthSession
     :ivar _users: A UserCollection object providing direct access to user records in the graph client.
     :type _users: UserCollection
+    :ivar _backend: `ORM_BACKEND` to return office365-backed `User` objects, or `RAW_BACKEND` to
+        read `/users` as raw JSON through the token session into slotted `UserRecord` objects.
+    :type _backend: str
     """
-    def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession):
+    def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession, backend: str = ORM_BACKEND):
+        if backend not in (self.ORM_BACKEND, self.RAW_BACKEND):
+            raise ValueError(f'Unknown Users backend: {backend}')
         self._graph_client = graph_client
         self._token_auth_session = token_auth_session
-        self._users: UserCollection = self._graph_client.users
+        self._backend = backend
+
+    @property
+    def _users(self) -> UserCollection:
+        return self._graph_client.users
+
+    @property
+    def raw(self):
+        return self._backend == self.RAW_BACKEND
+
+    def _record(self, properties: dict) -> UserRecord:
+        return UserRecord(self._graph_client, self._token_auth_session, properties)
+
+    def _iter_records(self, params: dict):
+        for u in self._token_auth_session.get_paged("/users", params=params):
+            yield self._record(u)
+
+    def _query_in(self, field: str, values: list, select_fields: list, max_workers: int = 4):
+        """
+        Fetches the raw JSON of every user whose `field` matches one of `values`, splitting
+        the values into `in (...)` filters of at most `IN_FILTER_LIMIT` entries and running
+        the chunks concurrently.
+
+        :return: The raw user JSON of all chunks, in no particular order.
+        :rtype: list[dict]
+        """
+        chunks = [values[i:i + self.IN_FILTER_LIMIT] for i in range(0, len(values), self.IN_FILTER_LIMIT)]
 
+        def _fetch(chunk):
+            query = ODataQuery().select('id', select_fields).filter(F.in_(field, chunk))
+            return list(self._token_auth_session.get_paged("/users", **query.request_kwargs()))
+
+        results = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for chunk_result in executor.map(bind_context(_fetch), chunks):
+                results.extend(chunk_result)
+        return results
+
+    @traced('Users.hydrate')
+    def hydrate(self, users: list, fields: list = DEFAULT_SELECT_FIELDS, include_presence: bool = False,
+                max_workers: int = 4):
+        """
+        Fills many `User` or `UserRecord` objects in bulk instead of letting each one load itself
+        on first access. The users are fetched with `id in (...)` filters of up to 15 ids,
+        running `max_workers` chunks concurrently, and each user is marked as loaded so later
+        property accesses do not issue a request. With `include_presence`, presence is fetched
+        through `Communications.get_presence` in batches and kept on each user as well.
+
+        :param users: The users to hydrate.
+        :type users: list[User | UserRecord]
+        :param fields: The properties to fetch for every user. Defaults to `DEFAULT_SELECT_FIELDS`.
+        :type fields: list
+        :param include_presence: Also fetch and attach the presence of every user.
+        :type include_presence: bool
+        :param max_workers: The number of filter chunks requested concurrently.
+        :type max_workers: int
+        :return: The same users, hydrated in place.
+        :rtype: list
+        """
+        by_id = {}
+        for u in users:
+            by_id.setdefault(u.id, []).append(u)
+
+        for properties in self._query_in('id', list(by_id), fields, max_workers):
+            for u in by_id.get(properties.get('id'), []):
+                u._hydrate(properties)
+
+        if include_presence:
+            from dtMsalO365Wrapper.communications import Communications
+            for presence in Communications(self._graph_client, self._token_auth_session).get_presence(
+                    [_u[0] for _u in by_id.values()]):
+                presence.pop('user', None)
+                for u in by_id.get(presence.get('id'), []):
+                    u._hydrate_presence(presence)
+        return users
+
+    RESOLVE_FIELDS = {'id': 'id', 'upn': 'userPrincipalName', 'mail': 'mail'}
+
+    def _wrap(self, properties: dict):
+        if self.raw:
+            return self._record(properties)
+        u = User(self._graph_client, self._token_auth_session, self._graph_client.users[properties['id']])
+        u._hydrate(properties)
+        return u
+
+    @traced('Users.resolve')
+    def resolve(self, identifiers, by: str = 'id', select_fields: list = DEFAULT_SELECT_FIELDS,
+                max_workers: int = 4, cache: dict = None):
+        """
+        Resolves many user ids, user principal names or mail addresses to users in bulk.
+
+        The distinct identifiers are split into server-side `in (...)` filters of at most
+        `IN_FILTER_LIMIT` values which are requested concurrently. UPNs and mail addresses
+        are matched case-insensitively, and so are ids, since Graph may return a GUID in
+        another case than given. Identifiers without a matching user map to `None`.
+
+        When a `cache` mapping is supplied, results (including misses) are memoised in it
+        and identifiers already present are answered without a request. The same mapping
+        can be passed to later calls, or across `Users` instances, to make repeated
+        resolutions free.
+
+        :param identifiers: The identifiers to resolve, e.g. addresses taken from `Message.to_recipients`.
+        :type identifiers: Iterable[str]
+        :param by: The kind of identifier: `'id'`, `'upn'` or `'mail'`.
+        :type by: str
+        :param select_fields: The properties to fetch for every resolved user.
+        :type select_fields: list
+        :param max_workers: The number of filter chunks requested concurrently.
+        :type max_workers: int
+        :param cache: Optional mapping used to memoise resolutions, keyed by `(by, identifier)`
+            with the identifier in lower case.
+        :type cache: MutableMapping | None
+        :raises ValueError: If `by` is not one of the supported identifier kinds, or if an
+            identifier is empty or None.
+        :return: A mapping of every given identifier to its user, or `None` if not found.
+        :rtype: dict
+        """
+        if by not in self.RESOLVE_FIELDS:
+            raise ValueError(f'Cannot resolve users by: {by}')
+        field = self.RESOLVE_FIELDS[by]
+
+        def _normalise(identifier):
+            return identifier.lower()
+
+        identifiers = list(identifiers)
+        if not all(identifiers):
+            raise ValueError(f'Cannot resolve empty identifiers by {by}: '
+                             f'{sum(1 for i in identifiers if not i)} of {len(identifiers)} are empty or None')
+        resolved = {}
+        pending = []
+        for identifier in dict.fromkeys(_normalise(i) for i in identifiers):
+            if cache is not None and (by, identifier) in cache:
+                resolved[identifier] = cache[(by, identifier)]
+            else:
+                resolved[identifier] = None
+                pending.append(identifier)
+
+        if pending:
+            for properties in self._query_in(field, pending, select_fields, max_workers):
+                value = properties.get(field)
+                if value is not None and _normalise(value) in resolved:
+                    resolved[_normalise(value)] = self._wrap(properties)
+            if cache is not None:
+                for identifier in pending:
+                    cache[(by, identifier)] = resolved[identifier]
+            logging.info(f'Resolved {sum(resolved[i] is not None for i in pending)} of {len(pending)} users by {by}')
+
+        return {i: resolved[_normalise(i)] for i in identifiers}
+
+    def replica(self, path: str = ':memory:', select_fields: list = None, load: bool = True) -> DirectoryReplica:
+        """
+        Creates a local, indexed `DirectoryReplica` of the users in the tenant. A replica
+        persisted at `path` by an earlier run is brought up to date incrementally rather
+        than reloaded.
+
+        :param path: Path of the SQLite database backing the replica. Defaults to an in-memory store.
+        :type path: str
+        :param select_fields: The properties to replicate. Defaults to `DEFAULT_SELECT_FIELDS`.
+        :type select_fields: list | None
+        :param load: Populate or refresh the replica before returning it.
+        :type load: bool
+        :return: The directory replica.
+        :rtype: DirectoryReplica
+        """
+        replica = DirectoryReplica(self, path, select_fields)
+        if load:
+            replica.sync()
+        return replica
+
+    @traced('Users.get_by_id')
     def get_by_id(self, user_id):
+        if self.raw:
+            resp = self._token_auth_session.request("GET", f"/users/{user_id}")
+            if resp.status_code != 200:
+                logging.error(f'Failed to get User: {resp.content}')
+                raise Exception(f'Failed to get User: {resp.content}')
+            return self._record(resp.json())
         u = self._graph_client.users[user_id].get().execute_query()
         return User(self._graph_client, self._token_auth_session, u)
 
+    def query(self, query: ODataQuery):
+        """
+        Runs an `ODataQuery` against `/users`, pushing projection, filtering, ordering and
+        search to the server. Users are directory objects, so `$count=true` and
+        `ConsistencyLevel: eventual` are sent automatically when the query needs them. Results are read page by page as they are consumed.
+
+        :param query: The query to run.
+        :type query: ODataQuery
+        :return: A generator yielding `User` or `UserRecord` objects, depending on the backend.
+        :rtype: Iterator
+        """
+        for u in self._token_auth_session.get_paged("/users", **query.request_kwargs(directory=True)):
+            yield self._wrap(u)
+
+    @traced('Users.get')
     def get(self, query_filter, select_fields: list = DEFAULT_SELECT_FIELDS):
         """
         Retrieves a list of user objects based on the provided query filter and selected fields.
@@ -50,6 +260,9 @@ class Users:
         :return: A list of `User` objects matching the specified query conditions.
         :rtype: list
         """
+        if self.raw:
+            return list(self._iter_records({'$filter': query_filter, '$select': ','.join(select_fields),
+                                            '$top': 100}))
         _users = []
         for u in self._users.filter(query_filter).get_all(100).select(select_fields).execute_query():
             _users.append(User(self._graph_client, self._token_auth_session, u))
@@ -101,26 +314,28 @@ class Users:
         """
         return self.get("userType eq 'member'", select_fields)
 
+    @traced('Users.count')
     def count(self, count_filter: str = None):
         """
         Retrieves the count of users, optionally filtered by a provided condition. The
         filter is applied using an OData query syntax. The response uses eventual
         consistency level.
 
-        :param count_filter: The filter condition as a string in OData query syntax.
+        :param count_filter: The filter condition as a string in OData query syntax, an `F`
+            expression, or an `ODataQuery` whose filter and search are applied.
             If not provided, no filter is applied. Defaults to None.
         :return: The count of users as an integer if the request is successful.
             Returns 0 if an error occurs during the request.
         """
-        if count_filter:
-            count_filter = f"?$filter={count_filter}"
+        if isinstance(count_filter, ODataQuery):
+            query = count_filter
         else:
-            count_filter = ''
-        response = self._token_auth_session.request(
-            "GET",
-            f"/users/$count{count_filter}",
-            headers={"ConsistencyLevel": "eventual"}
-        )
+            query = ODataQuery()
+            if count_filter:
+                query.filter(count_filter if isinstance(count_filter, Expr) else Expr(count_filter))
+        request_kwargs = query.eventual_consistency().request_kwargs(directory=True)
+        request_kwargs['params'].pop('$count', None)  # implied by the /$count segment
+        response = self._token_auth_session.request("GET", "/users/$count", **request_kwargs)
 
         if response.status_code == 200:
             return response.json()
@@ -128,6 +343,7 @@ class Users:
             logging.error(f"Error retrieving count: {response.status_code} / {response.content}")
             return 0
 
+    @traced('Users.get_all')
     def get_all(self, select_fields: list = DEFAULT_SELECT_FIELDS):
         """
         Retrieves all User instances by querying the underlying data source.
@@ -140,11 +356,30 @@ class Users:
         :return: A generator that yields User instances based on the data source.
         :rtype: Iterator[User]
         """
+        if self.raw:
+            return list(self._iter_records({'$select': ','.join(select_fields), '$top': 100}))
         _users = []
         for u in self._users.get_all(100).select(select_fields).execute_query():
             _users.append( User(self._graph_client, self._token_auth_session, u))
         return _users
 
+    def iter_all(self, select_fields: list = DEFAULT_SELECT_FIELDS, page_size: int = 999):
+        """
+        Streams every user of the tenant, reading `/users` page by page as the caller consumes
+        them instead of collecting the whole directory first. Pairs with the export sinks and
+        `Communications.iter_presence` for bounded-memory exports.
+
+        :param select_fields: The properties to fetch for every user.
+        :type select_fields: list
+        :param page_size: The number of users per page (at most 999).
+        :type page_size: int
+        :return: A generator yielding `User` or `UserRecord` objects, depending on the backend.
+        :rtype: Iterator
+        """
+        query = ODataQuery().select('id', select_fields).top(page_size)
+        for u in self._token_auth_session.get_paged("/users", **query.request_kwargs(directory=True)):
+            yield self._wrap(u)
+
     def get_top(self, top):
         """
         Yields the top users from the query results of the internal users' collection.
@@ -161,5 +396,13 @@ class Users:
         :return: A generator yielding `User` objects representing the top users.
         :rtype: Iterator[User]
         """
+        if self.raw:
+            resp = self._token_auth_session.request("GET", "/users", params={'$top': top})
+            if resp.status_code != 200:
+                logging.error(f'Failed to get Users: {resp.content}')
+                raise Exception(f'Failed to get Users: {resp.content}')
+            for u in resp.json()['value']:
+                yield self._record(u)
+            return
         for u in self._users.get().top(top).execute_query():
-            yield User(self._graph_client, u)
+            yield User(self._graph_client, self._token_auth_session, u)
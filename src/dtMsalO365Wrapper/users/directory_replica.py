@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import json
+import logging
+
+from dtMsalO365Wrapper._delta_replica import DeltaReplica
+from dtMsalO365Wrapper.users.user_record import UserRecord
+
+
+class DirectoryReplica(DeltaReplica):
+    """
+    Local, indexed replica of the tenant's user directory backed by an embedded SQLite store.
+
+    The replica keeps `Users.DEFAULT_SELECT_FIELDS` (plus `userType`) of every user and
+    answers lookups by id, user principal name, mail, department and user type from
+    indexed columns, so repeated questions no longer cost a paged Graph round trip.
+    It is filled once from `/users/delta` and then kept fresh with `sync()`, which only
+    transfers the changes since the previously stored delta link.
+
+    :ivar _users: The `Users` subsystem whose token session is used to talk to Graph.
+    :type _users: Users
+    :ivar path: Path of the SQLite database, `:memory:` for a purely in-memory replica.
+    :type path: str
+    :ivar select_fields: The user properties kept in the replica.
+    :type select_fields: list
+    """
+
+    INDEXED_COLUMNS = {
+        'userPrincipalName': 'upn',
+        'mail': 'mail',
+        'department': 'department',
+        'userType': 'user_type',
+        'accountEnabled': 'account_enabled',
+    }
+    NAME = 'directory replica'
+
+    def __init__(self, users, path: str = ':memory:', select_fields: list = None):
+        super().__init__(users._token_auth_session, path)
+        self._users = users
+        self.select_fields = list(dict.fromkeys(
+            (select_fields if select_fields is not None else users.DEFAULT_SELECT_FIELDS) + ['userType']))
+        self._conn.execute('CREATE TABLE IF NOT EXISTS users ('
+                           'id TEXT PRIMARY KEY, upn TEXT, mail TEXT, department TEXT, user_type TEXT, '
+                           'account_enabled INTEGER, properties TEXT NOT NULL)')
+        for column in self.INDEXED_COLUMNS.values():
+            self._conn.execute(f'CREATE INDEX IF NOT EXISTS ix_users_{column} ON users ({column})')
+        self._conn.commit()
+
+    def _row(self, properties: dict):
+        enabled = properties.get('accountEnabled')
+        return (properties['id'],
+                (properties.get('userPrincipalName') or '').lower() or None,
+                (properties.get('mail') or '').lower() or None,
+                properties.get('department'),
+                (properties.get('userType') or '').lower() or None,
+                None if enabled is None else int(enabled),
+                json.dumps(properties))
+
+    def _apply(self, changes):
+        """
+        Applies a stream of delta items to the store. Removed users are deleted; updated users
+        are merged into their stored properties, since delta only returns what changed.
+        """
+        upserted = removed = 0
+        for item in changes:
+            user_id = item.get('id')
+            if user_id is None:
+                continue
+            if '@removed' in item:
+                self._conn.execute('DELETE FROM users WHERE id = ?', (user_id,))
+                removed += 1
+                continue
+            properties = {k: v for k, v in item.items() if not k.startswith('@')}
+            existing = self._conn.execute('SELECT properties FROM users WHERE id = ?', (user_id,)).fetchone()
+            if existing is not None:
+                properties = {**json.loads(existing[0]), **properties}
+            self._conn.execute('INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?, ?, ?, ?)', self._row(properties))
+            upserted += 1
+        return upserted, removed
+
+    def _clear(self):
+        self._conn.execute('DELETE FROM users')
+
+    def load(self):
+        """
+        Performs a full load of the directory, replacing everything currently stored, and
+        records the delta link used by subsequent `sync()` calls. The load runs in one
+        transaction, so a load failing partway leaves the previous contents in place.
+
+        :return: The number of users stored.
+        :rtype: int
+        """
+        pages = self._load('/users/delta', params={'$select': ','.join(self.select_fields)})
+        upserted = sum(u for u, _ in pages)
+        logging.info(f'Directory replica loaded with {upserted} users')
+        return upserted
+
+    def sync(self):
+        """
+        Brings the replica up to date by replaying the changes since the last load or sync.
+        Falls back to a full `load()` when no delta link is stored yet, or when Graph reports
+        that the stored delta link has expired.
+
+        :return: A tuple of the number of upserted and removed users.
+        :rtype: tuple[int, int]
+        """
+        pages = self._replay()
+        if pages is None:
+            return self.load(), 0
+        upserted, removed = sum(u for u, _ in pages), sum(r for _, r in pages)
+        logging.info(f'Directory replica synced: {upserted} upserted, {removed} removed')
+        return upserted, removed
+
+    def _records(self, where: str, params: tuple):
+        with self._lock:
+            rows = self._conn.execute(f'SELECT properties FROM users WHERE {where}', params).fetchall()
+        return [UserRecord(self._users._graph_client, self._users._token_auth_session, json.loads(r[0]))
+                for r in rows]
+
+    def _first(self, where: str, params: tuple):
+        records = self._records(where, params)
+        return records[0] if records else None
+
+    def get_by_id(self, user_id) -> UserRecord | None:
+        return self._first('id = ?', (user_id,))
+
+    def get_by_upn(self, upn: str) -> UserRecord | None:
+        return self._first('upn = ?', (upn.lower(),))
+
+    def get_by_mail(self, mail: str) -> UserRecord | None:
+        return self._first('mail = ?', (mail.lower(),))
+
+    def get_by_department(self, department: str) -> list:
+        return self._records('department = ?', (department,))
+
+    def get_by_user_type(self, user_type: str) -> list:
+        return self._records('user_type = ?', (user_type.lower(),))
+
+    def get_guest_accounts(self) -> list:
+        return self.get_by_user_type('guest')
+
+    def get_member_accounts(self) -> list:
+        return self.get_by_user_type('member')
+
+    def get_enabled_accounts(self) -> list:
+        return self._records('account_enabled = 1', ())
+
+    def count(self, department: str = None, user_type: str = None, account_enabled: bool = None) -> int:
+        """
+        Counts the replicated users, optionally narrowed by department, user type and
+        enabled state. Without arguments the result matches `Users.count()`.
+
+        :return: The number of matching users.
+        :rtype: int
+        """
+        clauses, params = [], []
+        if department is not None:
+            clauses.append('department = ?')
+            params.append(department)
+        if user_type is not None:
+            clauses.append('user_type = ?')
+            params.append(user_type.lower())
+        if account_enabled is not None:
+            clauses.append('account_enabled = ?')
+            params.append(int(account_enabled))
+        where = f' WHERE {" AND ".join(clauses)}' if clauses else ''
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM users{where}', params).fetchone()[0]
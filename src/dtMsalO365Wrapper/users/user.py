@@ -1,10 +1,15 @@
-from office365.graph_client import GraphClient
-from office365.directory.users.user import User as Office365User
-from office365.directory.users.user import Presence
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
 
 from dtMsalO365Wrapper.messages import Messages
 from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
 
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+    from office365.directory.users.user import User as Office365User
+    from office365.directory.users.user import Presence
+
 class User:
     """
     Represents a user in the context of a Microsoft Graph API.
@@ -21,12 +26,15 @@ class User:
     :type _user: Office365User
     :ivar _loaded: Boolean flag indicating whether user data has been fully loaded.
     :type _loaded: bool
+    :ivar _presence: Presence filled in by `Users.hydrate`, None when it must be fetched on access.
+    :type _presence: Presence | None
     """
     def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession, user: Office365User):
         self._graph_client = graph_client
         self._user: Office365User = user
         self._token_auth_session = token_auth_session
         self._loaded = False
+        self._presence = None
 
     def get_loaded_user(self):
         """
@@ -41,6 +49,19 @@ class User:
             self._loaded = True
         return self._user
 
+    def _hydrate(self, properties: dict):
+        for name, value in properties.items():
+            if not name.startswith('@'):
+                self._user.set_property(name, value, False)
+        self._loaded = True
+
+    def _hydrate_presence(self, presence: dict):
+        _p = self._user.presence
+        for name, value in presence.items():
+            if not name.startswith('@'):
+                _p.set_property(name, value, False)
+        self._presence = _p
+
     @property
     def presence(self) -> Presence:
         """
@@ -53,6 +74,8 @@ class User:
         :return: The user's presence status.
         :rtype: Presence
         """
+        if self._presence is not None:
+            return self._presence
         _p = self.get_loaded_user().presence
         self._graph_client.load(_p).execute_query()
         return _p
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from dtMsalO365Wrapper.messages import Messages
+from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+
+import logging
+
+if TYPE_CHECKING:
+    from office365.graph_client import GraphClient
+
+
+class UserRecord:
+    """
+    Lightweight, slotted representation of a user read as raw JSON from `/users`.
+
+    Exposes the same property surface as `User` but keeps only the JSON properties returned
+    by Graph instead of an office365 `User` entity, which makes construction and per-user
+    memory an order of magnitude cheaper when iterating over large directories. Properties
+    that were not selected when the record was fetched read as `None`.
+
+    :ivar _graph_client: GraphClient passed on to the subsystems reached through the record.
+    :type _graph_client: GraphClient
+    :ivar _token_auth_session: The TokenAuthSession used for follow-up requests.
+    :type _token_auth_session: TokenAuthSession
+    :ivar _properties: The raw JSON properties of the user.
+    :type _properties: dict
+    :ivar _presence: Presence of the user once fetched, None until then.
+    :type _presence: dict | None
+    """
+    __slots__ = ('_graph_client', '_token_auth_session', '_properties', '_presence')
+
+    def __init__(self, graph_client: GraphClient, token_auth_session: TokenAuthSession, properties: dict):
+        self._graph_client = graph_client
+        self._token_auth_session = token_auth_session
+        self._properties = properties
+        self._presence = None
+
+    def __repr__(self):
+        return f'UserRecord(id={self.id!r}, user_principal_name={self.user_principal_name!r})'
+
+    @property
+    def properties(self) -> dict:
+        return self._properties
+
+    def get(self, property_name, default=None):
+        return self._properties.get(property_name, default)
+
+    def _hydrate(self, properties: dict):
+        self._properties.update(properties)
+
+    def _hydrate_presence(self, presence: dict):
+        self._presence = presence
+
+    @property
+    def presence(self) -> dict:
+        """
+        Retrieves the user's presence as returned by `/users/{id}/presence`. The result is
+        kept on the record, so repeated accesses do not issue further requests.
+
+        :return: The presence JSON, including `availability` and `activity`.
+        :rtype: dict
+        """
+        if self._presence is None:
+            resp = self._token_auth_session.request("GET", f"/users/{self.id}/presence")
+            if resp.status_code != 200:
+                logging.error(f'Failed to get Presence: {resp.content}')
+                raise Exception(f'Failed to get Presence: {resp.content}')
+            self._presence = resp.json()
+        return self._presence
+
+    @property
+    def id(self):
+        return self._properties.get('id')
+
+    @property
+    def user_principal_name(self):
+        return self._properties.get('userPrincipalName')
+
+    @property
+    def display_name(self):
+        return self._properties.get('displayName')
+
+    @property
+    def given_name(self):
+        return self._properties.get('givenName')
+
+    @property
+    def job_title(self):
+        return self._properties.get('jobTitle')
+
+    @property
+    def mail(self):
+        return self._properties.get('mail')
+
+    @property
+    def mobile_phone(self):
+        return self._properties.get('mobilePhone')
+
+    @property
+    def office_location(self):
+        return self._properties.get('officeLocation')
+
+    @property
+    def surname(self):
+        return self._properties.get('surname')
+
+    @property
+    def preferred_language(self):
+        return self._properties.get('preferredLanguage')
+
+    def set_property(self, property_name, value):
+        """
+        Updates a single property of the user on the server and on this record.
+
+        :param property_name: The Graph name of the property to set, e.g. `jobTitle`.
+        :type property_name: str
+        :param value: The value to be associated with the property.
+        :type value: Any
+        :return: None
+        """
+        resp = self._token_auth_session.request("PATCH", f"/users/{self.id}", json={property_name: value})
+        if resp.status_code != 204:
+            logging.error(f'Failed to update User: {resp.content}')
+            raise Exception(f'Failed to update User: {resp.content}')
+        self._properties[property_name] = value
+
+    def get_message(self, message_id):
+        return Messages(self._graph_client, self._token_auth_session).get_message(self, message_id)
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from dtMsalO365Wrapper import MsalO365Client
+
+GRAPH = 'https://graph.microsoft.com/v1.0'
+
+
+class FakeGraph:
+    """
+    Answers the requests of every `requests.Session` from a table of routes instead of the network.
+
+    Routes are keyed by method and URL without query string; a route is either a
+    `(status, body, headers)` tuple or a callable `(method, url, kwargs)` returning one.
+    Unrouted requests are answered with 404.
+    """
+    def __init__(self):
+        self.routes = {}
+        self.calls = []
+
+    def route(self, method, url, handler):
+        self.routes[(method, url if url.startswith('https://') else f'{GRAPH}{url}')] = handler
+
+    def calls_to(self, method, url):
+        url = url if url.startswith('https://') else f'{GRAPH}{url}'
+        return [c for c in self.calls if c[0] == method and c[1].split('?')[0] == url]
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        handler = self.routes.get((method, url.split('?')[0]))
+        if handler is None:
+            status, body, headers = 404, {'error': {'code': 'NotFound'}}, {}
+        elif callable(handler):
+            status, body, headers = handler(method, url, kwargs)
+        else:
+            status, body, headers = handler
+        response = requests.Response()
+        response.url = url
+        response.status_code = status
+        response._content = json.dumps(body).encode('utf-8') if body is not None else b''
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json', **headers})
+        return response
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    fake = FakeGraph()
+    monkeypatch.setattr(requests.Session, 'request', lambda session, *args, **kwargs: fake.request(*args, **kwargs))
+    return fake
+
+
+@pytest.fixture
+def client(graph):
+    c = MsalO365Client('tenant', 'client', 'secret')
+    c.token_auth_session.token_func = lambda scope: {'access_token': 'token'}
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """
+    Records the waits of retry loops instead of sleeping.
+    """
+    slept = []
+    monkeypatch.setattr('time.sleep', slept.append)
+    return slept
@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from dtMsalO365Wrapper import DeadlineExceeded
+from dtMsalO365Wrapper._batch import execute_batch, MISSING_RESPONSE
+
+
+def _batch_route(graph, answer):
+    """
+    Routes `/$batch` to `answer(round, sub_request)`, returning `(status, headers)` per sub-request.
+    """
+    rounds = []
+
+    def handler(method, url, kwargs):
+        subs = kwargs['json']['requests']
+        rounds.append(subs)
+        responses = []
+        for sub in subs:
+            status, headers = answer(len(rounds), sub)
+            responses.append({'id': sub['id'], 'status': status, 'headers': headers, 'body': {'id': sub['id']}})
+        return 200, {'responses': responses}, {}
+
+    graph.route('POST', '/$batch', handler)
+    return rounds
+
+
+def _requests(*ids):
+    return [{'id': i, 'method': 'GET', 'url': f'/users/{i}'} for i in ids]
+
+
+def test_throttled_sub_requests_are_resent_after_retry_after(client, graph, no_sleep):
+    rounds = _batch_route(graph, lambda n, sub: (429, {'Retry-After': '3'}) if n == 1 and sub['id'] == 'b'
+                          else (200, {}))
+
+    results = execute_batch(client.token_auth_session, _requests('a', 'b', 'c'))
+    assert {i: r['status'] for i, r in results.items()} == {'a': 200, 'b': 200, 'c': 200}
+    assert [[s['id'] for s in subs] for subs in rounds] == [['a', 'b', 'c'], ['b']]
+    assert no_sleep == [3]
+
+
+def test_throttled_sub_request_is_returned_after_max_retries(client, graph, no_sleep):
+    _batch_route(graph, lambda n, sub: (503, {}))
+
+    results = execute_batch(client.token_auth_session, _requests('a'), max_retries=2)
+    assert results['a']['status'] == 503
+    assert len(no_sleep) == 2
+
+
+def test_items_skipped_behind_a_failed_item_are_resent_without_waiting(client, graph, no_sleep):
+    def answer(n, sub):
+        if sub['id'] == 'a':
+            return 404, {}
+        # In the first round `b` waits for `a` and `c` for `b`.
+        if n == 1:
+            return 424, {}
+        return 200, {}
+
+    rounds = _batch_route(graph, answer)
+
+    results = execute_batch(client.token_auth_session, _requests('a', 'b', 'c'), chains=1)
+    assert {i: r['status'] for i, r in results.items()} == {'a': 404, 'b': 200, 'c': 200}
+    assert [[s['id'] for s in subs] for subs in rounds] == [['a', 'b', 'c'], ['b', 'c']]
+    assert no_sleep == []
+
+
+def test_items_skipped_behind_a_throttled_item_are_retried_with_it(client, graph, no_sleep):
+    def answer(n, sub):
+        if n == 1 and sub['id'] == 'a':
+            return 429, {'Retry-After': '1'}
+        if n == 1:
+            return 424, {}
+        return 200, {}
+
+    rounds = _batch_route(graph, answer)
+
+    results = execute_batch(client.token_auth_session, _requests('a', 'b'), chains=1)
+    assert {i: r['status'] for i, r in results.items()} == {'a': 200, 'b': 200}
+    assert len(rounds) == 2
+    assert no_sleep == [1]
+
+
+def test_throttling_past_the_deadline_raises(client, graph, no_sleep):
+    _batch_route(graph, lambda n, sub: (429, {'Retry-After': '30'}))
+
+    with pytest.raises(DeadlineExceeded):
+        with client.deadline(1.0):
+            execute_batch(client.token_auth_session, _requests('a', 'b'))
+    assert no_sleep == []
+
+
+def test_sub_requests_missing_from_the_response_are_reported_as_failed(client, graph, no_sleep):
+    def handler(method, url, kwargs):
+        return 200, {'responses': [{'id': 'a', 'status': 200, 'body': {}}]}, {}
+
+    graph.route('POST', '/$batch', handler)
+
+    results = execute_batch(client.token_auth_session, _requests('a', 'b'))
+    assert results['a']['status'] == 200
+    assert results['b']['status'] == MISSING_RESPONSE
+
+
+def test_bulk_updates_share_the_mailbox_concurrency_between_batches(client, graph, no_sleep):
+    rounds = _batch_route(graph, lambda n, sub: (200, {}))
+    user = SimpleNamespace(id='u1')
+
+    outcomes = client.messages().update_many(user, [f'm{i}' for i in range(40)], {'isRead': True}, workers=2)
+    assert all(o.ok for o in outcomes.values())
+    for subs in rounds:
+        # Two batches in flight at once, each chained into two sequences.
+        assert sum(1 for s in subs if 'dependsOn' not in s) == 2
+
+
+def test_bulk_outcomes_include_missing_sub_responses(client, graph, no_sleep):
+    graph.route('POST', '/$batch', lambda m, u, kw: (200, {'responses': []}, {}))
+
+    outcomes = client.messages().update_many(SimpleNamespace(id='u1'), ['m1'], {'isRead': True})
+    assert outcomes['m1'].status == MISSING_RESPONSE
+    assert not outcomes['m1'].ok
@@ -0,0 +1,132 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+
+from dtMsalO365Wrapper import ResponseCache, CircuitOpenError, CircuitBreakerRegistry
+from dtMsalO365Wrapper._circuit_breaker import CircuitBreaker
+from dtMsalO365Wrapper._deadline import DeadlineRetry
+from dtMsalO365Wrapper._token_auth_session import TokenAuthSession
+
+USER_A = f'/users/{"a" * 8}-0000-0000-0000-{"0" * 12}'
+USER_B = f'/users/{"b" * 8}-0000-0000-0000-{"0" * 12}'
+
+
+def test_breaker_opens_at_the_failure_threshold():
+    breaker = CircuitBreaker('/users/{id}', failure_threshold=0.5, min_requests=4)
+    for ok in (True, False, True):
+        breaker.record(ok)
+    assert breaker.allow()
+
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker('/users/{id}', min_requests=1, open_duration=0)
+    breaker.record(False)
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_opens_the_circuit_again():
+    breaker = CircuitBreaker('/users/{id}', min_requests=1, open_duration=0)
+    breaker.record(False)
+    assert breaker.allow()
+
+    breaker.open_duration = 60
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def _fail(graph, path, status=500):
+    graph.route('GET', path, (status, {'error': {'code': 'InternalServerError'}}, {}))
+
+
+def test_open_circuit_fails_fast(client, graph):
+    client.enable_circuit_breakers(min_requests=2, open_duration=60)
+    _fail(graph, USER_A)
+    session = client.token_auth_session
+
+    session.request('GET', USER_A)
+    session.request('GET', USER_A)
+    with pytest.raises(CircuitOpenError):
+        session.request('GET', USER_B)
+    assert len(graph.calls) == 2
+
+
+def test_throttled_probe_releases_its_slot(client, graph, no_sleep):
+    client.enable_circuit_breakers(min_requests=2, open_duration=0)
+    _fail(graph, USER_A)
+    session = client.token_auth_session
+    session.request('GET', USER_A)
+    session.request('GET', USER_A)
+    answers = iter([(429, {}, {'Retry-After': '0'}), (200, {'id': 'a'}, {})])
+    graph.route('GET', USER_A, lambda m, u, kw: next(answers))
+
+    assert session.request('GET', USER_A).status_code == 200
+    assert client.circuit_states()['/users/{id}']['state'] == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_serves_stale_cache_entries(client, graph):
+    session = client.token_auth_session
+    session.response_cache = ResponseCache(policies=[], default_ttl=0)
+    client.enable_circuit_breakers(min_requests=2, open_duration=60)
+    graph.route('GET', USER_A, (200, {'id': 'a'}, {'ETag': '"1"'}))
+    session.request('GET', USER_A)
+    _fail(graph, USER_A)
+    session.request('GET', USER_A)
+    assert client.circuit_states()['/users/{id}']['state'] == CircuitBreaker.OPEN
+
+    resp = session.request('GET', USER_A)
+    assert resp.status_code == 200
+    assert resp.json() == {'id': 'a'}
+    assert len(graph.calls) == 2
+
+
+@pytest.fixture
+def unavailable_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_retried_failures_are_recorded_once(unavailable_server, monkeypatch):
+    retries = DeadlineRetry(total=2, backoff_factor=0, status_forcelist=[503], allowed_methods={'GET'})
+    adapter = HTTPAdapter(max_retries=retries)
+    session = TokenAuthSession(lambda scope: {'access_token': 'token'}, 'scope', root_url=unavailable_server,
+                               http_adapter=adapter)
+    transport = session._transport
+
+    def _transport():
+        t = transport()
+        t.mount('http://', adapter)
+        return t
+
+    monkeypatch.setattr(session, '_transport', _transport)
+    registry = session.circuit_breakers = CircuitBreakerRegistry(min_requests=100)
+
+    with pytest.raises(requests.exceptions.RetryError):
+        session.request('GET', USER_A)
+    # One failure per attempt: the first send and its two retries.
+    assert registry.states()['/users/{id}']['failures'] == 3
+    session.close()
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from dtMsalO365Wrapper import MsalO365Client, ResponseCache, MemoryCacheBackend, SQLiteCacheBackend
+from dtMsalO365Wrapper.cache.backend import CacheEntry
+
+from conftest import GRAPH
+
+
+@pytest.fixture
+def cache():
+    return ResponseCache(default_ttl=300)
+
+
+@pytest.fixture
+def cached_client(graph, cache):
+    c = MsalO365Client('tenant', 'client', 'secret', response_cache=cache)
+    c.token_auth_session.token_func = lambda scope: {'access_token': 'token'}
+    yield c
+    c.close()
+
+
+def test_fresh_response_is_served_without_a_request(graph, cache, cached_client):
+    graph.route('GET', '/users/a', (200, {'id': 'a'}, {'ETag': '"1"'}))
+    session = cached_client.token_auth_session
+
+    assert session.request('GET', '/users/a').json() == {'id': 'a'}
+    assert session.request('GET', '/users/a').json() == {'id': 'a'}
+    assert len(graph.calls) == 1
+    assert (cache.hits, cache.revalidations, cache.misses) == (1, 0, 1)
+
+
+def test_expired_response_is_revalidated_with_its_etag(graph, cached_client):
+    cache = ResponseCache(policies=[], default_ttl=0)
+    session = cached_client.token_auth_session
+    session.response_cache = cache
+    graph.route('GET', '/users/a', lambda m, u, kw: (304, None, {}) if kw['headers'].get('If-None-Match') == '"1"'
+                else (200, {'id': 'a'}, {'ETag': '"1"'}))
+
+    session.request('GET', '/users/a')
+    resp = session.request('GET', '/users/a')
+    assert resp.status_code == 200
+    assert resp.json() == {'id': 'a'}
+    assert (cache.hits, cache.revalidations, cache.misses) == (0, 1, 1)
+
+
+def test_write_invalidates_the_resource_its_children_and_the_parent_listing(graph, cache, cached_client):
+    session = cached_client.token_auth_session
+    for path in ('/users', '/users/a', '/users/a/messages', '/users/ab'):
+        graph.route('GET', path, (200, {'path': path}, {}))
+        session.request('GET', path)
+    graph.route('PATCH', '/users/a', (204, None, {}))
+
+    session.request('PATCH', '/users/a', json={'department': 'X'})
+    assert [e.url for e in cache.backend._entries.values()] == [f'{GRAPH}/users/ab']
+
+
+@pytest.mark.parametrize('path', ['/users/$count', '/users/delta', '/users/delta()', '/teams/$count',
+                                  '/teams/t/channels/delta', '/users/u/mailFolders/delta'])
+def test_default_policies_never_cache_count_or_delta(cache, path):
+    assert cache.ttl_for(path) is None
+    assert cache.ttl_for('/users/u') == 300
+
+
+def test_user_count_and_directory_replica_bypass_the_cache(graph, cached_client):
+    counts = iter([3, 2])
+    graph.route('GET', '/users/$count', lambda m, u, kw: (200, next(counts), {}))
+    users = iter([[{'id': 'a'}, {'id': 'b'}], [{'id': 'a'}]])
+    graph.route('GET', '/users/delta', lambda m, u, kw: (200, {'value': next(users),
+                                                              '@odata.deltaLink': f'{GRAPH}/users/delta?token=1'}, {}))
+    users_api = cached_client.users()
+
+    assert (users_api.count(), users_api.count()) == (3, 2)
+    replica = users_api.replica()
+    replica.load()
+    assert len(graph.calls_to('GET', '/users/delta')) == 2
+    assert replica.get_by_id('b') is None
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryCacheBackend()
+        return
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.db'))
+    yield backend
+    backend.close()
+
+
+def _fill(backend, *urls):
+    for url in urls:
+        backend.set(url, CacheEntry(url, 'tenant', 'scope', 200, {}, b'{}', None, time.time() + 60))
+
+
+def test_invalidate_prefix_matches_whole_path_segments(backend):
+    _fill(backend, f'{GRAPH}/users/abc', f'{GRAPH}/users/abc/messages', f'{GRAPH}/users/abc?$select=id',
+          f'{GRAPH}/users/abcdef', f'{GRAPH}/users')
+
+    assert backend.invalidate(tenant_id='tenant', url_prefix=f'{GRAPH}/users/abc') == 3
+    assert len(backend) == 2
+
+
+def test_invalidate_url_matches_only_that_url(backend):
+    _fill(backend, f'{GRAPH}/users', f'{GRAPH}/users?$top=5', f'{GRAPH}/users/abc')
+
+    assert backend.invalidate(url=f'{GRAPH}/users') == 2
+    assert len(backend) == 1
+
+
+def test_invalidate_is_limited_to_the_tenant(backend):
+    _fill(backend, f'{GRAPH}/users/abc')
+
+    assert backend.invalidate(tenant_id='other', url_prefix=f'{GRAPH}/users') == 0
+    assert len(backend) == 1
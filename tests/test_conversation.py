@@ -0,0 +1,90 @@
+import base64
+import datetime
+import uuid
+from types import SimpleNamespace
+
+from dtMsalO365Wrapper.messages.conversation import Conversation, decode_conversation_index
+from dtMsalO365Wrapper.messages.conversation_index import ConversationIndex
+
+GUID = uuid.UUID('12345678-1234-5678-1234-567812345678')
+STARTED = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+EPOCH = datetime.datetime(1601, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _header(started=STARTED, guid=GUID):
+    filetime = (started - EPOCH) // datetime.timedelta(microseconds=1) * 10
+    return (filetime >> 16).to_bytes(6, 'big') + guid.bytes
+
+
+def _block(seconds, coarse=False):
+    ticks = int(seconds * 10_000_000)
+    if coarse:
+        return (0x80000000 | (ticks >> 23)).to_bytes(4, 'big') + b'\x00'
+    return (ticks >> 18).to_bytes(4, 'big') + b'\x00'
+
+
+def _index(*blocks):
+    return base64.b64encode(_header() + b''.join(blocks)).decode()
+
+
+def _message(message_id, index, conversation_id='c1'):
+    return SimpleNamespace(id=message_id, conversation_index=index, conversation_id=conversation_id,
+                           sent=None, received=None)
+
+
+def test_decode_reads_the_start_guid_and_reply_times():
+    started, guid, replies = decode_conversation_index(_index(_block(60), _block(3600, coarse=True)))
+
+    assert guid == GUID
+    assert abs(started - STARTED) < datetime.timedelta(milliseconds=10)
+    assert len(replies) == 2
+    assert abs(replies[0] - started - datetime.timedelta(seconds=60)) < datetime.timedelta(seconds=1)
+    assert abs(replies[1] - replies[0] - datetime.timedelta(hours=1)) < datetime.timedelta(seconds=1)
+    assert decode_conversation_index(_header() + _block(1))[2] == decode_conversation_index(_index(_block(1)))[2]
+
+
+def test_decode_rejects_malformed_indexes():
+    assert decode_conversation_index(None) is None
+    assert decode_conversation_index('not base64!') is None
+    assert decode_conversation_index(_header()[:21]) is None
+    assert decode_conversation_index(_header() + b'\x00\x00') is None
+
+
+def test_replies_attach_to_the_nearest_present_ancestor():
+    root = _message('root', _index())
+    reply = _message('reply', _index(_block(60)))
+    # The message at the second level is missing, so its reply is attached to `reply`.
+    orphan = _message('orphan', _index(_block(60), _block(60), _block(60)))
+    stray = _message('stray', None)
+
+    conversation = Conversation('c1', [orphan, stray, reply, root])
+    assert [m.id for m in conversation.messages] == ['root', 'reply', 'orphan', 'stray']
+    assert [(depth, m.id) for depth, m in conversation.walk()] == \
+           [(0, 'root'), (1, 'reply'), (2, 'orphan'), (0, 'stray')]
+
+
+def test_index_rebuilds_only_changed_conversations():
+    index = ConversationIndex()
+    assert index.add_many([_message('root', _index()), _message('other', _index(), 'c2')]) == {'c1', 'c2'}
+    first, other = index.conversation('c1'), index.conversation('c2')
+    assert index.conversation('c1') is first
+
+    index.add(_message('reply', _index(_block(60))))
+    rebuilt = index.conversation('c1')
+    assert rebuilt is not first
+    assert [(d, m.id) for d, m in rebuilt.walk()] == [(0, 'root'), (1, 'reply')]
+    assert index.conversation('c2') is other
+
+    assert index.remove('reply') == 'c1'
+    assert len(index.conversation('c1')) == 1
+    assert index.remove('other') == 'c2'
+    assert 'c2' not in index and index.conversation('c2') is None
+
+
+def test_a_message_moved_to_another_conversation_leaves_the_first():
+    index = ConversationIndex()
+    index.add(_message('m1', _index()))
+    index.add(_message('m1', _index(), 'c2'))
+
+    assert index.conversation_ids == ['c2']
+    assert len(index) == 1
@@ -0,0 +1,59 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from dtMsalO365Wrapper import MailboxCrawler
+from dtMsalO365Wrapper.crawler.checkpoint import MailboxCheckpoint
+
+MAILBOXES = [f'u{i}' for i in range(9)]
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    c = MailboxCheckpoint(str(tmp_path / 'crawl.db'))
+    yield c
+    c.close()
+
+
+def _recording_task(fail=()):
+    crawled = []
+    lock = threading.Lock()
+
+    def task(client, user):
+        mailbox_id = getattr(user, 'id', user)
+        with lock:
+            crawled.append(mailbox_id)
+        if mailbox_id in fail:
+            raise RuntimeError(f'{mailbox_id} is unavailable')
+
+    return task, crawled
+
+
+def test_restarted_crawl_skips_finished_mailboxes(client, checkpoint):
+    task, crawled = _recording_task(fail={'u1'})
+    summary = MailboxCrawler(client, task, max_mailboxes=2, checkpoint=checkpoint).run(MAILBOXES)
+    assert summary == {'completed': 8, 'skipped': 0, 'failed': {'u1': 'u1 is unavailable'}}
+    assert checkpoint.failed() == {'u1': 'u1 is unavailable'}
+
+    task, crawled = _recording_task()
+    summary = MailboxCrawler(client, task, checkpoint=checkpoint).run(SimpleNamespace(id=m) for m in MAILBOXES)
+    assert crawled == ['u1']
+    assert summary == {'completed': 1, 'skipped': 8, 'failed': {}}
+    assert checkpoint.done_ids() == set(MAILBOXES)
+
+
+def test_shards_are_stable_and_cover_every_mailbox_once():
+    shards = [[m for m in MAILBOXES if MailboxCrawler.in_shard(m, i, 3)] for i in range(3)]
+
+    # Pinned, so that processes of different versions or hosts keep agreeing on the split.
+    assert shards == [['u2', 'u6'], ['u7'], ['u0', 'u1', 'u3', 'u4', 'u5', 'u8']]
+    assert MailboxCrawler.in_shard('U7', 1, 3)
+
+
+def test_crawl_only_runs_the_mailboxes_of_its_shard(client):
+    task, crawled = _recording_task()
+
+    summary = MailboxCrawler(client, task).run(MAILBOXES, shard_index=0, shard_count=3)
+    assert sorted(crawled) == ['u2', 'u6']
+    assert summary['completed'] == 2
@@ -0,0 +1,82 @@
+import gzip
+import json
+import sys
+
+import pytest
+
+from dtMsalO365Wrapper import export_rows, NDJSONSink, ParquetSink, ArrowSink
+from dtMsalO365Wrapper.users.user_record import UserRecord
+
+ROWS = [{'id': f'u{i}', 'mail': f'u{i}@contoso.com', 'sender': {'emailAddress': {'address': f's{i}@contoso.com'}},
+         'assignedLicenses': [{'skuId': 'e5'}] if i % 2 else []} for i in range(5)]
+
+
+def _read_ndjson(path, opener=open):
+    with opener(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_ndjson_export_writes_every_row_across_batches(tmp_path):
+    path = str(tmp_path / 'users.ndjson')
+
+    assert export_rows(iter(ROWS), NDJSONSink(path), batch_size=2) == 5
+    assert _read_ndjson(path) == ROWS
+
+
+def test_ndjson_export_projects_dotted_fields_of_wrapped_rows(tmp_path):
+    path = str(tmp_path / 'users.ndjson.gz')
+    rows = [UserRecord(None, None, row) for row in ROWS]
+
+    export_rows(rows, NDJSONSink(path, ['id', 'sender.emailAddress.address', 'missing.field']))
+    # A path ending in .gz is compressed without asking for it.
+    assert _read_ndjson(path, gzip.open)[1] == {'id': 'u1', 'sender.emailAddress.address': 's1@contoso.com',
+                                                'missing.field': None}
+
+
+def test_writer_failures_are_raised_to_the_caller(tmp_path):
+    with pytest.raises(TypeError):
+        export_rows([ROWS[0], object()], NDJSONSink(str(tmp_path / 'x.ndjson')), batch_size=1)
+
+
+def test_unknown_ndjson_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        NDJSONSink(str(tmp_path / 'x.ndjson'), compression='bz2')
+
+
+def test_columnar_sinks_explain_a_missing_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+
+    with pytest.raises(ImportError, match='pip install pyarrow'):
+        export_rows(ROWS, ParquetSink(str(tmp_path / 'users.parquet'), ['id']))
+
+
+def test_parquet_export_writes_a_row_group_per_batch(tmp_path):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    path = str(tmp_path / 'users.parquet')
+
+    export_rows(ROWS, ParquetSink(path, ['id', 'sender.emailAddress.address', 'assignedLicenses']), batch_size=2)
+    parquet = pq.ParquetFile(path)
+    assert parquet.metadata.num_row_groups == 3
+    table = parquet.read()
+    assert table.column('id').to_pylist() == [r['id'] for r in ROWS]
+    assert table.column('sender.emailAddress.address').to_pylist()[0] == 's0@contoso.com'
+    # Nested values are stored as JSON strings.
+    assert json.loads(table.column('assignedLicenses').to_pylist()[1]) == [{'skuId': 'e5'}]
+
+
+def test_arrow_export_infers_empty_columns_as_strings(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'users.arrow')
+    rows = [{'id': 'a'}, {'id': 'b', 'department': 'Sales'}]
+
+    export_rows(rows, ArrowSink(path, ['id', 'department'], compression=None), batch_size=1)
+    with pa.ipc.open_file(path) as reader:
+        table = reader.read_all()
+    assert table.schema.field('department').type == pa.string()
+    assert table.column('department').to_pylist() == [None, 'Sales']
+
+
+def test_columnar_export_requires_fields(tmp_path):
+    with pytest.raises(ValueError):
+        ParquetSink(str(tmp_path / 'users.parquet'), [])
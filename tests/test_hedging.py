@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from dtMsalO365Wrapper import HedgePolicy, DeadlineExceeded
+
+
+def test_deadline_bounds_the_transport_timeout(client, graph):
+    graph.route('GET', '/users/a', (200, {}, {}))
+
+    with client.deadline(1.0):
+        client.token_auth_session.request('GET', '/users/a', timeout=30)
+    assert 0 < graph.calls[0][2]['timeout'] <= 1.0
+
+
+def test_deadline_carries_over_to_submitted_work(client, graph):
+    graph.route('GET', '/users/a', (200, {}, {}))
+
+    with client.deadline(1.0):
+        client.submit(client.token_auth_session.request, 'GET', '/users/a').result(5)
+    assert 0 < graph.calls[0][2]['timeout'] <= 1.0
+
+
+def test_rate_limit_past_the_deadline_raises_without_waiting(client, graph, no_sleep):
+    graph.route('GET', '/users/a', (429, {}, {'Retry-After': '30'}))
+
+    with pytest.raises(DeadlineExceeded):
+        with client.deadline(1.0):
+            client.token_auth_session.request('GET', '/users/a')
+    assert no_sleep == []
+    assert len(graph.calls) == 1
+
+
+def test_expired_deadline_sends_nothing(client, graph):
+    with pytest.raises(DeadlineExceeded):
+        with client.deadline(0):
+            client.token_auth_session.request('GET', '/users/a')
+    assert graph.calls == []
+
+
+def test_slow_request_is_hedged_and_the_faster_answer_wins(client, graph):
+    policy = client.enable_hedging(HedgePolicy(min_samples=1, min_delay=0.01, max_delay=0.01))
+    policy.record('/users/a', 0.01)
+    hedge_arrived = threading.Event()
+
+    def handler(method, url, kwargs):
+        # Tell the attempts apart by their pool: the hedge may reach the server first.
+        if threading.current_thread().name.startswith('TokenAuthSession-primary'):
+            hedge_arrived.wait(5)
+            return 200, {'attempt': 'primary'}, {}
+        hedge_arrived.set()
+        return 200, {'attempt': 'hedge'}, {}
+
+    graph.route('GET', '/users/a', handler)
+
+    assert client.token_auth_session.request('GET', '/users/a').json() == {'attempt': 'hedge'}
+    assert (policy.hedged, policy.hedge_wins) == (1, 1)
+
+
+def test_unsampled_endpoints_are_not_hedged(client, graph):
+    policy = client.enable_hedging(HedgePolicy(min_samples=5))
+    graph.route('GET', '/users/a', (200, {}, {}))
+
+    client.token_auth_session.request('GET', '/users/a')
+    assert policy.hedged == 0
+    assert len(graph.calls) == 1
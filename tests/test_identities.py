@@ -0,0 +1,82 @@
+import pytest
+
+from dtMsalO365Wrapper import DeadlineExceeded, IdentityRouter, AppIdentity
+
+
+def _route_by_identity(client, graph, path, answers):
+    """
+    Registers a second app registration and answers `path` from a queue of answers per
+    registration, telling them apart by the token each one sends.
+    """
+    router = client.use_app_registrations([{'client_id': 'second', 'client_secret': 'secret'}])
+    client.token_auth_session.identity_token_func = lambda identity, scope: {'access_token': identity.client_id}
+    seen = []
+
+    def handler(method, url, kwargs):
+        client_id = kwargs['headers']['Authorization'].split(' ', 1)[1]
+        seen.append(client_id)
+        return answers[client_id].pop(0)
+
+    graph.route('GET', path, handler)
+    return router, seen
+
+
+def test_throttled_request_fails_over_to_another_registration(client, graph, no_sleep):
+    router, seen = _route_by_identity(client, graph, '/users/a', {
+        'client': [(429, {}, {'Retry-After': '30'})],
+        'second': [(200, {'id': 'a'}, {})] * 2,
+    })
+
+    assert client.token_auth_session.request('GET', '/users/a').json() == {'id': 'a'}
+    assert seen == ['client', 'second']
+    assert no_sleep == []
+    stats = client.identity_stats()
+    assert (stats['client']['throttled'], stats['client']['throttle_seconds']) == (1, 30)
+    assert stats['second']['requests'] == 1
+
+    # The throttled registration stays paused for the endpoint, so the next request avoids it.
+    client.token_auth_session.request('GET', '/users/a')
+    assert seen[-1] == 'second'
+    assert router.wait_time('/users/a') == 0
+
+
+def test_routed_rate_limit_past_the_deadline_raises_without_waiting(client, graph, no_sleep):
+    _, seen = _route_by_identity(client, graph, '/users/a', {
+        'client': [(429, {}, {'Retry-After': '30'})],
+        'second': [(429, {}, {'Retry-After': '30'})],
+    })
+
+    with pytest.raises(DeadlineExceeded):
+        with client.deadline(1.0):
+            client.token_auth_session.request('GET', '/users/a')
+    assert seen == ['client', 'second']
+    assert no_sleep == []
+
+
+def test_request_waits_for_the_registration_free_soonest_when_all_are_paused(client, graph, no_sleep):
+    _, seen = _route_by_identity(client, graph, '/users/a', {
+        'client': [(429, {}, {'Retry-After': '30'})],
+        'second': [(429, {}, {'Retry-After': '10'}), (200, {}, {})],
+    })
+
+    assert client.token_auth_session.request('GET', '/users/a').status_code == 200
+    assert seen == ['client', 'second', 'second']
+    assert len(no_sleep) == 1 and 9 < no_sleep[0] <= 10
+
+
+def test_least_loaded_routing_prefers_idle_registrations():
+    busy, idle = AppIdentity('tenant', 'busy'), AppIdentity('tenant', 'idle')
+    router = IdentityRouter([busy, idle], IdentityRouter.LEAST_LOADED)
+
+    with router.track(busy):
+        assert router.select() is idle
+    assert (busy.in_flight, busy.requests) == (0, 1)
+    # With nobody in flight, the registration that sent fewer requests is next.
+    assert router.select() is idle
+
+
+@pytest.mark.parametrize('identities, strategy', [([], IdentityRouter.THROTTLE_AWARE),
+                                                  ([AppIdentity('tenant', 'a')], 'round_robin')])
+def test_router_rejects_invalid_configurations(identities, strategy):
+    with pytest.raises(ValueError):
+        IdentityRouter(identities, strategy)
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from dtMsalO365Wrapper.pool import TenantClientPool
+
+
+@pytest.fixture
+def pool():
+    credentials = {t: {'client_id': f'client-{t}', 'client_secret': 'secret'} for t in ('t1', 't2')}
+    p = TenantClientPool(credentials, max_workers=4, idle_timeout=60, client_kwargs={'max_workers': 2})
+    yield p
+    p.close()
+
+
+def _age(pool, *tenants):
+    for t in tenants:
+        pool._last_used[t] -= 120
+
+
+def test_clients_are_created_once_and_share_the_transport(pool):
+    client = pool.client('t1')
+    assert pool.client('t1') is client
+    assert client.http_adapter is pool.http_adapter
+    assert client._tenant_id == 't1'
+    assert client._client_id == 'client-t1'
+    assert client.max_workers == 2
+    with pytest.raises(KeyError):
+        pool.client('unknown')
+
+
+def test_idle_clients_are_evicted(pool):
+    pool.client('t1')
+    pool.client('t2')
+    _age(pool, 't1')
+
+    assert pool.evict_idle() == ['t1']
+    assert pool.tenants == ['t2']
+
+
+def test_leased_clients_are_not_evicted(pool):
+    with pool.lease('t1') as client:
+        _age(pool, 't1')
+        assert pool.evict_idle() == []
+        assert pool.client('t1') is client
+        _age(pool, 't1')
+        assert pool.evict_idle() == []
+    assert pool.tenants == ['t1']
+
+
+def test_tenants_with_running_work_are_not_evicted(pool):
+    started, release = threading.Event(), threading.Event()
+
+    def work(client):
+        started.set()
+        release.wait(5)
+        return client._tenant_id
+
+    future = pool.submit('t1', work)
+    assert started.wait(5)
+    _age(pool, 't1')
+    assert pool.evict_idle() == []
+    release.set()
+    assert future.result(5) == 't1'
+    assert pool.tenants == ['t1']
+
+
+def test_evict_discards_the_client(pool):
+    client = pool.client('t1')
+
+    assert pool.evict('t1')
+    assert not pool.evict('t1')
+    assert pool.client('t1') is not client
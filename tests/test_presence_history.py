@@ -0,0 +1,87 @@
+import pytest
+
+from dtMsalO365Wrapper.communications.presence import Availability, Activity
+from dtMsalO365Wrapper.communications.presence_history import PresenceHistory
+
+
+def _poll(**states):
+    return [{'id': user, 'availability': availability, 'activity': availability}
+            for user, availability in states.items()]
+
+
+def _runs(history, user, start=None, end=None):
+    return [(r.start, r.end, r.availability.name) for r in history.runs(user, start, end)]
+
+
+@pytest.fixture
+def history(tmp_path):
+    h = PresenceHistory(str(tmp_path / 'presence'))
+    yield h
+    h.close()
+
+
+def test_only_changes_are_recorded(history):
+    assert history.record(_poll(alice='Available', bob='Busy'), 100) == 2
+    assert history.record(_poll(alice='Available', bob='Busy'), 160) == 0
+    assert history.record(_poll(alice='Away', bob='Busy'), 220) == 1
+
+    assert _runs(history, 'alice') == [(100, 220, 'Available')]
+    assert _runs(history, 'bob') == [(100, 220, 'Busy')]
+    run = history.runs('alice', 0, 500)[0]
+    assert (run.availability, run.activity) == (Availability.Available, Activity.Available)
+
+
+def test_older_polls_are_rejected(history):
+    history.record(_poll(alice='Available'), 100)
+
+    with pytest.raises(ValueError):
+        history.record(_poll(alice='Busy'), 50)
+
+
+def test_runs_are_clipped_to_the_range_and_summed_by_durations(history):
+    history.record(_poll(alice='Available', bob='Busy'), 100)
+    history.record(_poll(alice='Busy', bob='Busy'), 200)
+    history.record(_poll(alice='Busy', bob='Available'), 300)
+
+    assert _runs(history, 'alice', 150, 250) == [(150, 200, 'Available'), (200, 250, 'Busy')]
+    assert history.durations(['alice', 'bob']) == {Availability.Available: 100, Availability.Busy: 300}
+    assert history.team_runs(['carol']) == {'carol': []}
+
+
+def test_flushed_history_survives_a_reopen(tmp_path):
+    directory = str(tmp_path / 'presence')
+    with PresenceHistory(directory) as history:
+        history.record(_poll(alice='Available'), 100)
+        history.flush()
+        history.record(_poll(alice='Busy'), 200)
+        history.record(_poll(alice='Busy'), 300)
+
+    with PresenceHistory(directory) as history:
+        assert history.observed_until == 300
+        assert len(history.segments) == 2
+        assert _runs(history, 'alice') == [(100, 200, 'Available'), (200, 300, 'Busy')]
+        # The last known state is restored, so an unchanged poll adds nothing.
+        assert history.record(_poll(alice='Busy'), 400) == 0
+
+
+def test_compact_merges_segments_without_changing_runs(history):
+    for t, availability in ((100, 'Available'), (200, 'Busy'), (300, 'Available')):
+        history.record(_poll(alice=availability, bob='Away'), t)
+        history.flush()
+    before = _runs(history, 'alice'), _runs(history, 'bob')
+
+    assert history.compact() == 3
+    assert len(history.segments) == 1
+    assert (_runs(history, 'alice'), _runs(history, 'bob')) == before
+
+
+def test_compact_drops_history_before_the_retention_cut_off(history):
+    for t, availability in ((100, 'Available'), (200, 'Busy'), (300, 'Away')):
+        history.record(_poll(alice=availability), t)
+        history.flush()
+    history.record(_poll(alice='Away'), 400)
+
+    assert history.compact(retain_from=250) == 2
+    assert len(history.segments) == 2
+    assert _runs(history, 'alice') == [(250, 300, 'Busy'), (300, 400, 'Away')]
+    assert _runs(history, 'alice', 0, 250) == []
@@ -0,0 +1,83 @@
+import datetime
+import uuid
+
+import pytest
+
+from dtMsalO365Wrapper.query import ODataQuery, F, literal
+
+
+@pytest.mark.parametrize('value, expected', [
+    ("O'Brien", "'O''Brien'"),
+    ("R&D", "'R&D'"),
+    (None, 'null'),
+    (True, 'true'),
+    (False, 'false'),
+    (42, '42'),
+    (datetime.datetime(2024, 1, 2, 4, 5, 6, tzinfo=datetime.timezone(datetime.timedelta(hours=1))),
+     '2024-01-02T03:05:06Z'),
+    (datetime.date(2024, 1, 2), '2024-01-02'),
+    (uuid.UUID(int=1), '00000000-0000-0000-0000-000000000001'),
+])
+def test_literals_are_escaped(value, expected):
+    assert literal(value) == expected
+
+
+def test_expressions_compose_with_and_or_and_not():
+    expr = (F.eq('department', 'R&D') | F.startswith('displayName', "O'B")) & ~F.eq('accountEnabled', False)
+
+    assert expr.text == ("((department eq 'R&D' or startswith(displayName,'O''B')) "
+                         "and not (accountEnabled eq false))")
+    assert expr.advanced
+    assert not (F.eq('a', 1) & F.in_('b', ['x', 'y'])).advanced
+    assert (F.eq('a', 1) | F.ne('b', 2)).advanced
+
+
+def test_params_render_every_option():
+    query = (ODataQuery().select('id', ['displayName', 'id']).filter(F.eq('a', 1)).filter('b eq 2')
+             .orderby('displayName', descending=True).top(5).expand('manager').search('a"b', 'mail'))
+
+    assert query.params() == {
+        '$select': 'id,displayName',
+        '$filter': '(a eq 1 and b eq 2)',
+        '$orderby': 'displayName desc',
+        '$top': '5',
+        '$expand': 'manager',
+        '$search': '"mail:a\\"b"',
+    }
+
+
+def test_advanced_queries_only_add_count_and_consistency_for_directory_objects():
+    query = ODataQuery().filter(F.endswith('mail', '@example.com'))
+
+    assert '$count' not in query.params()
+    assert query.headers() == {}
+    assert query.params(directory=True)['$count'] == 'true'
+    assert query.headers(directory=True) == {'ConsistencyLevel': 'eventual'}
+    assert ODataQuery().search('report').headers() == {}
+    assert ODataQuery().eventual_consistency().headers() == {'ConsistencyLevel': 'eventual'}
+    assert ODataQuery().count().params() == {'$count': 'true'}
+
+
+def test_request_kwargs_merge_headers():
+    kwargs = ODataQuery().filter(F.ne('a', 1)).request_kwargs({'Prefer': 'x'}, directory=True)
+
+    assert kwargs == {'params': {'$filter': 'a ne 1', '$count': 'true'},
+                      'headers': {'Prefer': 'x', 'ConsistencyLevel': 'eventual'}}
+
+
+def test_message_queries_are_not_sent_as_advanced_queries(client, graph):
+    graph.route('GET', '/users/u1/messages', (200, {'value': []}, {}))
+    user = type('User', (), {'id': 'u1'})()
+
+    list(client.messages().iter_messages(user, ODataQuery().filter(~F.eq('isRead', True))))
+    params, headers = graph.calls[0][2]['params'], graph.calls[0][2].get('headers') or {}
+    assert params == {'$filter': 'not (isRead eq true)'}
+    assert 'ConsistencyLevel' not in headers
+
+
+def test_user_queries_are_sent_as_advanced_queries(client, graph):
+    graph.route('GET', '/users', (200, {'value': []}, {}))
+
+    list(client.users().query(ODataQuery().filter(F.ne('userType', 'Guest'))))
+    assert graph.calls[0][2]['params']['$count'] == 'true'
+    assert graph.calls[0][2]['headers']['ConsistencyLevel'] == 'eventual'
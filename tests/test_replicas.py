@@ -0,0 +1,172 @@
+import pytest
+
+from dtMsalO365Wrapper.groups.membership_graph import MembershipGraph
+
+from conftest import GRAPH
+
+USER = '#microsoft.graph.user'
+GROUP = '#microsoft.graph.group'
+
+
+def _delta_route(graph, path, pages):
+    """
+    Routes a delta query to `pages`, keyed by the `token` of the requested link; the
+    initial request has no token.
+    """
+    def handler(method, url, kwargs):
+        token = url.split('token=')[1] if 'token=' in url else None
+        page = pages[token]
+        return page(method, url, kwargs) if callable(page) else page
+
+    graph.route('GET', path, handler)
+
+
+def _page(value, next_token=None, delta_token=None, path='/users/delta'):
+    body = {'value': value}
+    if next_token:
+        body['@odata.nextLink'] = f'{GRAPH}{path}?token={next_token}'
+    if delta_token:
+        body['@odata.deltaLink'] = f'{GRAPH}{path}?token={delta_token}'
+    return 200, body, {}
+
+
+@pytest.fixture
+def users_delta(graph):
+    pages = {
+        None: _page([{'id': 'a', 'userPrincipalName': 'A@contoso.com', 'userType': 'Member'}], next_token='p2'),
+        'p2': _page([{'id': 'b', 'userPrincipalName': 'b@contoso.com', 'userType': 'Guest'}], delta_token='d1'),
+        'd1': _page([{'id': 'a', '@removed': {'reason': 'deleted'}}, {'id': 'b', 'department': 'Sales'}],
+                    delta_token='d2'),
+    }
+    _delta_route(graph, '/users/delta', pages)
+    return pages
+
+
+def test_directory_replica_loads_and_replays_changes(client, users_delta):
+    replica = client.users().replica()
+    assert replica.count() == 2
+    assert replica.get_by_upn('a@CONTOSO.com').id == 'a'
+    assert replica.delta_link.endswith('token=d1')
+
+    assert replica.sync() == (1, 1)
+    assert replica.get_by_id('a') is None
+    assert replica.get_by_department('Sales')[0].id == 'b'
+    assert replica.count(user_type='guest') == 1
+    assert replica.delta_link.endswith('token=d2')
+
+
+def test_failed_load_keeps_the_previous_contents(client, users_delta):
+    replica = client.users().replica()
+    users_delta['p2'] = (500, {'error': {'code': 'InternalServerError'}}, {})
+
+    with pytest.raises(RuntimeError):
+        replica.load()
+    assert replica.count() == 2
+    assert replica.delta_link.endswith('token=d1')
+
+
+@pytest.mark.parametrize('code', ['syncStateNotFound', 'resyncRequired'])
+def test_expired_delta_link_falls_back_to_a_full_load(client, graph, users_delta, code):
+    replica = client.users().replica()
+    users_delta['d1'] = (410, {'error': {'code': code}}, {})
+
+    assert replica.sync() == (2, 0)
+    assert replica.count() == 2
+    assert len(graph.calls_to('GET', '/users/delta')) == 5
+
+
+def test_other_sync_errors_are_raised(client, users_delta):
+    replica = client.users().replica()
+    users_delta['d1'] = (403, {'error': {'code': 'Authorization_RequestDenied'}}, {})
+
+    with pytest.raises(RuntimeError):
+        replica.sync()
+    assert replica.delta_link.endswith('token=d1')
+
+
+def test_sync_merges_changed_properties_into_stored_users(client, users_delta):
+    replica = client.users().replica()
+    replica.sync()
+
+    b = replica.get_by_id('b')
+    assert (b.user_principal_name, b.get('department'), b.get('userType')) == ('b@contoso.com', 'Sales', 'Guest')
+    assert replica.get_by_upn('b@contoso.com').id == 'b'
+
+
+def test_persisted_replica_resumes_from_its_delta_link(client, graph, users_delta, tmp_path):
+    path = str(tmp_path / 'directory.db')
+    client.users().replica(path).close()
+    loads = len(graph.calls)
+
+    replica = client.users().replica(path)
+    # Reopening replays the changes since the stored delta link instead of reloading.
+    assert len(graph.calls) == loads + 1
+    assert graph.calls[-1][1].endswith('token=d1')
+    assert replica.count() == 1
+    assert replica.delta_link.endswith('token=d2')
+    replica.close()
+
+
+@pytest.fixture
+def groups_delta(graph):
+    path = '/groups/delta'
+    pages = {
+        None: _page([{'id': 'g1', 'displayName': 'Outer', 'members@delta': [
+            {'id': 'u1', '@odata.type': USER}, {'id': 'g2', '@odata.type': GROUP}]}],
+            next_token='p2', path=path),
+        'p2': _page([{'id': 'g2', 'displayName': 'Inner', 'members@delta': [{'id': 'u2', '@odata.type': USER}]},
+                     {'id': 'g3', 'displayName': 'Other', 'members@delta': [{'id': 'u3', '@odata.type': USER}]}],
+                    delta_token='d1', path=path),
+        'd1': _page([{'id': 'g2', 'members@delta': [{'id': 'u4', '@odata.type': USER}]}],
+                    delta_token='d2', path=path),
+    }
+    _delta_route(graph, path, pages)
+    return pages
+
+
+def test_group_replica_sync_reports_affected_expansions(client, groups_delta):
+    replica = client.groups().replica()
+    assert sorted(replica.group_ids()) == ['g1', 'g2', 'g3']
+    assert replica.expand(['g1']) == {'g1': frozenset({'u1', 'u2'})}
+
+    assert replica.sync() == {'g1', 'g2'}
+    assert replica.expand(['g1']) == {'g1': frozenset({'u1', 'u2', 'u4'})}
+    assert replica.groups_of('u4') == ['g2']
+
+
+def test_failed_group_sync_rolls_back_store_and_graph(client, groups_delta):
+    replica = client.groups().replica()
+    replica.expand(['g1'])
+    groups_delta['d1'] = _page([{'id': 'g2', 'members@delta': [{'id': 'u4', '@odata.type': USER}]}],
+                               next_token='p3', path='/groups/delta')
+    groups_delta['p3'] = (500, {'error': {'code': 'InternalServerError'}}, {})
+
+    with pytest.raises(RuntimeError):
+        replica.sync()
+    assert replica.expand(['g1']) == {'g1': frozenset({'u1', 'u2'})}
+    assert replica.groups_of('u4') == []
+    assert replica.delta_link.endswith('token=d1')
+
+
+def test_expand_leaves_groups_with_failed_member_pages_out_of_the_graph(client, graph):
+    def handler(method, url, kwargs):
+        responses = []
+        for sub in kwargs['json']['requests']:
+            if sub['url'].startswith('/groups/g1/members?$select'):
+                body = {'value': [{'id': 'u1', '@odata.type': USER}],
+                        '@odata.nextLink': f'{GRAPH}/groups/g1/members?$skiptoken=2'}
+                responses.append({'id': sub['id'], 'status': 200, 'body': body})
+            elif 'skiptoken' in sub['url']:
+                responses.append({'id': sub['id'], 'status': 403, 'body': {'error': {'code': 'Forbidden'}}})
+            else:
+                responses.append({'id': sub['id'], 'status': 200,
+                                  'body': {'value': [{'id': 'u2', '@odata.type': USER}]}})
+        return 200, {'responses': responses}, {}
+
+    graph.route('POST', '/$batch', handler)
+    membership = MembershipGraph()
+
+    with pytest.raises(Exception, match='g1'):
+        client.groups().expand(['g1', 'g2'], graph=membership)
+    assert 'g1' not in membership
+    assert membership.expand(['g2']) == {'g2': frozenset({'u2'})}
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from dtMsalO365Wrapper.teams.team import Team
+from dtMsalO365Wrapper.teams.member import Member
+
+from conftest import GRAPH
+
+
+def _member(user_id, *roles):
+    return {'id': f'm-{user_id}', 'userId': user_id, 'displayName': user_id.title(), 'roles': list(roles)}
+
+
+def _team(client, team_id):
+    return Team(SimpleNamespace(id=team_id), client.graph_client, client.token_auth_session, None)
+
+
+def test_team_members_are_paged_lazily(client, graph):
+    def handler(method, url, kwargs):
+        if 'skiptoken' in url:
+            return 200, {'value': [_member('bob', 'guest')]}, {}
+        return 200, {'value': [_member('alice', 'owner')],
+                     '@odata.nextLink': f'{GRAPH}/teams/t1/members?$skiptoken=2'}, {}
+
+    graph.route('GET', '/teams/t1/members', handler)
+    members = _team(client, 't1').iter_members()
+
+    first = next(members)
+    assert len(graph.calls) == 1
+    assert (first.user_id, first.is_owner) == ('alice', True)
+    second = next(members)
+    assert (second.user_id, second.is_guest) == ('bob', True)
+    assert list(members) == []
+
+
+def test_team_owners_are_members_with_the_owner_role(client, graph):
+    graph.route('GET', '/teams/t1/members', (200, {'value': [_member('alice', 'owner')]}, {}))
+
+    owners = list(_team(client, 't1').iter_owners())
+    assert [type(o) for o in owners] == [Member]
+    assert owners[0].is_owner
+    assert graph.calls[0][2]['params'] == {'$filter': "roles/any(r:r eq 'owner')"}
+
+
+def _batch_route(graph, answer):
+    rounds = []
+
+    def handler(method, url, kwargs):
+        subs = kwargs['json']['requests']
+        rounds.append([s['url'] for s in subs])
+        return 200, {'responses': [dict(answer(s), id=s['id']) for s in subs]}, {}
+
+    graph.route('POST', '/$batch', handler)
+    return rounds
+
+
+def test_memberships_follow_further_pages_in_later_batch_rounds(client, graph):
+    def answer(sub):
+        if sub['url'] == '/teams/t1/members':
+            return {'status': 200, 'body': {'value': [_member('alice')],
+                                            '@odata.nextLink': f'{GRAPH}/teams/t1/members?$skiptoken=2'}}
+        if 'skiptoken' in sub['url']:
+            return {'status': 200, 'body': {'value': [_member('carol')]}}
+        return {'status': 200, 'body': {'value': [_member('bob')]}}
+
+    rounds = _batch_route(graph, answer)
+    teams = [_team(client, f't{i}') for i in range(1, 23)]
+
+    rows = list(client.teams().memberships(teams, workers=2))
+    # 22 teams need two batches in the first round; the second page of t1 a third.
+    assert len(rounds) == 3
+    assert sorted(len(r) for r in rounds[:2]) == [2, 20]
+    assert rounds[-1] == ['/teams/t1/members?$skiptoken=2']
+    assert sorted(m.user_id for t, m in rows if t.id == 't1') == ['alice', 'carol']
+    assert len(rows) == 23
+
+
+def test_memberships_raise_after_the_other_teams_for_failed_teams(client, graph):
+    rounds = _batch_route(graph, lambda sub: {'status': 403, 'body': {'error': {'code': 'Forbidden'}}}
+                          if sub['url'].startswith('/teams/t2') else
+                          {'status': 200, 'body': {'value': [_member('alice')]}})
+    rows = []
+
+    with pytest.raises(Exception, match='t2'):
+        for row in client.teams().memberships([_team(client, 't1'), _team(client, 't2')]):
+            rows.append(row)
+    assert [(t.id, m.user_id) for t, m in rows] == [('t1', 'alice')]
+    assert len(rounds) == 1
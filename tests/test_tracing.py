@@ -0,0 +1,95 @@
+import json
+import threading
+
+import pytest
+
+from dtMsalO365Wrapper import Tracer
+from dtMsalO365Wrapper._tracing import traced, bind_context
+
+
+def test_spans_nest_within_their_parent():
+    tracer = Tracer()
+    with tracer.span('outer') as outer:
+        with tracer.span('inner', 'http', url='/me') as inner:
+            pass
+
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+    assert [s.name for s in tracer.spans] == ['inner', 'outer']
+    assert tracer.spans[0].args == {'url': '/me'}
+
+
+def test_failed_spans_record_the_error():
+    tracer = Tracer()
+    with pytest.raises(KeyError):
+        with tracer.span('lookup'):
+            raise KeyError('id')
+
+    assert tracer.spans[0].args['error'] == 'KeyError'
+
+
+def test_requests_made_through_map_are_children_of_the_callers_span(client, graph):
+    graph.route('GET', '/users/a', (200, {}, {}))
+    graph.route('GET', '/users/b', (200, {}, {}))
+    tracer = client.enable_tracing()
+
+    with tracer.span('export') as export:
+        list(client.map(lambda user_id: client.token_auth_session.request('GET', f'/users/{user_id}'), ['a', 'b']))
+
+    requests = [s for s in tracer.spans if s.name.startswith('GET ')]
+    assert len(requests) == 2
+    assert {s.parent_id for s in requests} == {export.span_id}
+    assert all(s.thread_id != export.thread_id for s in requests)
+    attempts = [s for s in tracer.spans if s.name == 'attempt']
+    assert {s.parent_id for s in attempts} == {s.span_id for s in requests}
+
+
+def test_traced_methods_only_record_spans_when_tracing_is_enabled(client):
+    class Subsystem:
+        def __init__(self, session):
+            self._token_auth_session = session
+
+        @traced('Subsystem.work')
+        def work(self):
+            return 42
+
+    subsystem = Subsystem(client.token_auth_session)
+    assert subsystem.work() == 42
+    tracer = client.enable_tracing()
+    assert subsystem.work() == 42
+    assert [s.name for s in tracer.spans] == ['Subsystem.work']
+
+    with pytest.raises(TypeError):
+        traced()(lambda self: (yield))
+
+
+def test_chrome_trace_names_threads_and_links_spans_across_them(tmp_path):
+    tracer = Tracer()
+    worker_span = []
+
+    def _work():
+        with tracer.span('child') as span:
+            worker_span.append(span)
+
+    with tracer.span('outer', url='/users') as outer:
+        child = threading.Thread(target=bind_context(_work), name='worker')
+        child.start()
+        child.join()
+
+    path = str(tmp_path / 'trace.json')
+    tracer.export_chrome_trace(path)
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)
+
+    assert trace['displayTimeUnit'] == 'ms'
+    events = trace['traceEvents']
+    names = {e['tid']: e['args']['name'] for e in events if e['ph'] == 'M'}
+    assert names[worker_span[0].thread_id] == 'worker'
+    complete = {e['name']: e for e in events if e['ph'] == 'X'}
+    assert complete['outer']['args'] == {'url': '/users', 'span_id': outer.span_id, 'parent_id': None}
+    assert complete['child']['args']['parent_id'] == outer.span_id
+    assert complete['outer']['ts'] <= complete['child']['ts']
+    assert complete['child']['dur'] <= complete['outer']['dur']
+    flows = sorted((e['ph'], e['tid']) for e in events if e.get('cat') == 'flow')
+    assert flows == sorted([('s', outer.thread_id), ('f', worker_span[0].thread_id)])
+    assert len({e['id'] for e in events if e.get('cat') == 'flow'}) == 1
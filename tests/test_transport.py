@@ -0,0 +1,42 @@
+import threading
+
+import requests
+
+from dtMsalO365Wrapper._token_auth_session import TokenAuthSession, create_http_adapter
+
+
+def test_close_closes_the_transports_of_every_thread(graph, monkeypatch):
+    closed = []
+    monkeypatch.setattr(requests.adapters.HTTPAdapter, 'close', lambda adapter: closed.append(adapter))
+    shared = create_http_adapter()
+    session = TokenAuthSession(lambda scope: {'access_token': 'token'}, 'scope', http_adapter=shared)
+    graph.route('GET', '/me', (200, {}, {}))
+
+    threads = [threading.Thread(target=session.request, args=('GET', '/me')) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    transports = list(session._transports)
+    assert len(transports) == 3
+
+    session.close()
+    assert session._transports == []
+    for transport in transports:
+        assert transport.adapters['http://'] in closed
+    # The adapter supplied by the caller stays open for its other sessions.
+    assert shared not in closed
+
+
+def test_rate_limit_pauses_only_the_throttled_endpoint(client, graph, no_sleep):
+    answers = iter([(429, {}, {'Retry-After': '30'}), (200, {}, {})])
+    graph.route('POST', '/communications/getPresencesByUserId', lambda m, u, kw: next(answers))
+    graph.route('GET', '/users/a', (200, {}, {}))
+    session = client.token_auth_session
+
+    session.request('POST', '/communications/getPresencesByUserId', json={'ids': []})
+    assert session.throttle_gate.remaining('/communications/getPresencesByUserId') > 0
+    assert len(no_sleep) == 1
+
+    assert session.request('GET', '/users/a').status_code == 200
+    assert len(no_sleep) == 1
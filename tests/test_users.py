@@ -0,0 +1,159 @@
+import pytest
+
+from dtMsalO365Wrapper.users.user import User
+from dtMsalO365Wrapper.users.user_record import UserRecord
+
+from conftest import GRAPH
+
+
+def _user(user_id, **properties):
+    return {'id': user_id, 'userPrincipalName': f'{user_id}@contoso.com', **properties}
+
+
+def _users_route(graph, users, key='id'):
+    """
+    Answers `/users` filtered with `<key> in (...)` from `users`, recording the values of every filter.
+    """
+    filters = []
+
+    def handler(method, url, kwargs):
+        expression = kwargs['params']['$filter']
+        values = [v.strip("'") for v in expression[len(f'{key} in ('):-1].split(',')]
+        filters.append(values)
+        return 200, {'value': [u for u in users if (u.get(key) or '').lower() in values]}, {}
+
+    graph.route('GET', '/users', handler)
+    return filters
+
+
+def test_raw_backend_pages_users_into_records(client, graph):
+    def handler(method, url, kwargs):
+        if 'skiptoken' in url:
+            return 200, {'value': [_user('b')]}, {}
+        return 200, {'value': [_user('a', displayName='Alice', jobTitle='Engineer')],
+                     '@odata.nextLink': f'{GRAPH}/users?$skiptoken=2'}, {}
+
+    graph.route('GET', '/users', handler)
+
+    records = client.users('raw').get_enabled_accounts(['id', 'displayName', 'jobTitle'])
+    assert [type(r) for r in records] == [UserRecord, UserRecord]
+    assert graph.calls[0][2]['params'] == {'$filter': 'accountEnabled eq true',
+                                          '$select': 'id,displayName,jobTitle', '$top': 100}
+    alice, bob = records
+    assert (alice.id, alice.display_name, alice.job_title) == ('a', 'Alice', 'Engineer')
+    assert alice.user_principal_name == 'a@contoso.com'
+    # Properties that were not selected read as None rather than triggering a request.
+    assert (bob.display_name, bob.mail, bob.surname) == (None, None, None)
+    assert len(graph.calls) == 2
+
+
+def test_records_are_slotted_and_keep_their_presence(client, graph):
+    graph.route('GET', '/users/a/presence', (200, {'availability': 'Busy'}, {}))
+    record = client.users('raw')._record(_user('a'))
+
+    assert not hasattr(record, '__dict__')
+    assert record.presence['availability'] == 'Busy'
+    assert record.presence['availability'] == 'Busy'
+    assert len(graph.calls) == 1
+
+
+def test_raw_get_by_id_raises_on_errors(client, graph):
+    graph.route('GET', '/users/a', (200, _user('a', mail='a@contoso.com'), {}))
+
+    assert client.users('raw').get_by_id('a').mail == 'a@contoso.com'
+    with pytest.raises(Exception, match='Failed to get User'):
+        client.users('raw').get_by_id('missing')
+
+
+def test_unknown_backends_are_rejected(client):
+    with pytest.raises(ValueError):
+        client.users('json')
+
+
+def test_hydrate_fetches_users_in_chunks_of_fifteen_ids(client, graph):
+    directory = [_user(f'u{i:02}', displayName=f'User {i}') for i in range(32)]
+    filters = _users_route(graph, directory)
+    users = client.users('raw')
+    records = [users._record({'id': u['id']}) for u in directory]
+    duplicate = users._record({'id': 'u00'})
+
+    assert users.hydrate(records + [duplicate], fields=['displayName']) == records + [duplicate]
+    assert sorted(len(f) for f in filters) == [2, 15, 15]
+    assert sorted(v for f in filters for v in f) == [u['id'] for u in directory]
+    assert [r.display_name for r in records] == [u['displayName'] for u in directory]
+    assert duplicate.display_name == 'User 0'
+    assert graph.calls[0][2]['params']['$select'] == 'id,displayName'
+
+
+def test_hydrated_users_load_without_a_request(client, graph):
+    _users_route(graph, [_user('a', displayName='Alice')])
+    # As listed with only `id` selected.
+    entity = client.graph_client.users['a'].set_property('id', 'a', False)
+    user = User(client.graph_client, client.token_auth_session, entity)
+
+    client.users().hydrate([user], fields=['displayName'])
+    calls = len(graph.calls)
+    assert user.get_loaded_user() is user._user
+    assert user.display_name == 'Alice'
+    assert len(graph.calls) == calls
+
+
+def test_hydrate_attaches_presence(client, graph):
+    _users_route(graph, [_user('a'), _user('b')])
+    graph.route('POST', '/communications/getPresencesByUserId',
+                lambda m, u, kw: (200, {'value': [{'id': i, 'availability': 'Away'} for i in kw['json']['ids']]}, {}))
+    users = client.users('raw')
+    records = [users._record({'id': 'a'}), users._record({'id': 'b'})]
+
+    users.hydrate(records, include_presence=True)
+    calls = len(graph.calls)
+    assert [r.presence['availability'] for r in records] == ['Away', 'Away']
+    assert 'user' not in records[0].presence
+    assert len(graph.calls) == calls
+
+
+def test_resolve_deduplicates_and_folds_case(client, graph):
+    filters = _users_route(graph, [_user('a', mail='Alice@Contoso.com'), _user('b', mail='bob@contoso.com')], 'mail')
+    users = client.users('raw')
+
+    resolved = users.resolve(['alice@contoso.com', 'ALICE@contoso.com', 'bob@contoso.com', 'nobody@contoso.com'],
+                             by='mail')
+    assert filters == [['alice@contoso.com', 'bob@contoso.com', 'nobody@contoso.com']]
+    assert resolved['alice@contoso.com'] is resolved['ALICE@contoso.com']
+    assert resolved['ALICE@contoso.com'].id == 'a'
+    assert resolved['bob@contoso.com'].id == 'b'
+    assert resolved['nobody@contoso.com'] is None
+
+
+def test_resolve_matches_ids_in_any_case(client, graph):
+    upper = 'AAAAAAAA-0000-0000-0000-000000000000'
+    _users_route(graph, [_user(upper.lower())])
+
+    assert client.users('raw').resolve([upper])[upper].id == upper.lower()
+
+
+def test_resolve_memoises_hits_and_misses(client, graph):
+    filters = _users_route(graph, [_user('a', mail='a@contoso.com')], 'mail')
+    cache = {}
+
+    client.users('raw').resolve(['a@contoso.com', 'z@contoso.com'], by='mail', cache=cache)
+    assert set(cache) == {('mail', 'a@contoso.com'), ('mail', 'z@contoso.com')}
+    assert cache[('mail', 'z@contoso.com')] is None
+
+    resolved = client.users('raw').resolve(['A@contoso.com', 'z@contoso.com', 'y@contoso.com'], by='mail',
+                                           cache=cache)
+    assert filters == [['a@contoso.com', 'z@contoso.com'], ['y@contoso.com']]
+    assert resolved['A@contoso.com'].id == 'a'
+    assert resolved['z@contoso.com'] is None
+
+
+@pytest.mark.parametrize('identifiers', [['a', ''], ['a', None]])
+def test_resolve_rejects_empty_identifiers(client, graph, identifiers):
+    with pytest.raises(ValueError):
+        client.users('raw').resolve(identifiers)
+    assert graph.calls == []
+
+
+def test_resolve_rejects_unknown_identifier_kinds(client):
+    with pytest.raises(ValueError):
+        client.users('raw').resolve(['a'], by='phone')